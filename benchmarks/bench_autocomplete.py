@@ -0,0 +1,59 @@
+"""
+Build time of the autocomplete index of one 50k-contact address book and latency of typeahead
+lookups (1 to 4 typed characters, single and two-word queries, phone digits) against it.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_autocomplete.py [contacts] [queries]``
+"""
+import random
+import string
+import sys
+import time
+
+from src.services.autocomplete import ContactIndex
+
+NAMES = ["Anna", "Andrii", "Bohdan", "Daria", "Dmytro", "Iryna", "Ivan", "Kateryna", "Maksym", "Mariia", "Mykola",
+         "Oksana", "Olena", "Oleksandr", "Petro", "Serhii", "Sofiia", "Taras", "Viktoriia", "Yurii"]
+
+
+def contacts(count: int, rng: random.Random):
+    for i in range(count):
+        surname = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))).capitalize()
+        yield {"id": i + 1, "name": rng.choice(NAMES), "surname": surname, "email": f"{surname.lower()}{i}@example.com",
+               "phone": f"+380{rng.randrange(10 ** 9):09d}", "born_date": "1990-01-01T00:00:00"}
+
+
+def queries(count: int, rng: random.Random):
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            yield "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 4)))
+        elif kind < 0.8:
+            yield f"{rng.choice(NAMES)[:rng.randint(1, 4)]} {rng.choice(string.ascii_lowercase)}"
+        else:
+            yield f"+380{rng.randrange(10 ** 4)}"
+
+
+def main(count: int = 50_000, lookups: int = 20_000):
+    rng = random.Random(42)
+    rows = list(contacts(count, rng))
+    started = time.perf_counter()
+    index = ContactIndex(rows)
+    print(f"build: {count} contacts, {len(index)} tokens in {time.perf_counter() - started:.3f} s")
+
+    timings = []
+    for query in queries(lookups, rng):
+        started = time.perf_counter()
+        index.search(query, 10)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"search: {lookups} queries, p50 {timings[len(timings) // 2] * 1e6:.1f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us")
+
+    started = time.perf_counter()
+    for contact in rows[:1000]:
+        index.add(dict(contact, surname=contact["surname"] + "x"))
+    print(f"update: 1000 contacts in {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
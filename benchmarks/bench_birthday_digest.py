@@ -0,0 +1,63 @@
+"""
+Time of one birthday digest run (the set-based pass and per-user grouping) over a synthetic
+contacts table, compared with the ``birthday_digest_budget_seconds`` budget. Redis writes are not
+included; the database is a temporary SQLite file unless a URL is given.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_birthday_digest.py [contacts] [users] [url]``
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, User
+from src.jobs.birthday_digest import compute_digests
+
+
+def seed(engine, contacts: int, users: int, batch_size: int = 50_000):
+    rng = random.Random(42)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                                           "password": "x", "confirmed": True} for user_id in range(1, users + 1)])
+        for start in range(0, contacts, batch_size):
+            connection.execute(insert(Contact), [
+                {"name": "John", "surname": f"Surname{i}", "email": f"c{i}@example.com", "phone": f"+380{i:09d}",
+                 "email_normalized": f"c{i}@example.com", "phone_normalized": f"380{i:09d}",
+                 "born_date": datetime(1970, 1, 1) + timedelta(days=rng.randrange(365 * 40)),
+                 "updated_at": now, "user_id": rng.randrange(1, users + 1)}
+                for i in range(start, min(start + batch_size, contacts))])
+
+
+def main(contacts: int = 1_000_000, users: int = 10_000, url: str | None = None):
+    path = None
+    if url is None:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    started = time.perf_counter()
+    seed(engine, contacts, users)
+    print(f"seeded contacts={contacts} users={users} in {time.perf_counter() - started:.1f}s")
+    db = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        digests = sum(1 for _, found in compute_digests(db, date.today()) if found)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+        if path:
+            os.remove(path)
+    verdict = "within" if elapsed <= settings.birthday_digest_budget_seconds else "OVER"
+    print(f"users_with_birthdays={digests} seconds={elapsed:.2f} "
+          f"{verdict} budget of {settings.birthday_digest_budget_seconds}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]), *sys.argv[3:4])
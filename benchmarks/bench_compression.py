@@ -0,0 +1,57 @@
+"""
+Bytes saved and CPU cost of response compression for typical payloads of the contact routes.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_compression.py``
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from src.conf.config import settings
+from src.services.compression import CompressionMiddleware
+
+ROUNDS = 20
+
+
+def make_contacts(count: int):
+    rng = random.Random(42)
+    born = datetime(1990, 1, 1)
+    return [{"id": i, "name": rng.choice(["John", "Anna", "Petro", "Olena"]), "surname": f"Surname{i}",
+             "email": f"user{i}@example.com", "phone": f"+380{rng.randrange(10 ** 9):09d}",
+             "born_date": (born + timedelta(days=rng.randrange(10000))).isoformat()} for i in range(count)]
+
+
+ROUTES = {
+    "GET /api/contacts/{id}": make_contacts(1)[0],
+    "GET /api/contacts/search/{q}": make_contacts(20),
+    "GET /api/contacts/": make_contacts(100),
+    "GET /api/contacts/export/": make_contacts(10_000),
+}
+
+
+def main():
+    middleware = CompressionMiddleware(
+        None,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        zstd_level=settings.compression_zstd_level,
+    )
+    print(f"{'route':32} {'encoding':8} {'bytes':>10} {'compressed':>10} {'saved':>7} {'cpu_ms':>8}")
+    for route, payload in ROUTES.items():
+        body = json.dumps(payload).encode()
+        for encoding, factory in middleware.compressors.items():
+            if len(body) < middleware.minimum_size:
+                print(f"{route:32} {encoding:8} {len(body):>10} {'-':>10} {'-':>7} {'-':>8}  below threshold")
+                continue
+            started = time.process_time()
+            for _ in range(ROUNDS):
+                compressed = factory().finish(body)
+            cpu_ms = (time.process_time() - started) / ROUNDS * 1000
+            saved = 1 - len(compressed) / len(body)
+            print(f"{route:32} {encoding:8} {len(body):>10} {len(compressed):>10} {saved:>7.1%} {cpu_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark of the duplicate-contact scan on a synthetic 100k-contact address book.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_duplicates.py [contacts]``
+"""
+import random
+import sys
+import time
+
+from src.services.duplicates import find_duplicate_pairs
+
+NAMES = ["John", "Petro", "Anna", "Maria", "Ivan", "Olena", "Taras", "Sofia", "Andrii", "Iryna"]
+SURNAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Boyko", "Petroff"]
+
+
+def make_book(size: int, duplicate_share: float = 0.02):
+    rng = random.Random(42)
+    rows = []
+    for contact_id in range(1, size + 1):
+        if rows and rng.random() < duplicate_share:
+            _, name, surname, email, phone = rows[rng.randrange(len(rows))]
+            # Same person, formatted differently
+            email = email.upper()
+            phone = f"00{phone[1:4]} {phone[4:7]}-{phone[7:]}"
+        else:
+            name = rng.choice(NAMES)
+            surname = f"{rng.choice(SURNAMES)}{contact_id}"
+            email = f"user{contact_id}@example.com"
+            phone = f"+380{rng.randrange(10 ** 9):09d}"
+        rows.append((contact_id, name, surname, email, phone))
+    return rows
+
+
+def main(size: int = 100_000):
+    rows = make_book(size)
+    started = time.perf_counter()
+    pairs = find_duplicate_pairs(rows)
+    elapsed = time.perf_counter() - started
+    print(f"contacts={size} pairs={len(pairs)} seconds={elapsed:.3f} per_contact_us={elapsed / size * 1e6:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,66 @@
+"""
+Size and serialize/parse time of the contact list formats, against the JSON list of
+``ContactResponse`` the routes send by default.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_formats.py``
+"""
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services import formats
+from src.services.fieldsets import CONTACT_FIELDS
+
+ROUNDS = 10
+SIZES = (20, 100, 1000, 10_000)
+
+
+def make_contacts(count: int):
+    rng = random.Random(42)
+    born = datetime(1990, 1, 1)
+    return [Contact(id=i, name=rng.choice(["John", "Anna", "Petro", "Olena"]), surname=f"Surname{i}",
+                    email=f"user{i}@example.com", phone=f"+380{rng.randrange(10 ** 9):09d}",
+                    born_date=born + timedelta(days=rng.randrange(10000)), version=1) for i in range(count)]
+
+
+def response_model_json(contacts) -> bytes:
+    # What FastAPI does for response_model=List[ContactResponse]
+    return json.dumps(jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts]),
+                      ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encoders():
+    yield "json (ContactResponse)", response_model_json, json.loads
+    yield "columnar json", lambda contacts: formats.contacts_response(contacts, None, formats.COLUMNAR).body, \
+        json.loads
+    if formats.msgpack is not None:
+        yield "msgpack", lambda contacts: formats.contacts_response(contacts, None, formats.MSGPACK).body, \
+            formats.msgpack.unpackb
+
+
+def timed(func, argument) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(argument)
+    return (time.perf_counter() - started) / ROUNDS * 1000
+
+
+def main():
+    print(f"fields: {', '.join(CONTACT_FIELDS)}")
+    print(f"{'contacts':>8} {'format':24} {'bytes':>10} {'gzip':>9} {'encode_ms':>10} {'parse_ms':>9}")
+    for size in SIZES:
+        contacts = make_contacts(size)
+        for name, encode, parse in encoders():
+            body = encode(contacts)
+            print(f"{size:>8} {name:24} {len(body):>10} {len(zlib.compress(body, 6)):>9} "
+                  f"{timed(encode, contacts):>10.3f} {timed(parse, body):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
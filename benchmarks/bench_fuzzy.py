@@ -0,0 +1,78 @@
+"""
+Latency of fuzzy contact search on one 100k-contact address book: misspelled names and surnames
+(one or two random edits) looked up with the trigram-pruned bounded edit distance, compared with
+computing the distance to every distinct word of the book.
+
+Run from the repository root: ``PYTHONPATH=. python benchmarks/bench_fuzzy.py [contacts] [queries]``
+"""
+import random
+import string
+import sys
+import time
+
+from src.services.autocomplete import ContactIndex
+from src.services.fuzzy import bounded_distance
+
+NAMES = ["Anna", "Andrii", "Bohdan", "Daria", "Dmytro", "Iryna", "Ivan", "Kateryna", "Maksym", "Mariia", "Mykola",
+         "Oksana", "Olena", "Oleksandr", "Petro", "Serhii", "Sofiia", "Taras", "Viktoriia", "Yurii"]
+SYLLABLES = ["ko", "shev", "chen", "pet", "ro", "van", "en", "ko", "lyk", "sky", "mar", "tyn", "bon", "dar", "uk"]
+
+
+def surname(rng: random.Random) -> str:
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+
+
+def misspell(word: str, edits: int, rng: random.Random) -> str:
+    for _ in range(edits):
+        position = rng.randrange(len(word))
+        kind = rng.randrange(3)
+        if kind == 0:
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+        elif kind == 1 and len(word) > 3:
+            word = word[:position] + word[position + 1:]
+        else:
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+    return word
+
+
+def main(count: int = 100_000, lookups: int = 2_000):
+    rng = random.Random(42)
+    rows = [{"id": i + 1, "name": rng.choice(NAMES), "surname": surname(rng), "email": None,
+             "phone": f"+380{rng.randrange(10 ** 9):09d}", "born_date": "1990-01-01T00:00:00"} for i in range(count)]
+    index = ContactIndex(rows)
+    started = time.perf_counter()
+    index.fuzzy_search("warmup", 2, 20)
+    print(f"build: {count} contacts, {len(index.fuzzy.words)} distinct words in {time.perf_counter() - started:.3f} s")
+
+    for max_distance in (1, 2):
+        timings, found, missed = [], 0, []
+        for number in range(lookups):
+            contact = rng.choice(rows)
+            word = contact["surname"] if rng.random() < 0.7 else contact["name"]
+            query = misspell(word.lower(), rng.randint(1, max_distance), rng)
+            started = time.perf_counter()
+            matches, total = index.fuzzy_search(query, max_distance, 20)
+            timings.append(time.perf_counter() - started)
+            found += bool(total)
+            # A full scan takes a third of a second per query, so only the first ones are checked
+            if number >= 200:
+                continue
+            expected = {candidate for candidate in index.fuzzy.words
+                        if bounded_distance(query, candidate, max_distance) <= max_distance}
+            if set(index.fuzzy.matches(query, max_distance)) != expected:
+                missed.append(query)
+        timings.sort()
+        print(f"max_distance {max_distance}: p50 {timings[len(timings) // 2] * 1e3:.2f} ms, "
+              f"p99 {timings[int(len(timings) * 0.99)] * 1e3:.2f} ms, found {found}/{lookups}, "
+              f"differing from a full scan: {len(missed)}/{min(lookups, 200)} {missed[:5]}")
+
+    words = list(index.fuzzy.words)
+    started = time.perf_counter()
+    for _ in range(20):
+        query = misspell(rng.choice(words), 1, rng)
+        [word for word in words if bounded_distance(query, word, 2) <= 2]
+    print(f"without pruning: {(time.perf_counter() - started) / 20 * 1e3:.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,355 @@
+"""
+Load test of the API: seeds users with confirmed emails and their contacts, drives a weighted mix of
+requests from concurrent virtual users against a running server and prints throughput, latency
+percentiles per route and error rates as JSON, to compare builds.
+
+Start the server against the seeded database, e.g. ``SQLALCHEMY_DATABASE_URL=sqlite:///loadtest.db uvicorn main:app``,
+or pass ``--start-server`` to have the harness start it. ``--fake-redis`` serves a fakeredis stand-in
+(a dev dependency) on ``redis_host:redis_port`` when no Redis is running. Every virtual user logs in
+as its own seeded user, since refresh tokens are rotated, and sends its own X-Forwarded-For address,
+since ``GET /contacts/`` is rate limited per client address. The limit is
+``contacts_list_rate_limit`` requests per minute: ``--list-rate-limit`` sets it on a server started by
+the harness. Rate limited calls are counted apart and left out of the latencies and error rates.
+
+Run from the repository root:
+``PYTHONPATH=. python benchmarks/loadtest.py --db sqlite:///loadtest.db --users 20 --contacts 200 --duration 30 --output before.json``
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, ContactStat, User
+from src.repository.stats import stat_keys
+from src.services.auth import auth_service
+
+PASSWORD = "loadtest-password"
+EMAIL_TEMPLATE = "loadtest{}@example.com"
+NAMES = ("Anna", "Bohdan", "Daria", "Ihor", "Kateryna", "Maksym", "Olena", "Petro", "Sofia", "Taras")
+DEFAULT_MIX = "login=2,refresh=2,list=20,search=20,birthday=10,create=10,update=10,delete=5,avatar=0"
+# A 1x1 PNG for the avatar calls, which upload to Cloudinary and need real credentials
+AVATAR = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                       "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+
+def seed(db_url: str, users: int, contacts: int) -> None:
+    """
+        Replaces the load test users and their contacts (and contact statistics) in the database.
+        """
+    engine = create_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    password = auth_service.get_password_hash(PASSWORD)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        old_ids = select(User.id).where(User.email.like(EMAIL_TEMPLATE.format("%")))
+        connection.execute(delete(ContactStat).where(ContactStat.user_id.in_(old_ids)))
+        connection.execute(delete(Contact).where(Contact.user_id.in_(old_ids)))
+        connection.execute(delete(User).where(User.id.in_(old_ids)))
+        user_ids = connection.execute(insert(User).returning(User.id), [
+            {"username": f"loadtest{i}", "email": EMAIL_TEMPLATE.format(i), "password": password, "confirmed": True}
+            for i in range(users)]).scalars().all()
+        for user_id in user_ids:
+            rows, counter = [], Counter()
+            for i in range(contacts):
+                email = f"c{user_id}.{i}@example.com"
+                born_date = datetime(1960, 1, 1) + timedelta(days=rng.randrange(365 * 50))
+                rows.append({"name": rng.choice(NAMES), "surname": f"Surname{i}", "email": email,
+                             "phone": f"+380{user_id:04d}{i:05d}", "email_normalized": email,
+                             "phone_normalized": f"380{user_id:04d}{i:05d}", "born_date": born_date,
+                             "created_at": now, "updated_at": now, "user_id": user_id})
+                counter.update(stat_keys(now, born_date, email))
+            if rows:
+                connection.execute(insert(Contact), rows)
+                connection.execute(insert(ContactStat), [{"user_id": user_id, "kind": kind, "key": key, "count": count}
+                                                         for (kind, key), count in counter.items()])
+    engine.dispose()
+
+
+def load_accounts(db_url: str) -> list:
+    """
+        Returns (email, contact ids) of the seeded users.
+        """
+    engine = create_engine(db_url)
+    with sessionmaker(bind=engine)() as db:
+        users = db.query(User.id, User.email).filter(User.email.like(EMAIL_TEMPLATE.format("%"))).order_by(User.id).all()
+        contact_ids = {}
+        for user_id, contact_id in db.query(Contact.user_id, Contact.id)\
+                .filter(Contact.user_id.in_([user_id for user_id, _ in users]), Contact.deleted_at.is_(None)):
+            contact_ids.setdefault(user_id, []).append(contact_id)
+    engine.dispose()
+    return [(email, contact_ids.get(user_id, [])) for user_id, email in users]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights).difference(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations: {', '.join(sorted(unknown))}")
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def contact_body(rng: random.Random, unique: str) -> dict:
+    born_date = datetime(1960, 1, 1) + timedelta(days=rng.randrange(365 * 50))
+    return {"name": rng.choice(NAMES), "surname": f"Load{unique}", "email": f"load{unique}@example.com",
+            "phone": f"+1555{abs(hash(unique)) % 10 ** 9:09d}", "born_date": born_date.isoformat()}
+
+
+class VirtualUser:
+    def __init__(self, number: int, client: httpx.AsyncClient, email: str, contact_ids: list, seed_value: int):
+        self.number = number
+        self.client = client
+        self.email = email
+        self.contact_ids = list(contact_ids)
+        self.created_ids = []
+        self.rng = random.Random(seed_value)
+        self.access_token = None
+        self.refresh_token = None
+        self.counter = 0
+        # Documentation range addresses, one per user, for the rate limiter
+        self.address = f"198.18.{number // 256}.{number % 256}"
+
+    def headers(self, token: str | None = None) -> dict:
+        return {"Authorization": f"Bearer {token or self.access_token}", "X-Forwarded-For": self.address}
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post("/api/auth/login", data={"username": self.email, "password": PASSWORD},
+                                          headers={"X-Forwarded-For": self.address})
+        if response.status_code == 200:
+            self.access_token = response.json()["access_token"]
+            self.refresh_token = response.json()["refresh_token"]
+        return response
+
+    async def refresh(self) -> httpx.Response:
+        response = await self.client.get("/api/auth/refresh_token", headers=self.headers(self.refresh_token))
+        if response.status_code == 200:
+            self.access_token = response.json()["access_token"]
+            self.refresh_token = response.json()["refresh_token"]
+        return response
+
+    async def list(self) -> httpx.Response:
+        skip = self.rng.randrange(max(len(self.contact_ids), 1))
+        return await self.client.get("/api/contacts/", params={"skip": skip, "limit": 20}, headers=self.headers())
+
+    async def search(self) -> httpx.Response:
+        return await self.client.get(f"/api/contacts/search/{self.rng.choice(NAMES)}", params={"limit": 20},
+                                     headers=self.headers())
+
+    async def birthday(self) -> httpx.Response:
+        return await self.client.get("/api/contacts/birthday/", headers=self.headers())
+
+    async def create(self) -> httpx.Response:
+        self.counter += 1
+        body = contact_body(self.rng, f"{self.number}.{self.counter}.{time.time_ns()}")
+        response = await self.client.post("/api/contacts/", json=body, headers=self.headers())
+        if response.status_code == 201:
+            self.created_ids.append(response.json()["id"])
+        return response
+
+    def choose(self, operations: list, weights: list) -> str:
+        operation = self.rng.choices(operations, weights)[0]
+        # Nothing to change yet: create a contact instead, and report it as such
+        if operation == "delete" and not self.created_ids or operation == "update" and not (
+                self.created_ids or self.contact_ids):
+            return "create"
+        return operation
+
+    async def update(self) -> httpx.Response:
+        ids = self.created_ids or self.contact_ids
+        self.counter += 1
+        body = contact_body(self.rng, f"{self.number}.{self.counter}.{time.time_ns()}")
+        body["done"] = True
+        return await self.client.put(f"/api/contacts/{self.rng.choice(ids)}", json=body, headers=self.headers())
+
+    async def delete(self) -> httpx.Response:
+        contact_id = self.created_ids.pop(self.rng.randrange(len(self.created_ids)))
+        return await self.client.delete(f"/api/contacts/{contact_id}", headers=self.headers())
+
+    async def avatar(self) -> httpx.Response:
+        return await self.client.patch("/api/users/avatar", files={"file": ("avatar.png", AVATAR, "image/png")},
+                                       headers=self.headers())
+
+
+OPERATIONS = ("login", "refresh", "list", "search", "birthday", "create", "update", "delete", "avatar")
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+        Nearest-rank percentile of sorted values.
+        """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def report(samples: dict, elapsed: float) -> dict:
+    """
+        Summarizes the samples of each operation: {operation: [(status, seconds), ...]}. Latencies are
+        those of the successful calls; rate limited calls (429) count in neither the latencies nor
+        the error rates.
+        """
+    routes = {}
+    total = errors = limited = 0
+    for operation, results in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for status, seconds in results if 200 <= status < 300)
+        statuses = Counter(str(status) for status, _ in results)
+        rate_limited = statuses.get("429", 0)
+        answered = len(results) - rate_limited
+        failed = answered - len(latencies)
+        total += len(results)
+        errors += failed
+        limited += rate_limited
+        routes[operation] = {
+            "requests": len(results),
+            "rate_limited": rate_limited,
+            "throughput": round(len(results) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+            "error_rate": round(failed / answered, 4) if answered else 0.0,
+            "statuses": dict(sorted(statuses.items())),
+        }
+    answered = total - limited
+    return {"requests": total, "rate_limited": limited, "seconds": round(elapsed, 2),
+            "throughput": round(total / elapsed, 2),
+            "error_rate": round(errors / answered, 4) if answered else 0.0, "routes": routes}
+
+
+async def run(url: str, accounts: list, concurrency: int, duration: float, mix: dict) -> dict:
+    samples = {operation: [] for operation in mix}
+    operations, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        users = [VirtualUser(i, client, email, contact_ids, seed_value=i)
+                 for i, (email, contact_ids) in enumerate(accounts[:concurrency])]
+
+        async def measure(user: VirtualUser, operation: str) -> None:
+            started = time.perf_counter()
+            try:
+                response = await getattr(user, operation)()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.setdefault(operation, []).append((status, time.perf_counter() - started))
+
+        async def drive(user: VirtualUser) -> None:
+            while time.perf_counter() < deadline:
+                await measure(user, user.choose(operations, weights))
+
+        # Before the timed window, so not measured; a user whose login failed gets 401s in the report
+        await asyncio.gather(*(user.login() for user in users), return_exceptions=True)
+        begin = time.perf_counter()
+        deadline = begin + duration
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - begin
+    return report(samples, elapsed)
+
+
+def start_fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("--fake-redis needs fakeredis[lua], a dev dependency")
+    server = fakeredis.TcpFakeServer((settings.redis_host, settings.redis_port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_server(db_url: str, url: str, list_rate_limit: int | None = None) -> subprocess.Popen:
+    address = httpx.URL(url)
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URL=db_url)
+    if list_rate_limit is not None:
+        env["CONTACTS_LIST_RATE_LIMIT"] = str(list_rate_limit)
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", address.host,
+                                "--port", str(address.port or 80), "--log-level", "warning"], env=env,
+                               stdout=sys.stderr)
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}/openapi.json", timeout=1)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                sys.exit("The server exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("The server did not start")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list | None = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server")
+    parser.add_argument("--db", default=settings.sqlalchemy_database_url, help="Database URL of the server")
+    parser.add_argument("--users", type=int, default=20, help="Number of seeded users")
+    parser.add_argument("--contacts", type=int, default=200, help="Contacts per seeded user")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the users of a previous run")
+    parser.add_argument("--concurrency", type=int, help="Virtual users (default: --users)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--start-server", action="store_true", help="Start uvicorn main:app on --url")
+    parser.add_argument("--list-rate-limit", type=int,
+                        help="Requests per minute per client to GET /contacts/ on a started server")
+    parser.add_argument("--fake-redis", action="store_true", help="Serve a fakeredis stand-in")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as err:
+        parser.error(str(err))
+    concurrency = args.concurrency or args.users
+    if not args.no_seed:
+        seed(args.db, args.users, args.contacts)
+    accounts = load_accounts(args.db)
+    if concurrency > len(accounts):
+        parser.error(f"--concurrency {concurrency} needs as many seeded users, found {len(accounts)}")
+
+    fake_redis = start_fake_redis() if args.fake_redis else None
+    if args.list_rate_limit is not None and not args.start_server:
+        parser.error("--list-rate-limit needs --start-server")
+    server = start_server(args.db, args.url, args.list_rate_limit) if args.start_server else None
+    try:
+        result = asyncio.run(run(args.url, accounts, concurrency, args.duration, mix))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if fake_redis is not None:
+            fake_redis.shutdown()
+    result = {"revision": git_revision(), "finished": datetime.utcnow().isoformat(timespec="seconds"),
+              "concurrency": concurrency, "users": len(accounts), "contacts_per_user": args.contacts,
+              "mix": mix, **result}
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,48 @@ import uvicorn
 from ipaddress import ip_address
 from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
-from src.routes import contacts, auth, users
-import redis.asyncio as redis
+from src.routes import contacts, auth, users, metrics, profiling, batch
+import redis
 from src.conf.config import settings
+from src.services.revocation import revocation
+from src.services import autocomplete
+from src.services.compression import CompressionMiddleware
+from src.services.profiling import ProfilingMiddleware, profiler
+from src.services.query_capture import capture
+from src.services.redis_clients import redis_clients
+from src.services.tracing import TracingMiddleware, tracer
 from starlette.middleware.cors import CORSMiddleware
 app = FastAPI()
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(profiling.router, prefix='/api')
+app.include_router(batch.router, prefix='/api')
+app.include_router(metrics.router)
 
 @app.on_event("startup")
 async def startup():
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    try:
+        await FastAPILimiter.init(redis_clients.async_client(decode_responses=True))
+    except redis.RedisError as err:
+        # Rate limits are counted per process until Redis is reachable
+        print(err)
+    revocation.start()
+    autocomplete.cache.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    revocation.stop()
+    autocomplete.cache.stop()
+    tracer.flush()
+    if settings.query_capture_path:
+        capture.save(settings.query_capture_path)
+    await redis_clients.aclose()
+
+# Innermost, so that the routes run in the task of the profiled request
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,8 +51,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Capped", "X-Trace-Id", "traceresponse",
+                    "X-Profile", "ETag"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    zstd_level=settings.compression_zstd_level,
+)
+
+# Outermost, so that the trace covers the whole request
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 
 ALLOWED_IPS = [ip_address('192.168.1.0'), ip_address('172.16.0.0'), ip_address("127.0.0.1")]
 
@@ -0,0 +1,70 @@
+"""Per-user normalized email and phone
+
+Revision ID: 38477b723d6f
+Revises: 1ec5436b3e17
+Create Date: 2026-10-19 10:12:41.305114
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '38477b723d6f'
+down_revision = '1ec5436b3e17'
+branch_labels = None
+depends_on = None
+
+
+def _normalize_email(email):
+    return email.strip().lower() or None if email else None
+
+
+def _normalize_phone(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    return digits or None
+
+
+def upgrade() -> None:
+    op.drop_constraint('contacts_email_key', 'contacts', type_='unique')
+    op.drop_constraint('contacts_phone_key', 'contacts', type_='unique')
+    op.add_column('contacts', sa.Column('email_normalized', sa.String(length=50), nullable=True))
+    op.add_column('contacts', sa.Column('phone_normalized', sa.String(length=50), nullable=True))
+
+    # Backfill; rows that already duplicate an earlier contact of the same user keep NULL so the
+    # unique indexes can be built, and are reported by the duplicate scan instead.
+    contacts = sa.table('contacts', sa.column('id'), sa.column('user_id'), sa.column('email'), sa.column('phone'),
+                        sa.column('email_normalized'), sa.column('phone_normalized'))
+    bind = op.get_bind()
+    seen_emails, seen_phones, updates = set(), set(), []
+    rows = bind.execute(sa.select(contacts.c.id, contacts.c.user_id, contacts.c.email, contacts.c.phone)
+                        .order_by(contacts.c.id))
+    for contact_id, user_id, email, phone in rows:
+        email, phone = _normalize_email(email), _normalize_phone(phone)
+        if email is not None:
+            email = None if (user_id, email) in seen_emails else email
+            seen_emails.add((user_id, email))
+        if phone is not None:
+            phone = None if (user_id, phone) in seen_phones else phone
+            seen_phones.add((user_id, phone))
+        updates.append({"contact_id": contact_id, "email": email, "phone": phone})
+    if updates:
+        bind.execute(contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+                     .values(email_normalized=sa.bindparam('email'), phone_normalized=sa.bindparam('phone')),
+                     updates)
+
+    op.create_index('ix_contacts_user_email_normalized', 'contacts', ['user_id', 'email_normalized'], unique=True)
+    op.create_index('ix_contacts_user_phone_normalized', 'contacts', ['user_id', 'phone_normalized'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_phone_normalized', table_name='contacts')
+    op.drop_index('ix_contacts_user_email_normalized', table_name='contacts')
+    op.drop_column('contacts', 'phone_normalized')
+    op.drop_column('contacts', 'email_normalized')
+    op.create_unique_constraint('contacts_phone_key', 'contacts', ['phone'])
+    op.create_unique_constraint('contacts_email_key', 'contacts', ['email'])
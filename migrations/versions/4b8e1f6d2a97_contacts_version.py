@@ -0,0 +1,24 @@
+"""Contacts version
+
+Revision ID: 4b8e1f6d2a97
+Revises: 7d3f0b9a2c41
+Create Date: 2026-10-19 18:40:52.731204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e1f6d2a97'
+down_revision = '7d3f0b9a2c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('contacts', 'version')
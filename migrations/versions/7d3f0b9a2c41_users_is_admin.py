@@ -0,0 +1,25 @@
+"""Users is_admin
+
+Revision ID: 7d3f0b9a2c41
+Revises: c2cefd58e52c
+Create Date: 2026-10-19 15:02:11.408125
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f0b9a2c41'
+down_revision = 'c2cefd58e52c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('is_admin', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    # Grant admin rights with: UPDATE users SET is_admin = true WHERE email = '...'
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'is_admin')
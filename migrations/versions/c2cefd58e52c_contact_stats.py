@@ -0,0 +1,36 @@
+"""Contact statistics counters
+
+Revision ID: c2cefd58e52c
+Revises: ed67024bb7e6
+Create Date: 2026-10-19 12:20:05.118237
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2cefd58e52c'
+down_revision = 'ed67024bb7e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('created_at', sa.DateTime(), nullable=True))
+    # When the existing contacts were added was never recorded: their created_at stays NULL and they
+    # count in the totals but not in the contacts added per month
+    op.create_table('contact_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'kind', 'key')
+    )
+    # Counters start empty: fill them with `python -m src.jobs.rebuild_stats` after upgrading
+
+
+def downgrade() -> None:
+    op.drop_table('contact_stats')
+    op.drop_column('contacts', 'created_at')
@@ -0,0 +1,45 @@
+"""Contacts updated_at and soft-delete tombstones
+
+Revision ID: ed67024bb7e6
+Revises: 38477b723d6f
+Create Date: 2026-10-19 11:02:17.480553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ed67024bb7e6'
+down_revision = '38477b723d6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+    op.alter_column('contacts', 'updated_at', server_default=None)
+    op.add_column('contacts', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_contacts_user_updated_at', 'contacts', ['user_id', 'updated_at', 'id'], unique=False)
+    op.create_index('ix_contacts_deleted_at', 'contacts', ['deleted_at'], unique=False,
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'))
+
+    # Tombstones keep their email/phone, so uniqueness only applies to live contacts
+    op.drop_index('ix_contacts_user_email_normalized', table_name='contacts')
+    op.drop_index('ix_contacts_user_phone_normalized', table_name='contacts')
+    op.create_index('ix_contacts_user_email_normalized', 'contacts', ['user_id', 'email_normalized'], unique=True,
+                    postgresql_where=sa.text('deleted_at IS NULL'))
+    op.create_index('ix_contacts_user_phone_normalized', 'contacts', ['user_id', 'phone_normalized'], unique=True,
+                    postgresql_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.execute('DELETE FROM contacts WHERE deleted_at IS NOT NULL')
+    op.drop_index('ix_contacts_user_phone_normalized', table_name='contacts')
+    op.drop_index('ix_contacts_user_email_normalized', table_name='contacts')
+    op.create_index('ix_contacts_user_email_normalized', 'contacts', ['user_id', 'email_normalized'], unique=True)
+    op.create_index('ix_contacts_user_phone_normalized', 'contacts', ['user_id', 'phone_normalized'], unique=True)
+    op.drop_index('ix_contacts_deleted_at', table_name='contacts')
+    op.drop_index('ix_contacts_user_updated_at', table_name='contacts')
+    op.drop_column('contacts', 'deleted_at')
+    op.drop_column('contacts', 'updated_at')
@@ -12,9 +12,67 @@ class Settings(BaseSettings):
     mail_server: str = 'smtp.meta.ua'
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    redis_socket_timeout: float = 0.1
+    redis_connect_timeout: float = 0.1
+    redis_max_connections: int = 50
+    redis_async_max_connections: int = 1000
+    redis_pool_timeout: float = 0.1
+    redis_breaker_failures: int = 5
+    redis_breaker_reset_seconds: float = 10.0
+    singleflight_redis_lock: bool = False
+    singleflight_lock_ttl: float = 5.0
+    singleflight_lock_wait: float = 1.0
+    cache_refresh_beta: float = 1.0
+    local_user_cache_size: int = 10000
+    local_user_cache_ttl: int = 60
     cloudinary_name: str = 'name'
     cloudinary_api_key: int = 374973425137947
     cloudinary_api_secret: str = 'secret'
+    access_token_expire_minutes: int = 15
+    revocation_bloom_capacity: int = 100000
+    revocation_bloom_error_rate: float = 0.001
+    revocation_rebuild_seconds: int = 300
+    contacts_batch_max_ids: int = 5000
+    batch_max_operations: int = 500
+    compression_minimum_size: int = 500
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+    contact_events_history: int = 1000
+    contact_events_ttl: int = 86400
+    contact_events_buffer: int = 100
+    contact_events_heartbeat: int = 15
+    contact_events_retry_ms: int = 3000
+    contacts_list_rate_limit: int = 10
+    contacts_changes_limit: int = 500
+    contacts_changes_settle_seconds: int = 5
+    contacts_tombstone_retention_days: int = 30
+    birthday_digest_ttl: int = 172800
+    birthday_digest_budget_seconds: int = 120
+    birthday_digest_email: bool = False
+    contacts_search_count_cap: int = 1000
+    query_capture_path: str | None = None
+    autocomplete_max_entries: int = 2000000
+    autocomplete_ttl: int = 60
+    contacts_fuzzy_max_distance: int = 2
+    contacts_fuzzy_limit: int = 20
+    users_bulk_max_users: int = 5000
+    users_bulk_batch_size: int = 500
+    password_hash_workers: int | None = None
+    mail_concurrency: int = 5
+    contacts_cache_ttl: int = 300
+    contacts_cache_list_ttl: int = 60
+    contacts_cache_list_rows: int = 500
+    contacts_cache_version_ttl: int = 86400
+    tracing_sample_rate: float = 0.0
+    tracing_slow_request_ms: float | None = None
+    tracing_file: str | None = None
+    tracing_otlp_endpoint: str | None = None
+    tracing_service_name: str = 'contacts-api'
+    profiling_dir: str = 'profiles'
+    profiling_max_bytes: int = 100 * 1024 * 1024
+    profiling_interval_ms: float = 5.0
+    profiling_max_rules: int = 20
 
     class Config:
         env_file = ".env"
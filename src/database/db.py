@@ -1,12 +1,24 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from functools import wraps
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, Session
 
 from src.conf.config import settings
+from src.services.query_capture import capture
+from src.services.tracing import instrument_engine
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# SQLite connections are opened in the threadpool and used by async routes on the event loop
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+if settings.query_capture_path:
+    # Workload for the index advisor, saved on shutdown
+    capture.attach(engine)
+instrument_engine(engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# A session checks out a connection on its first statement. Objects stay loaded after commit, so
+# responses are serialized without checking out a connection again.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 # Dependency
@@ -18,3 +30,53 @@ def get_db():
         db.close()
 
 
+@event.listens_for(Session, "after_flush")
+def _mark_written(session: Session, flush_context) -> None:
+    session.info["written"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_executed_write(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["written"] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_written(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("written", None)
+
+
+def release_connection(db: Session) -> None:
+    """
+        Ends a read-only transaction so that its connection returns to the pool right away instead of
+        when the session is closed after the response is sent. Loaded objects stay attached to the
+        session. A transaction that wrote anything is left for its owner to commit.
+
+        :param db: The database session.
+        :type db: Session
+        """
+    if not isinstance(db, Session) or not db.in_transaction() or db.info.get("written"):
+        return
+    if db.new or db.dirty or db.deleted:
+        return
+    db.commit()
+
+
+def releases_connection(func):
+    """
+        Decorates a read-only repository function to release the connection of its ``db`` session
+        as soon as it returns.
+        """
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            db = kwargs.get("db")
+            if db is None:
+                db = next((arg for arg in args if isinstance(arg, Session)), None)
+            release_connection(db)
+
+    return wrapper
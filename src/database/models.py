@@ -1,23 +1,62 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, func, Table, Index, text
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+
+from src.services.duplicates import normalize_email, normalize_phone
 
 
 Base = declarative_base()
 
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index('ix_contacts_user_email_normalized', 'user_id', 'email_normalized', unique=True,
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        Index('ix_contacts_user_phone_normalized', 'user_id', 'phone_normalized', unique=True,
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        Index('ix_contacts_user_updated_at', 'user_id', 'updated_at', 'id'),
+        Index('ix_contacts_deleted_at', 'deleted_at',
+              postgresql_where=text('deleted_at IS NOT NULL'), sqlite_where=text('deleted_at IS NOT NULL')),
+    )
+    # The new version is read back with RETURNING instead of a SELECT after each flush
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True)
     name = Column(String(50), nullable=False)
     surname = Column(String(50), nullable=False)
-    email = Column(String(50), unique=True)
-    phone = Column(String(50), nullable=False, unique=True)
+    email = Column(String(50))
+    phone = Column(String(50), nullable=False)
+    email_normalized = Column(String(50))
+    phone_normalized = Column(String(50))
     born_date = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deleted_at = Column(DateTime, nullable=True)
+    # Bumped by every UPDATE, ORM or not; sent as the ETag of the contact
+    version = Column(Integer, nullable=False, server_default=text('1'), onupdate=text('version + 1'))
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="notes")
 
+    @validates('email')
+    def validate_email(self, key, email):
+        self.email_normalized = normalize_email(email)
+        return email
+
+    @validates('phone')
+    def validate_phone(self, key, phone):
+        self.phone_normalized = normalize_phone(phone)
+        return phone
+
+class ContactStat(Base):
+    __tablename__ = "contact_stats"
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    kind = Column(String(20), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -27,4 +66,5 @@ class User(Base):
     created_at = Column('crated_at', DateTime, default=func.now())
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
-    confirmed = Column(Boolean, default=False)
\ No newline at end of file
+    confirmed = Column(Boolean, default=False)
+    is_admin = Column(Boolean, nullable=False, default=False, server_default=text('false'))
\ No newline at end of file
@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import sys
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine
+
+from src.conf.config import settings
+from src.services.index_advisor import advise, render_migration
+from src.services.query_capture import load_capture, merge_captures
+
+
+def main(argv=None) -> int:
+    """
+        Proposes the indexes missing for a captured query workload.
+
+        Capture the workload by running the app (or benchmarks/loadtest.py --start-server) with
+        ``QUERY_CAPTURE_PATH=capture.json``; the statements are saved on shutdown. Then
+        ``python -m src.jobs.advise_indexes capture.json`` prints every statement with its calls,
+        timings, full scans (from EXPLAIN against ``--db``) and the proposed indexes, and
+        ``--migration`` writes them as an Alembic migration to review before applying.
+        """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="capture files to merge")
+    parser.add_argument("--db", default=settings.sqlalchemy_database_url, help="database to EXPLAIN against")
+    parser.add_argument("--min-calls", type=int, default=1, help="ignore statements executed fewer times")
+    parser.add_argument("--migration", action="store_true", help="write the proposals as an Alembic migration")
+    parser.add_argument("--alembic-config", default="alembic.ini")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    statements = {}
+    for path in args.captures:
+        merge_captures(statements, load_capture(path))
+    engine = create_engine(args.db)
+    with engine.connect() as connection:
+        report = advise(statements, connection, args.min_calls)
+    engine.dispose()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for statement in report["statements"]:
+            print(f"{statement['calls']:>8} calls {statement['total_ms']:>10} ms {statement['mean_ms']:>9} ms/call"
+                  f"  {statement['statement'][:160]}")
+            if statement.get("full_scans"):
+                print(f"{'':>8} full scan of {', '.join(statement['full_scans'])}")
+            if statement.get("error"):
+                print(f"{'':>8} EXPLAIN failed: {statement['error']}")
+            for note in statement["notes"]:
+                print(f"{'':>8} {note}")
+            for name in statement["proposed"]:
+                print(f"{'':>8} -> {name}")
+        print(f"{len(report['proposals'])} indexes proposed")
+        for proposal in report["proposals"]:
+            where = f" WHERE {proposal['where']}" if proposal["where"] else ""
+            print(f"  {proposal['name']} ON {proposal['table']} ({', '.join(proposal['columns'])}){where}"
+                  f"  [{proposal['calls']} calls, {proposal['total_ms']} ms]")
+
+    if args.migration and report["proposals"]:
+        script = ScriptDirectory.from_config(Config(args.alembic_config))
+        source = render_migration(report["proposals"], script.get_current_head())
+        revision = source.split("revision = '", 1)[1].split("'", 1)[0]
+        path = os.path.join(script.versions, f"{revision}_advisor_indexes.py")
+        with open(path, "w") as file:
+            file.write(source)
+        print(f"Migration written to {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
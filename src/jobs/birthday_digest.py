@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import time
+from datetime import date
+from typing import Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import User
+from src.repository.contacts import birthday_window, upcoming_birthdays_all_users
+from src.services.birthdays import build_digests, store_digests
+from src.services.email import send_birthday_digest
+
+EMAIL_CONCURRENCY = 10
+
+
+def compute_digests(db: Session, today: date) -> Iterator[Tuple[int, List[dict]]]:
+    """
+        Computes the next-7-day birthday digests of all users in one pass over the contacts table.
+
+        :param db: The database session.
+        :type db: Session
+        :param today: The first day of the window.
+        :type today: date
+        :return: (user_id, contacts) pairs for every user.
+        :rtype: Iterator[Tuple[int, List[dict]]]
+        """
+    user_ids = [user_id for user_id, in db.query(User.id).order_by(User.id)]
+    rows = upcoming_birthdays_all_users(db, today)
+    return build_digests(user_ids, rows, birthday_window(today))
+
+
+async def send_digests(db: Session, digests: List[Tuple[int, List[dict]]]) -> None:
+    semaphore = asyncio.Semaphore(EMAIL_CONCURRENCY)
+    contacts_by_user = dict(digests)
+    users = db.query(User.id, User.email, User.username).filter(User.id.in_(contacts_by_user), User.confirmed)
+
+    async def send(email, username, contacts):
+        async with semaphore:
+            await send_birthday_digest(email, username, contacts)
+
+    await asyncio.gather(*[send(email, username, contacts_by_user[user_id]) for user_id, email, username in users])
+
+
+async def main(send_emails: bool = settings.birthday_digest_email) -> int:
+    """
+        Precomputes today's birthday digests of all users into Redis and optionally emails them.
+        Fails (exit code 1) when the run exceeds ``birthday_digest_budget_seconds``.
+
+        Run every morning, e.g. from cron: ``python -m src.jobs.birthday_digest [--email]``
+        """
+    started = time.monotonic()
+    today = date.today()
+    to_send = []
+    db = SessionLocal()
+    try:
+        def collect(digests):
+            for user_id, contacts in digests:
+                if send_emails and contacts:
+                    to_send.append((user_id, contacts))
+                yield user_id, contacts
+
+        stored = store_digests(collect(compute_digests(db, today)), today)
+        computed = time.monotonic() - started
+        if to_send:
+            await send_digests(db, to_send)
+    finally:
+        db.close()
+    elapsed = time.monotonic() - started
+    print(f"Stored {stored} birthday digests for {today.isoformat()} in {computed:.1f}s, "
+          f"emailed {len(to_send)}, total {elapsed:.1f}s")
+    if computed > settings.birthday_digest_budget_seconds:
+        print(f"Over the time budget of {settings.birthday_digest_budget_seconds}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(send_emails=settings.birthday_digest_email or "--email" in sys.argv)))
@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.repository.contacts import purge_tombstones
+
+
+async def main() -> int:
+    """
+        Purges contact tombstones older than ``contacts_tombstone_retention_days``. Clients whose sync
+        token is older than that get 410 from /contacts/changes and run a full sync.
+
+        Run periodically, e.g. daily from cron: ``python -m src.jobs.compact_tombstones``
+        """
+    before = datetime.utcnow() - timedelta(days=settings.contacts_tombstone_retention_days)
+    db = SessionLocal()
+    try:
+        purged = await purge_tombstones(before, db)
+    finally:
+        db.close()
+    print(f"Purged {purged} contact tombstones deleted before {before.isoformat()}")
+    return purged
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+import argparse
+import sys
+from collections import Counter
+
+from src.database.db import SessionLocal
+from src.repository.stats import count_contact_stats, stored_contact_stats, replace_contact_stats
+
+
+def main(argv=None) -> int:
+    """
+        Reconciles the contact statistics counters with the contacts table.
+
+        ``python -m src.jobs.rebuild_stats --verify`` reports users whose counters drifted (exit code 1);
+        without ``--verify`` the counters of those users are rewritten. Run the rebuild when contacts
+        of the affected users are not being written, or repeat it until verify passes.
+        """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--verify", action="store_true", help="only report drifted counters")
+    parser.add_argument("--user", type=int, action="append", dest="user_ids", help="limit to user id (repeatable)")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        expected = count_contact_stats(db, args.user_ids)
+        stored = stored_contact_stats(db, args.user_ids)
+        drifted = []
+        for user_id in sorted(set(expected) | set(stored)):
+            want, have = expected.get(user_id, Counter()), stored.get(user_id, Counter())
+            if {key: count for key, count in want.items() if count} == dict(have):
+                continue
+            drifted.append(user_id)
+            diff = {key: (have.get(key, 0), want.get(key, 0)) for key in set(want) | set(have)
+                    if have.get(key, 0) != want.get(key, 0)}
+            print(f"user {user_id}: (stored, actual) {diff}")
+            if not args.verify:
+                replace_contact_stats(db, user_id, want)
+                db.commit()
+    finally:
+        db.close()
+    print(f"{len(drifted)} users with drifted counters" + ("" if args.verify else " rebuilt"))
+    return 1 if drifted and args.verify else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,31 @@
-from typing import List
-from datetime import datetime, timedelta
+import calendar
+import sys
+from typing import Iterable, List, Tuple, Iterator
+from datetime import date, datetime, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import tuple_, select, delete, extract, func, update
+from sqlalchemy.orm import Session, Query, load_only
 
+from src.database.db import releases_connection
+from src.services.tracing import instrument_module
 from src.database.models import Contact, User
 from src.schemas import ContactBase, ContactResponse, ContactUpdate
+from src.services.duplicates import find_duplicate_pairs, normalize_email, normalize_phone
+from src.services import events
+# Committed changes invalidate the cached contact responses through its event listener
+from src.services import contact_cache  # noqa: F401
+from src.repository.stats import contact_stat_keys, record_contact_stats, stat_keys
 
 
-async def show_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+def _load_only(query: Query, fields: Tuple[str, ...] | None) -> Query:
+    if fields:
+        query = query.options(load_only(*[getattr(Contact, field) for field in fields]))
+    return query
+
+
+@releases_connection
+async def show_contacts(skip: int, limit: int, user: User, db: Session,
+                        fields: Tuple[str, ...] | None = None) -> List[Contact]:
     """
         Retrieves a list of contacts for a specific user with specified pagination parameters.
 
@@ -19,13 +37,17 @@ async def show_contacts(skip: int, limit: int, user: User, db: Session) -> List[
         :type user: User
         :param db: The database session.
         :type db: Session
+        :param fields: Load only these columns (all when None).
+        :type fields: Tuple[str, ...] | None
         :return: A list of contacts.
         :rtype: List[Contact]
         """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    query = db.query(Contact).filter(Contact.user_id == user.id, Contact.deleted_at.is_(None))
+    return _load_only(query, fields).offset(skip).limit(limit).all()
 
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+@releases_connection
+async def get_contact(contact_id: int, user: User, db: Session, fields: Tuple[str, ...] | None = None) -> Contact:
     """
         Retrieves a single contact with the specified ID for a specific user.
 
@@ -35,13 +57,49 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
         :type user: User
         :param db: The database session.
         :type db: Session
+        :param fields: Load only these columns (all when None).
+        :type fields: Tuple[str, ...] | None
         :return: The contact with the specified ID, or None if it does not exist.
         :rtype: Note | None
         """
-    return db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+    query = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None))
+    return _load_only(query, fields).first()
+
+
+@releases_connection
+async def get_contacts_by_ids(contact_ids: List[int], user: User, db: Session) -> List[Contact]:
+    """
+        Retrieves the contacts with the specified IDs for a specific user in a single query.
+
+        :param contact_ids: The IDs of the contacts to retrieve.
+        :type contact_ids: List[int]
+        :param user: The user to retrieve the contacts for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The contacts found; IDs that do not exist or belong to another user are skipped.
+        :rtype: List[Contact]
+        """
+    return db.query(Contact).filter(Contact.id.in_(contact_ids), Contact.user_id == user.id, Contact.deleted_at.is_(None)).all()
+
 
 
-async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
+@releases_connection
+async def contact_summaries(user: User, db: Session) -> List[dict]:
+    """
+        Retrieves the response fields of all contacts of a specific user, to build the autocomplete index.
+
+        :param user: The user to retrieve the contacts for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The contacts as dicts of the ContactResponse fields.
+        :rtype: List[dict]
+        """
+    columns = [getattr(Contact, field) for field in ContactResponse.__fields__]
+    return [row._asdict() for row in db.query(*columns).filter(Contact.user_id == user.id, Contact.deleted_at.is_(None))]
+
+async def create_contact(body: ContactBase, user: User, db: Session, commit: bool = True) -> Contact:
     """
         Creates a new contact for a specific user.
 
@@ -51,19 +109,26 @@ async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
         :type user: User
         :param db: The database session.
         :type db: Session
+        :param commit: Commit the change, or only flush it into the caller's transaction.
+        :type commit: bool
         :return: The newly created contact.
         :rtype: Contact
         """
     contact = Contact(name=body.name, surname=body.surname, email=body.email, phone=body.phone, born_date=body.born_date, user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    db.flush()
+    record_contact_stats(db, user.id, added=contact_stat_keys(contact))
+    events.queue_contact_event(db, events.CREATED, contact)
+    if commit:
+        db.commit()
+        db.refresh(contact)
     return contact
 
 
-async def remove_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: Session, commit: bool = True) -> Contact | None:
     """
-        Removes a single contact with the specified ID for a specific user.
+        Removes a single contact with the specified ID for a specific user. The row is kept as a
+        tombstone for delta sync until purge_tombstones removes it.
 
         :param contact_id: The ID of the contact to remove.
         :type contact_id: int
@@ -71,17 +136,25 @@ async def remove_contact(contact_id: int, user: User, db: Session) -> Contact |
         :type user: User
         :param db: The database session.
         :type db: Session
+        :param commit: Commit the change, or only flush it into the caller's transaction.
+        :type commit: bool
         :return: The removed contact, or None if it does not exist.
         :rtype: Contact | None
         """
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None)).first()
     if contact:
-        db.delete(contact)
-        db.commit()
+        contact.deleted_at = contact.updated_at = datetime.utcnow()
+        record_contact_stats(db, user.id, removed=contact_stat_keys(contact))
+        events.queue_contact_event(db, events.DELETED, contact)
+        if commit:
+            db.commit()
+        else:
+            db.flush()
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: Session) -> Contact | None:
+async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: Session,
+                         commit: bool = True) -> Contact | None:
     """
         Updates a single contact with the specified ID for a specific user.
 
@@ -93,22 +166,99 @@ async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: S
         :type user: User
         :param db: The database session.
         :type db: Session
+        :param commit: Commit the change, or only flush it into the caller's transaction.
+        :type commit: bool
         :return: The updated contact, or None if it does not exist.
         :rtype: Contact | None
         """
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None)).first()
     if contact:
+        old_keys = contact_stat_keys(contact)
         contact.name = body.name
         contact.surname = body.surname
         contact.email = body.email
         contact.phone = body.phone
         contact.born_date = body.born_date
-        db.commit()
+        db.flush()
+        record_contact_stats(db, user.id, added=contact_stat_keys(contact), removed=old_keys)
+        events.queue_contact_event(db, events.UPDATED, contact)
+        if commit:
+            db.commit()
     return contact
 
-async def search_contacts(credentials: str, user: User, db: Session) -> Contact:
+
+async def patch_contact(contact_id: int, changes: dict, user: User, db: Session,
+                        versions: Iterable[int] | None = None) -> Contact | None:
     """
-        Searches a single contact with the specified credentials for a specific user.
+        Updates the given fields of a contact with a single UPDATE ... RETURNING, without reading it
+        first. A change of the email or birth date moves the contact between statistics counters,
+        which needs the old values: PostgreSQL returns them from the same statement, other
+        databases read them first.
+
+        :param contact_id: The ID of the contact to update.
+        :type contact_id: int
+        :param changes: The new values of the changed fields.
+        :type changes: dict
+        :param user: The user to update the contact for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :param versions: Update only if the contact has one of these versions (any when None).
+        :type versions: Iterable[int] | None
+        :return: The updated contact, or None if it does not exist or has another version.
+        :rtype: Contact | None
+        """
+    values = dict(changes)
+    if "email" in values:
+        values["email_normalized"] = normalize_email(values["email"])
+    if "phone" in values:
+        values["phone_normalized"] = normalize_phone(values["phone"])
+    conditions = [Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None)]
+    if versions is not None:
+        conditions.append(Contact.version.in_(list(versions)))
+    statement = update(Contact).values(values)
+    old_keys = None
+    if "email" in changes or "born_date" in changes:
+        old = select(Contact.id, Contact.created_at, Contact.born_date, Contact.email).where(*conditions)
+        if db.get_bind().dialect.name == "postgresql":
+            # The subquery locks the row and reads the values the UPDATE replaces
+            old = old.with_for_update().subquery("old")
+            row = db.execute(statement.where(Contact.id == old.c.id)
+                             .returning(Contact, old.c.created_at, old.c.born_date, old.c.email)).first()
+            if row is None:
+                return None
+            contact, old_keys = row[0], stat_keys(*row[1:])
+        else:
+            row = db.execute(old).first()
+            if row is None:
+                return None
+            old_keys = stat_keys(*row[1:])
+            contact = db.execute(statement.where(*conditions).returning(Contact)).scalar()
+    else:
+        contact = db.execute(statement.where(*conditions).returning(Contact)).scalar()
+    if contact is None:
+        return None
+    if old_keys is not None:
+        record_contact_stats(db, user.id, added=contact_stat_keys(contact), removed=old_keys)
+    events.queue_contact_event(db, events.UPDATED, contact)
+    db.commit()
+    return contact
+
+
+SEARCH_COLUMNS = (Contact.name, Contact.surname, Contact.email)
+
+
+def _search_query(column, credentials: str, user: User, db: Session) -> Query:
+    request = "%{}%".format(credentials)
+    return db.query(Contact).filter(column.like(request), Contact.user_id == user.id, Contact.deleted_at.is_(None))
+
+
+@releases_connection
+async def search_contacts(credentials: str, user: User, db: Session, fields: Tuple[str, ...] | None = None,
+                          skip: int = 0, limit: int | None = None) -> List[Contact] | None:
+    """
+        Searches contacts with the specified credentials for a specific user. Names are matched first,
+        then surnames, then emails.
 
         :param credentials: Credentilas of the contact to search.
         :type credentials: int
@@ -116,21 +266,141 @@ async def search_contacts(credentials: str, user: User, db: Session) -> Contact:
         :type user: User
         :param db: The database session.
         :type db: Session
-        :return: The searched contact, or None if it does not exist.
-        :rtype: Contact | None
+        :param fields: Load only these columns (all when None).
+        :type fields: Tuple[str, ...] | None
+        :param skip: The number of contacts to skip.
+        :type skip: int
+        :param limit: The maximum number of contacts to return (all when None).
+        :type limit: int | None
+        :return: The searched contacts, or None if nothing matches.
+        :rtype: List[Contact] | None
         """
-    request = "%{}%".format(credentials)
-    if db.query(Contact).filter(Contact.name.like(request), Contact.user_id == user.id).all():
-        result = db.query(Contact).filter(Contact.name.like(request), Contact.user_id == user.id).all()
-        return result
-    if db.query(Contact).filter(Contact.surname.like(request), Contact.user_id == user.id).all():
-        result = db.query(Contact).filter(Contact.surname.like(request), Contact.user_id == user.id).all()
-        return result
-    if db.query(Contact).filter(Contact.email.like(request), Contact.user_id == user.id).all():
-        result = db.query(Contact).filter(Contact.email.like(request), Contact.user_id == user.id).all()
-        return result
-
-async def upcoming_birthday(user: User, db: Session):
+    for column in SEARCH_COLUMNS:
+        query = _search_query(column, credentials, user, db)
+        result = _load_only(query, fields).offset(skip).limit(limit).all()
+        if result:
+            return result
+        if skip and query.with_entities(Contact.id).first():
+            # Past the last page of this column's matches
+            return []
+
+
+@releases_connection
+async def count_search_contacts(credentials: str, user: User, db: Session, cap: int) -> int:
+    """
+        Counts the contacts search_contacts would find, reading no more than ``cap + 1`` matches.
+
+        :param credentials: Credentilas of the contact to search.
+        :type credentials: str
+        :param user: The user to search the contact for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :param cap: The count to stop at.
+        :type cap: int
+        :return: The number of matches; a value above ``cap`` means "more than cap".
+        :rtype: int
+        """
+    for column in SEARCH_COLUMNS:
+        matches = _search_query(column, credentials, user, db).with_entities(Contact.id).limit(cap + 1).subquery()
+        count = db.query(func.count()).select_from(matches).scalar()
+        if count:
+            return count
+    return 0
+
+
+def export_contacts(user: User, db: Session, fields: Tuple[str, ...] | None = None) -> Iterator[Contact]:
+    """
+        Streams all contacts of a specific user, fetching them from the database in chunks.
+
+        :param user: The user to export contacts for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :param fields: Load only these columns (all when None).
+        :type fields: Tuple[str, ...] | None
+        :return: An iterator over the contacts.
+        :rtype: Iterator[Contact]
+        """
+    query = db.query(Contact).filter(Contact.user_id == user.id, Contact.deleted_at.is_(None)).order_by(Contact.id)
+    return _load_only(query, fields).yield_per(1000)
+
+
+@releases_connection
+async def contact_changes(since: Tuple[datetime, int] | None, limit: int, user: User, db: Session) -> List[Contact]:
+    """
+        Retrieves contacts of a specific user changed after a position, ordered by (updated_at, id),
+        tombstones included. Without a position only live contacts are returned.
+
+        :param since: The (updated_at, id) of the last change the client has seen.
+        :type since: Tuple[datetime, int] | None
+        :param limit: The maximum number of changes to return.
+        :type limit: int
+        :param user: The user to retrieve changes for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Changed and deleted contacts.
+        :rtype: List[Contact]
+        """
+    if since is None:
+        query = db.query(Contact).filter(Contact.user_id == user.id, Contact.deleted_at.is_(None))
+    else:
+        query = db.query(Contact).filter(Contact.user_id == user.id,
+                                         tuple_(Contact.updated_at, Contact.id) > tuple_(*since))
+    return query.order_by(Contact.updated_at, Contact.id).limit(limit).all()
+
+
+async def purge_tombstones(before: datetime, db: Session, batch_size: int = 10000) -> int:
+    """
+        Permanently deletes contacts removed before the specified time, in batches.
+
+        :param before: Tombstones older than this are purged.
+        :type before: datetime
+        :param db: The database session.
+        :type db: Session
+        :param batch_size: The number of rows deleted per transaction.
+        :type batch_size: int
+        :return: The number of purged contacts.
+        :rtype: int
+        """
+    purged = 0
+    while True:
+        ids = select(Contact.id).where(Contact.deleted_at < before).limit(batch_size)
+        deleted = db.execute(delete(Contact).where(Contact.id.in_(ids))).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+
+
+def birthday_window(today: date, days: int = 7) -> List[int]:
+    """
+        Returns the birthdays (as month * 100 + day) from today to ``days`` days ahead, in order.
+        February 29 birthdays are celebrated on February 28 in non-leap years.
+
+        :param today: The first day of the window.
+        :type today: date
+        :param days: The number of days ahead.
+        :type days: int
+        :return: The month * 100 + day keys.
+        :rtype: List[int]
+        """
+    keys = []
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        keys.append(day.month * 100 + day.day)
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            keys.append(229)
+    return keys
+
+
+def _birthday_key():
+    return extract('month', Contact.born_date) * 100 + extract('day', Contact.born_date)
+
+
+@releases_connection
+async def upcoming_birthday(user: User, db: Session, today: date | None = None) -> List[Contact]:
     """
         Searches contacts with the upcoming birthdays in the future 7 days from current date.
 
@@ -138,24 +408,91 @@ async def upcoming_birthday(user: User, db: Session):
         :type user: User
         :param db: The database session.
         :type db: Session
-        :return: The list of contacts, or None if it does not exist.
-        :rtype: result | None
+        :param today: The first day of the window, the current date by default.
+        :type today: date | None
+        :return: The list of contacts, the nearest birthday first.
+        :rtype: List[Contact]
+        """
+    window = birthday_window(today or date.today())
+    contacts = db.query(Contact).filter(Contact.user_id == user.id, Contact.deleted_at.is_(None),
+                                        _birthday_key().in_(window)).all()
+    return sorted(contacts, key=lambda contact: window.index(contact.born_date.month * 100 + contact.born_date.day))
+
+
+def upcoming_birthdays_all_users(db: Session, today: date) -> Iterator[tuple]:
+    """
+        Streams the contacts of all users with birthdays in the 7 days from ``today``, in one pass
+        over the contacts table, ordered by user.
+
+        :param db: The database session.
+        :type db: Session
+        :param today: The first day of the window.
+        :type today: date
+        :return: Rows of (user_id, id, name, surname, email, phone, born_date, version).
+        :rtype: Iterator[tuple]
+        """
+    return db.query(Contact.user_id, Contact.id, Contact.name, Contact.surname, Contact.email, Contact.phone,
+                    Contact.born_date, Contact.version)\
+        .filter(Contact.user_id.isnot(None), Contact.deleted_at.is_(None), _birthday_key().in_(birthday_window(today)))\
+        .order_by(Contact.user_id).yield_per(10000)
+
+
+@releases_connection
+async def find_duplicates(user: User, db: Session) -> List[dict]:
+    """
+        Finds duplicate candidates in the address book of a specific user in a single pass.
+
+        :param user: The user to search the duplicates for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: A list of candidate pairs with the reasons they matched.
+        :rtype: List[dict]
         """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
-    result = []
-    today = datetime.now()
+    rows = db.query(Contact.id, Contact.name, Contact.surname, Contact.email, Contact.phone)\
+        .filter(Contact.user_id == user.id, Contact.deleted_at.is_(None)).order_by(Contact.id).yield_per(1000)
+    return find_duplicate_pairs(rows)
+
 
-    for contact in contacts:
-        day = today.day
-        month = today.month
-        year = contact.born_date.year
-        try:
-            first_day = datetime(year=year, month=month, day=day)
-        except:
-            first_day = datetime(year=year, month=3, day=1)
-        last_day = today + timedelta(days=7)
-        if first_day <= contact.born_date <= last_day:
-            result.append(contact)
+async def merge_contacts(contact_id: int, duplicate_id: int, user: User, db: Session) -> Contact | None:
+    """
+        Merges a duplicate into a contact: empty fields of the contact are taken from the duplicate,
+        and the duplicate is removed (left as a tombstone).
+
+        :param contact_id: The ID of the contact to keep.
+        :type contact_id: int
+        :param duplicate_id: The ID of the contact to merge and remove.
+        :type duplicate_id: int
+        :param user: The user owning both contacts.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The merged contact, or None if either contact does not exist.
+        :rtype: Contact | None
+        """
+    if contact_id == duplicate_id:
+        return None
+    contacts = db.query(Contact).filter(Contact.id.in_([contact_id, duplicate_id]), Contact.user_id == user.id, Contact.deleted_at.is_(None)).all()
+    contacts = {contact.id: contact for contact in contacts}
+    contact, duplicate = contacts.get(contact_id), contacts.get(duplicate_id)
+    if contact is None or duplicate is None:
+        return None
+    merged = {field: getattr(contact, field) or getattr(duplicate, field)
+              for field in ("name", "surname", "email", "phone", "born_date")}
+    # The duplicate must be gone before the contact takes over its email/phone
+    old_keys = contact_stat_keys(contact) + contact_stat_keys(duplicate)
+    duplicate.deleted_at = duplicate.updated_at = datetime.utcnow()
+    events.queue_contact_event(db, events.DELETED, duplicate)
+    db.flush()
+    for field, value in merged.items():
+        setattr(contact, field, value)
+    db.flush()
+    record_contact_stats(db, user.id, added=contact_stat_keys(contact), removed=old_keys)
+    events.queue_contact_event(db, events.UPDATED, contact)
+    db.commit()
+    db.refresh(contact)
+    return contact
 
-    return result
 
+# Every repository call is a span of the request trace
+instrument_module(sys.modules[__name__], "repository.contacts")
@@ -0,0 +1,162 @@
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.database.db import releases_connection
+from src.services.tracing import instrument_module
+from src.database.models import Contact, ContactStat, User
+
+TOTAL = "total"
+ADDED = "added"
+BIRTH_MONTH = "birth_month"
+EMAIL_DOMAIN = "email_domain"
+
+
+def stat_keys(created_at, born_date, email) -> List[Tuple[str, str]]:
+    """
+        Returns the counters a contact contributes to.
+
+        :return: A list of (kind, key) tuples.
+        :rtype: List[Tuple[str, str]]
+        """
+    keys = [(TOTAL, "")]
+    if created_at is not None:
+        keys.append((ADDED, created_at.strftime("%Y-%m")))
+    if born_date is not None:
+        keys.append((BIRTH_MONTH, f"{born_date.month:02d}"))
+    if email and "@" in email:
+        keys.append((EMAIL_DOMAIN, email.rsplit("@", 1)[1].strip().lower()[:100]))
+    return keys
+
+
+def contact_stat_keys(contact: Contact) -> List[Tuple[str, str]]:
+    return stat_keys(contact.created_at, contact.born_date, contact.email)
+
+
+def record_contact_stats(db: Session, user_id: int, added: Iterable[Tuple[str, str]] = (),
+                         removed: Iterable[Tuple[str, str]] = ()) -> None:
+    """
+        Updates the counters of a user in the current transaction with a single upsert.
+
+        :param db: The database session.
+        :type db: Session
+        :param user_id: The user.
+        :type user_id: int
+        :param added: Keys of the contacts added (or of the new state of updated contacts).
+        :type added: Iterable[Tuple[str, str]]
+        :param removed: Keys of the contacts removed (or of the old state of updated contacts).
+        :type removed: Iterable[Tuple[str, str]]
+        """
+    delta = Counter(added)
+    delta.subtract(removed)
+    values = [{"user_id": user_id, "kind": kind, "key": key, "count": count}
+              for (kind, key), count in delta.items() if count]
+    if not values:
+        return
+    insert = sqlite.insert if db.get_bind().dialect.name == "sqlite" else postgresql.insert
+    statement = insert(ContactStat).values(values)
+    statement = statement.on_conflict_do_update(index_elements=["user_id", "kind", "key"],
+                                                set_={"count": ContactStat.count + statement.excluded.count})
+    db.execute(statement)
+
+
+@releases_connection
+async def get_contact_stats(user: User, db: Session) -> Dict[str, dict]:
+    """
+        Retrieves the counters of a specific user.
+
+        :param user: The user to retrieve the statistics for.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Counters grouped by kind.
+        :rtype: Dict[str, dict]
+        """
+    stats = {TOTAL: {}, ADDED: {}, BIRTH_MONTH: {}, EMAIL_DOMAIN: {}}
+    rows = db.query(ContactStat.kind, ContactStat.key, ContactStat.count)\
+        .filter(ContactStat.user_id == user.id, ContactStat.count > 0).all()
+    for kind, key, count in rows:
+        stats.setdefault(kind, {})[key] = count
+    return stats
+
+
+@releases_connection
+async def get_contacts_total(user: User, db: Session) -> int:
+    """
+        Retrieves the maintained number of contacts of a specific user (a primary key lookup).
+
+        :param user: The user.
+        :type user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The number of contacts.
+        :rtype: int
+        """
+    total = db.query(ContactStat.count)\
+        .filter(ContactStat.user_id == user.id, ContactStat.kind == TOTAL, ContactStat.key == "").scalar()
+    return total or 0
+
+
+def count_contact_stats(db: Session, user_ids: List[int] | None = None) -> Dict[int, Counter]:
+    """
+        Computes the counters from the contacts table in one pass, for verification and rebuilds.
+
+        :param db: The database session.
+        :type db: Session
+        :param user_ids: Limit to these users (all users when None).
+        :type user_ids: List[int] | None
+        :return: Counters per user.
+        :rtype: Dict[int, Counter]
+        """
+    query = db.query(Contact.user_id, Contact.created_at, Contact.born_date, Contact.email)\
+        .filter(Contact.user_id.isnot(None), Contact.deleted_at.is_(None))
+    if user_ids is not None:
+        query = query.filter(Contact.user_id.in_(user_ids))
+    counters = {}
+    for user_id, created_at, born_date, email in query.yield_per(10000):
+        counters.setdefault(user_id, Counter()).update(stat_keys(created_at, born_date, email))
+    return counters
+
+
+def stored_contact_stats(db: Session, user_ids: List[int] | None = None) -> Dict[int, Counter]:
+    """
+        Loads the maintained counters, for verification.
+
+        :param db: The database session.
+        :type db: Session
+        :param user_ids: Limit to these users (all users when None).
+        :type user_ids: List[int] | None
+        :return: Counters per user, zero counters omitted.
+        :rtype: Dict[int, Counter]
+        """
+    query = db.query(ContactStat.user_id, ContactStat.kind, ContactStat.key, ContactStat.count)\
+        .filter(ContactStat.count != 0)
+    if user_ids is not None:
+        query = query.filter(ContactStat.user_id.in_(user_ids))
+    counters = {}
+    for user_id, kind, key, count in query.yield_per(10000):
+        counters.setdefault(user_id, Counter())[(kind, key)] = count
+    return counters
+
+
+def replace_contact_stats(db: Session, user_id: int, counter: Counter) -> None:
+    """
+        Replaces the counters of a user (in the current transaction).
+
+        :param db: The database session.
+        :type db: Session
+        :param user_id: The user.
+        :type user_id: int
+        :param counter: The correct counters.
+        :type counter: Counter
+        """
+    db.query(ContactStat).filter(ContactStat.user_id == user_id).delete(synchronize_session=False)
+    db.add_all([ContactStat(user_id=user_id, kind=kind, key=key, count=count)
+                for (kind, key), count in counter.items() if count])
+
+
+# Every repository call is a span of the request trace
+instrument_module(sys.modules[__name__], "repository.stats")
@@ -1,10 +1,18 @@
+import sys
+from typing import Dict, List, Set
+
 from libgravatar import Gravatar
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
+from src.conf.config import settings
+from src.database.db import releases_connection
+from src.services.tracing import instrument_module
 from src.database.models import User
 from src.schemas import UserModel
 
 
+@releases_connection
 async def get_user_by_email(email: str, db: Session) -> User:
     """
         Retrieves a user by specific user email.
@@ -43,6 +51,49 @@ async def create_user(body: UserModel, db: Session) -> User:
     return new_user
 
 
+@releases_connection
+async def get_existing_emails(emails: List[str], db: Session) -> Set[str]:
+    """
+        Retrieves which of the given emails already belong to users.
+
+        :param emails: Emails to look up.
+        :type emails: List[str]
+        :param db: The database session.
+        :type db: Session
+        :return: The registered emails.
+        :rtype: Set[str]
+        """
+    existing = set()
+    for start in range(0, len(emails), settings.users_bulk_batch_size):
+        chunk = emails[start:start + settings.users_bulk_batch_size]
+        existing.update(email for email, in db.query(User.email).filter(User.email.in_(chunk)))
+    return existing
+
+
+async def create_users(users: List[dict], db: Session) -> Dict[str, int]:
+    """
+        Inserts users in batches, skipping the emails that are already registered, so that concurrent
+        signups of the same email are not an error.
+
+        :param users: The users as column values: username, email and the hashed password.
+        :type users: List[dict]
+        :param db: The database session.
+        :type db: Session
+        :return: The ids of the created users by email.
+        :rtype: Dict[str, int]
+        """
+    insert = sqlite.insert if db.get_bind().dialect.name == "sqlite" else postgresql.insert
+    created = {}
+    for start in range(0, len(users), settings.users_bulk_batch_size):
+        rows = [dict(user, avatar=Gravatar(user["email"]).get_image(), confirmed=False, is_admin=False)
+                for user in users[start:start + settings.users_bulk_batch_size]]
+        statement = insert(User).values(rows).on_conflict_do_nothing(index_elements=["email"])\
+            .returning(User.id, User.email)
+        created.update((email, user_id) for user_id, email in db.execute(statement))
+        db.commit()
+    return created
+
+
 async def update_token(user: User, token: str | None, db: Session) -> None:
     """
         Updates a token of User
@@ -88,4 +139,8 @@ async def update_avatar(email, url: str, db: Session) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
     db.commit()
-    return user
\ No newline at end of file
+    return user
+
+
+# Every repository call is a span of the request trace
+instrument_module(sys.modules[__name__], "repository.users")
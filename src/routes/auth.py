@@ -131,4 +131,47 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
         return {"message": "Your email is already confirmed"}
     if user:
         background_tasks.add_task(send_email, user.email, user.username, request.base_url)
-    return {"message": "Check your email for confirmation."}
\ No newline at end of file
+    return {"message": "Check your email for confirmation."}
+
+@router.post('/logout')
+async def logout(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+    """
+        The route is intended for user logout: revokes the access token and the refresh token
+
+        :param credentials: HTTPAuthorizationCredentials
+        :type credentials: HTTPAuthorizationCredentials
+        :param db: The database session.
+        :type db: Session
+        :return: Confirmation message
+        :rtype: dict
+        """
+    payload = await auth_service.decode_access_token(credentials.credentials)
+    if not auth_service.revocation.revoke_token(payload["jti"], payload["exp"]):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Could not revoke the token, try again later")
+    user = await repository_users.get_user_by_email(payload["sub"], db)
+    if user:
+        await repository_users.update_token(user, None, db)
+    return {"message": "Logged out"}
+
+
+@router.post('/logout_all')
+async def logout_all(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+    """
+        The route is intended for revoking all sessions of the user
+
+        :param credentials: HTTPAuthorizationCredentials
+        :type credentials: HTTPAuthorizationCredentials
+        :param db: The database session.
+        :type db: Session
+        :return: Confirmation message
+        :rtype: dict
+        """
+    payload = await auth_service.decode_access_token(credentials.credentials)
+    if not auth_service.revocation.revoke_all(payload["sub"]):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Could not revoke the sessions, try again later")
+    user = await repository_users.get_user_by_email(payload["sub"], db)
+    if user:
+        await repository_users.update_token(user, None, db)
+    return {"message": "All sessions revoked"}
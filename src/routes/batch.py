@@ -0,0 +1,95 @@
+from typing import Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.database.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas import BatchCreate, BatchModel, BatchResponse, BatchUpdate
+from src.services.auth import auth_service
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+CONFLICT = "Contact with this email or phone already exists"
+NOT_FOUND = "Contact not found"
+
+
+async def _apply(operation, current_user: User, db: Session) -> Tuple[int, Contact | None]:
+    """
+        Runs one operation of a batch in the current transaction, without committing.
+
+        :param operation: The operation.
+        :type operation: BatchCreate | BatchUpdate | BatchDelete
+        :param current_user: The user owning the contacts.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The status of the operation and the contact it changed.
+        :rtype: Tuple[int, Contact | None]
+        """
+    try:
+        if isinstance(operation, BatchCreate):
+            return status.HTTP_201_CREATED, await repository_contacts.create_contact(operation.data, current_user, db,
+                                                                                    commit=False)
+        if isinstance(operation, BatchUpdate):
+            contact = await repository_contacts.update_contact(operation.id, operation.data, current_user, db,
+                                                              commit=False)
+        else:
+            contact = await repository_contacts.remove_contact(operation.id, current_user, db, commit=False)
+    except IntegrityError:
+        return status.HTTP_409_CONFLICT, None
+    if contact is None:
+        return status.HTTP_404_NOT_FOUND, None
+    return status.HTTP_200_OK, contact
+
+
+@router.post("", response_model=BatchResponse)
+async def run_batch(body: BatchModel, response: Response, db: Session = Depends(get_db),
+                    current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for creating, updating and deleting several contacts in one request
+        and one transaction, in the given order. With ``atomic`` (the default) the first failing
+        operation rolls back the whole batch and its status is the status of the response;
+        otherwise each operation runs in a savepoint, the failed ones are rolled back alone and
+        the others are committed.
+
+        :param body: The operations and the error mode.
+        :type body: BatchModel
+        :param response: The response, for the status of a failed atomic batch.
+        :type response: Response
+        :param current_user: The user owning the contacts.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Whether the batch was committed and the result of every operation
+        :rtype: dict
+        """
+    if len(body.operations) > settings.batch_max_operations:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"No more than {settings.batch_max_operations} operations per request")
+    results = []
+    for index, operation in enumerate(body.operations):
+        savepoint = None if body.atomic else db.begin_nested()
+        status_code, contact = await _apply(operation, current_user, db)
+        failed = status_code >= status.HTTP_400_BAD_REQUEST
+        detail = {status.HTTP_409_CONFLICT: CONFLICT, status.HTTP_404_NOT_FOUND: NOT_FOUND}.get(status_code)
+        if body.atomic and failed:
+            db.rollback()
+            results = [{"op": result["op"], "status": status.HTTP_424_FAILED_DEPENDENCY, "detail": "Rolled back"}
+                       for result in results]
+            results.append({"op": operation.op, "status": status_code, "detail": detail})
+            results += [{"op": pending.op, "status": status.HTTP_424_FAILED_DEPENDENCY, "detail": "Not executed"}
+                        for pending in body.operations[index + 1:]]
+            response.status_code = status_code
+            return {"committed": False, "results": results}
+        if savepoint is not None:
+            if failed:
+                savepoint.rollback()
+            else:
+                savepoint.commit()
+        results.append({"op": operation.op, "status": status_code, "contact": contact, "detail": detail})
+    db.commit()
+    return {"committed": True, "results": results}
@@ -1,29 +1,132 @@
+import json
 from typing import List
+from datetime import date, datetime, timedelta
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
-from src.schemas import ContactBase, ContactResponse, ContactUpdate
+from src.schemas import ContactBase, ContactResponse, ContactUpdate, DuplicatePair, ContactIdList, ContactBatchResponse, \
+    ContactChanges, ContactStats, ContactPatch
 from src.repository import contacts as repository_contacts
+from src.repository import stats as repository_stats
 from src.services.auth import auth_service
+from src.services.fieldsets import parse_fields, sparse_model, sparse_response
+from src.services.events import contact_event_stream
+from src.services.sync import encode_sync_token, decode_sync_token
+from src.services import birthdays
+from src.services import autocomplete
+from src.services import contact_cache
+from src.services import formats
+from src.services.resilience import ResilientRateLimiter
 from src.database.models import User
-from fastapi_limiter.depends import RateLimiter
+from src.conf.config import settings
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
+FIELDS_DESCRIPTION = "Comma separated contact fields to return, e.g. name,phone"
+COUNT_DESCRIPTION = "Return the total number of matching contacts in the X-Total-Count header"
+LIST_FORMATS = {
+    200: {"content": {formats.JSON: {}, formats.MSGPACK: {}, formats.COLUMNAR: {}},
+          "description": "Contacts as JSON, MessagePack or columnar JSON, as negotiated with the Accept header"},
+}
 
-@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def show_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+
+def _with_total_count(result, response: Response, total: int, capped: bool = False):
+    """
+        Sets the X-Total-Count header on the response of a route.
+
+        :param result: The value returned by the route; a Response is sent as is.
+        :param response: The response FastAPI sends for any other result.
+        :type response: Response
+        :param total: The number of contacts.
+        :type total: int
+        :param capped: Whether the count stopped at ``total`` and the real number is larger.
+        :type capped: bool
+        :return: The result.
+        """
+    headers = result.headers if isinstance(result, Response) else response.headers
+    headers["X-Total-Count"] = str(total)
+    if capped:
+        headers["X-Total-Count-Capped"] = "true"
+    return result
+
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _if_match_versions(if_match: str | None) -> List[int] | None:
+    """
+        Parses an If-Match header into the contact versions it accepts.
+
+        :param if_match: The If-Match header.
+        :type if_match: str | None
+        :return: The versions, or None when any version is accepted. Weak and malformed tags never
+            match, as If-Match compares strong tags only.
+        :rtype: List[int] | None
+        """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def _list_response(contacts, fields, media_type: str, response: Response):
+    """
+        Serializes a list of contacts in the negotiated media type.
+
+        :param contacts: Contacts as ORM objects or dicts.
+        :param fields: Field names as returned by parse_fields.
+        :param media_type: The media type returned by formats.negotiate.
+        :type media_type: str
+        :param response: The response FastAPI sends for a JSON list.
+        :type response: Response
+        :return: The result of the route.
+        """
+    if media_type != formats.JSON:
+        return formats.contacts_response(contacts, fields, media_type)
+    response.headers["Vary"] = "Accept"
+    if fields:
+        result = sparse_response(contacts, fields)
+        result.headers["Vary"] = "Accept"
+        return result
+    return contacts
+
+
+@router.get("/", response_model=List[ContactResponse],
+            description=f'No more than {settings.contacts_list_rate_limit} requests per minute',
+            dependencies=[Depends(ResilientRateLimiter(times=settings.contacts_list_rate_limit, seconds=60))],
+            responses=LIST_FORMATS)
+async def show_contacts(response: Response, skip: int = 0, limit: int = 100,
+                        fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+                        count: bool = Query(False, description=COUNT_DESCRIPTION),
+                        accept: str | None = Header(None),
+                        db: Session = Depends(get_db),
                         current_user: User = Depends(auth_service.get_current_user)):
     """
-        The route is intended for receiving a list of contacts
+        The route is intended for receiving a list of contacts. With ``count`` the total number of
+        contacts is read from the maintained statistics counter and sent in X-Total-Count. The first
+        pages are served from the contact cache. The Accept header chooses JSON, MessagePack or
+        columnar JSON.
 
         :param skip: The number of contacts to skip.
         :type skip: int
         :param limit: The maximum number of contacts to return.
         :type limit: int
+        :param fields: Comma separated contact fields to return.
+        :type fields: str | None
+        :param count: Whether to send the X-Total-Count header.
+        :type count: bool
+        :param accept: The Accept header.
+        :type accept: str | None
         :param current_user: The user to retrieve contacts for.
         :type current_user: User
         :param db: The database session.
@@ -31,18 +134,263 @@ async def show_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(g
         :return: A list of contacts.
         :rtype: List[Contact]
         """
-    contacts = await repository_contacts.show_contacts(skip, limit, current_user, db)
-    return contacts
+    fields = parse_fields(fields)
+    media_type = formats.negotiate(accept)
+    if fields is None and contact_cache.is_cached_page(skip, limit):
+        key, payload = contact_cache.lookup(current_user.id, contact_cache.LIST, contact_cache.list_suffix(skip, limit))
+        if payload is None:
+            async def load_page() -> str:
+                return contact_cache.serialize_contacts(await repository_contacts.show_contacts(skip, limit,
+                                                                                               current_user, db))
+
+            payload = await contact_cache.load(contact_cache.LIST, key, load_page, settings.contacts_cache_list_ttl)
+        if media_type == formats.JSON:
+            result = Response(content=payload, media_type=formats.JSON, headers={"Vary": "Accept"})
+        else:
+            result = formats.contacts_response(json.loads(payload), None, media_type)
+    else:
+        contacts = await repository_contacts.show_contacts(skip, limit, current_user, db, fields)
+        result = _list_response(contacts, fields, media_type, response)
+    if count:
+        return _with_total_count(result, response, await repository_stats.get_contacts_total(current_user, db))
+    return result
+
+
+@router.get("/export/", response_model=List[ContactResponse], name='Export contacts', responses=LIST_FORMATS)
+async def export_contacts(fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+                          accept: str | None = Header(None),
+                          db: Session = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for exporting all contacts as a streamed JSON array, a stream of
+        MessagePack objects or columnar JSON, as chosen by the Accept header
+
+        :param fields: Comma separated contact fields to return.
+        :type fields: str | None
+        :param accept: The Accept header.
+        :type accept: str | None
+        :param current_user: The user to export contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: A streamed list of contacts.
+        :rtype: StreamingResponse
+        """
+    fields = parse_fields(fields)
+    media_type = formats.negotiate(accept)
+    if media_type != formats.JSON:
+        return StreamingResponse(
+            formats.stream_contacts(repository_contacts.export_contacts(current_user, db, fields), fields, media_type),
+            media_type=media_type, headers={"Vary": "Accept"})
+    model = sparse_model(fields)
+
+    def content():
+        yield "["
+        separator = ""
+        for contact in repository_contacts.export_contacts(current_user, db, fields):
+            yield separator + model.from_orm(contact).json()
+            separator = ","
+        yield "]"
+
+    return StreamingResponse(content(), media_type=formats.JSON, headers={"Vary": "Accept"})
+
+
+@router.get("/stats/", response_model=ContactStats, name='Contact statistics')
+async def contact_stats(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for the address book dashboard: totals, contacts added and birthdays
+        per month, email domains. Contacts added before the counters were introduced have no date
+        and are left out of the contacts added per month.
+
+        :param current_user: The user to retrieve statistics for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Contact statistics
+        :rtype: dict
+        """
+    stats = await repository_stats.get_contact_stats(current_user, db)
+    return {"total": stats[repository_stats.TOTAL].get("", 0),
+            "added_per_month": stats[repository_stats.ADDED],
+            "birthdays_per_month": stats[repository_stats.BIRTH_MONTH],
+            "email_domains": stats[repository_stats.EMAIL_DOMAIN]}
+
+
+@router.get("/duplicates/", response_model=List[DuplicatePair], name='Duplicate contacts')
+async def find_duplicates(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for finding duplicate candidates in the address book
+
+        :param current_user: The user to retrieve duplicates for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: A list of candidate pairs.
+        :rtype: List[DuplicatePair]
+        """
+    return await repository_contacts.find_duplicates(current_user, db)
+
+
+@router.get("/stream", name='Contact change feed')
+async def stream_contacts(last_event_id: str | None = Header(None),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for receiving contact changes as Server-Sent Events
+
+        :param last_event_id: Id of the last event received, to resume after a reconnect
+        :type last_event_id: str | None
+        :param current_user: The user to stream contact changes for.
+        :type current_user: User
+        :return: Stream of created, updated and deleted events
+        :rtype: StreamingResponse
+        """
+    return StreamingResponse(contact_event_stream(current_user.id, last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/changes", response_model=ContactChanges, name='Contact changes')
+async def contact_changes(since: str | None = Query(None, description="next_token of the previous call"),
+                          limit: int = Query(settings.contacts_changes_limit, ge=1, le=5000),
+                          db: Session = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for delta sync: returns contacts changed and deleted since the token.
+        Without a token it returns a snapshot of all contacts and the token to continue from.
+
+        :param since: Token returned by the previous call
+        :type since: str | None
+        :param limit: The maximum number of changes to return
+        :type limit: int
+        :param current_user: The user to retrieve changes for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Changed contacts, deleted contact ids and the next token
+        :rtype: dict
+        """
+    position = None
+    if since:
+        try:
+            position = decode_sync_token(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+        if position[0] < datetime.utcnow() - timedelta(days=settings.contacts_tombstone_retention_days):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired, full sync required")
+    contacts = await repository_contacts.contact_changes(position, limit + 1, current_user, db)
+    has_more = len(contacts) > limit
+    contacts = contacts[:limit]
+    next_position = (contacts[-1].updated_at, contacts[-1].id) if contacts else position
+    # Transactions still in flight may commit rows with an earlier updated_at: unless more pages follow,
+    # don't move the token into the last few seconds, so such rows are picked up (again) next time.
+    settled = (datetime.utcnow() - timedelta(seconds=settings.contacts_changes_settle_seconds), 0)
+    if next_position is None or (not has_more and next_position > settled):
+        next_position = max(settled, position) if position else settled
+    return {"changed": [contact for contact in contacts if contact.deleted_at is None],
+            "deleted": [contact.id for contact in contacts if contact.deleted_at is not None],
+            "next_token": encode_sync_token(*next_position), "has_more": has_more}
+
+
+async def _read_contacts_batch(contact_ids: List[int], current_user: User, db: Session) -> dict:
+    contact_ids = list(dict.fromkeys(contact_ids))
+    if len(contact_ids) > settings.contacts_batch_max_ids:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"No more than {settings.contacts_batch_max_ids} ids per request")
+    contacts = await repository_contacts.get_contacts_by_ids(contact_ids, current_user, db)
+    found = {contact.id for contact in contacts}
+    return {"found": contacts, "missing": [contact_id for contact_id in contact_ids if contact_id not in found]}
+
+
+@router.get("/batch", response_model=ContactBatchResponse)
+async def read_contacts_batch(ids: str = Query(description="Comma separated contact ids"),
+                              db: Session = Depends(get_db),
+                              current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for receiving several contacts by id in one request
+
+        :param ids: Comma separated ids of the contacts
+        :type ids: str
+        :param current_user: The user to retrieve contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Found contacts and the ids that were not found
+        :rtype: dict
+        """
+    try:
+        contact_ids = [int(contact_id) for contact_id in ids.split(",") if contact_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="ids must be integers")
+    if not contact_ids:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="ids must not be empty")
+    return await _read_contacts_batch(contact_ids, current_user, db)
+
+
+@router.post("/batch", response_model=ContactBatchResponse)
+async def read_contacts_batch_post(body: ContactIdList, db: Session = Depends(get_db),
+                                   current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for receiving several contacts by id when the id list is too long for a query string
+
+        :param body: Ids of the contacts
+        :type body: ContactIdList
+        :param current_user: The user to retrieve contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Found contacts and the ids that were not found
+        :rtype: dict
+        """
+    return await _read_contacts_batch(body.ids, current_user, db)
+
+
+async def _contact_index(current_user: User, db: Session) -> autocomplete.ContactIndex:
+    index = autocomplete.cache.get(current_user.id)
+    if index is None:
+        async def build() -> autocomplete.ContactIndex:
+            autocomplete.cache.start_loading(current_user.id)
+            contacts = await repository_contacts.contact_summaries(current_user, db)
+            return autocomplete.cache.store(current_user.id, contacts)
+
+        index = await autocomplete.builds.do(str(current_user.id), build)
+    return index
+
+
+@router.get("/autocomplete", response_model=List[ContactResponse], name='Autocomplete contacts')
+async def autocomplete_contacts(q: str = Query(min_length=1, description="The typed text"),
+                                limit: int = Query(10, ge=1, le=50),
+                                db: Session = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for typeahead: returns the contacts with a name, surname, email or phone
+        starting with every word of the typed text. Served from an in-memory index of the user's contacts.
+
+        :param q: The typed text
+        :type q: str
+        :param limit: The maximum number of contacts to return
+        :type limit: int
+        :param current_user: The user to retrieve contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: Matching contacts
+        :rtype: List[dict]
+        """
+    index = await _contact_index(current_user, db)
+    return index.search(q, limit)
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
-async def read_contact(contact_id: int, db: Session = Depends(get_db),
+async def read_contact(contact_id: int, fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+                       db: Session = Depends(get_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
-        The route is intended for receiving a contact by id
+        The route is intended for receiving a contact by id, served from the contact cache when
+        all fields are requested. The ETag header carries the version of the contact for If-Match.
 
         :param contact_id: Id of the contact
         :type contact_id: int
+        :param fields: Comma separated contact fields to return.
+        :type fields: str | None
         :param current_user: The user to retrieve contacts for.
         :type current_user: User
         :param db: The database session.
@@ -50,10 +398,25 @@ async def read_contact(contact_id: int, db: Session = Depends(get_db),
         :return: A single contact
         :rtype: contact
         """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    fields = parse_fields(fields)
+
+    async def load_contact():
+        contact = await repository_contacts.get_contact(contact_id, current_user, db, fields)
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+        return contact
+
+    if fields is not None:
+        return sparse_response(await load_contact(), fields)
+    key, payload = contact_cache.lookup(current_user.id, contact_cache.CONTACT, contact_cache.contact_suffix(contact_id))
+    if payload is None:
+        async def load_payload() -> str:
+            return contact_cache.serialize_contact(await load_contact())
+
+        payload = await contact_cache.load(contact_cache.CONTACT, key, load_payload, settings.contacts_cache_ttl)
+    version = json.loads(payload).get("version")
+    headers = {"ETag": _etag(version)} if version is not None else None
+    return Response(content=payload, media_type="application/json", headers=headers)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
@@ -71,7 +434,11 @@ async def create_contact(body: ContactBase, db: Session = Depends(get_db),
         :return: Creates a contact through repository_contacts
         :rtype: contact
         """
-    return await repository_contacts.create_contact(body, current_user, db)
+    try:
+        return await repository_contacts.create_contact(body, current_user, db)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email or phone already exists")
 
 
 @router.put("/{contact_id}", response_model=ContactResponse)
@@ -92,7 +459,77 @@ async def update_contact(body: ContactUpdate, contact_id: int,
         :return: Updates a contact through repository_contacts
         :rtype: contact
         """
-    contact = await repository_contacts.update_contact(contact_id, body, current_user, db)
+    try:
+        contact = await repository_contacts.update_contact(contact_id, body, current_user, db)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email or phone already exists")
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return contact
+
+
+@router.patch("/{contact_id}", response_model=ContactResponse)
+async def patch_contact(body: ContactPatch, contact_id: int, response: Response,
+                        if_match: str | None = Header(None),
+                        db: Session = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for updating some fields of a contact by id. With If-Match, the
+        contact is only updated if it still has the version of one of the given ETags; otherwise
+        the response is 412 and the contact should be read again.
+
+        :param body: The fields to update
+        :type body: ContactPatch
+        :param contact_id: Id of the contact
+        :type contact_id: int
+        :param response: The response, for the ETag of the new version.
+        :type response: Response
+        :param if_match: ETags of the versions the changes were made to.
+        :type if_match: str | None
+        :param current_user: The user to retrieve contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The updated contact
+        :rtype: contact
+        """
+    changes = body.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No fields to update")
+    versions = _if_match_versions(if_match)
+    try:
+        contact = await repository_contacts.patch_contact(contact_id, changes, current_user, db, versions)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email or phone already exists")
+    if contact is None:
+        if versions is not None and await repository_contacts.get_contact(contact_id, current_user, db, ("id",)):
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                                detail="Contact was changed meanwhile")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    response.headers["ETag"] = _etag(contact.version)
+    return contact
+
+
+@router.post("/{contact_id}/merge/{duplicate_id}", response_model=ContactResponse)
+async def merge_contacts(contact_id: int, duplicate_id: int, db: Session = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+        The route is intended for merging a duplicate into a contact
+
+        :param contact_id: Id of the contact to keep
+        :type contact_id: int
+        :param duplicate_id: Id of the duplicate to merge and remove
+        :type duplicate_id: int
+        :param current_user: The user to merge contacts for.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The merged contact
+        :rtype: contact
+        """
+    contact = await repository_contacts.merge_contacts(contact_id, duplicate_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
     return contact
@@ -118,14 +555,40 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db),
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
     return contact
 
-@router.get("/search/{credentials}", response_model=List[ContactResponse], name='Contacts by credentials')
-async def search_contacts(credentials: str, db: Session = Depends(get_db),
+@router.get("/search/{credentials}", response_model=List[ContactResponse], name='Contacts by credentials',
+            responses=LIST_FORMATS)
+async def search_contacts(credentials: str, response: Response, skip: int = 0, limit: int | None = None,
+                          fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+                          count: bool = Query(False, description=COUNT_DESCRIPTION),
+                          fuzzy: bool = Query(False, description="Match misspelled names and surnames"),
+                          max_distance: int = Query(settings.contacts_fuzzy_max_distance, ge=0, le=3,
+                                                    description="Edits allowed per word in fuzzy mode"),
+                          accept: str | None = Header(None),
+                          db: Session = Depends(get_db),
                           current_user: User = Depends(auth_service.get_current_user)):
     """
-        The route is intended for search of a contact by credentials
+        The route is intended for search of a contact by credentials. With ``count`` the matches are
+        counted up to ``contacts_search_count_cap``; a larger result is reported as the cap with
+        X-Total-Count-Capped. With ``fuzzy`` the contacts with name or surname words within
+        ``max_distance`` edits of every searched word are returned, closest first. The Accept header
+        chooses JSON, MessagePack or columnar JSON.
 
         :param credentials: credentials of a contact
         :type credentials: int
+        :param skip: The number of contacts to skip.
+        :type skip: int
+        :param limit: The maximum number of contacts to return (all when omitted).
+        :type limit: int | None
+        :param fields: Comma separated contact fields to return.
+        :type fields: str | None
+        :param count: Whether to send the X-Total-Count header.
+        :type count: bool
+        :param fuzzy: Whether to match misspelled words.
+        :type fuzzy: bool
+        :param max_distance: The number of edits allowed per word in fuzzy mode.
+        :type max_distance: int
+        :param accept: The Accept header.
+        :type accept: str | None
         :param current_user: The user to retrieve contacts for.
         :type current_user: User
         :param db: The database session.
@@ -133,16 +596,33 @@ async def search_contacts(credentials: str, db: Session = Depends(get_db),
         :return: Returns a searched contact
         :rtype: contact
         """
-    contact = await repository_contacts.search_contacts(credentials, current_user, db)
+    fields = parse_fields(fields)
+    media_type = formats.negotiate(accept)
+    if fuzzy:
+        index = await _contact_index(current_user, db)
+        matches, total = index.fuzzy_search(credentials, max_distance, skip + (limit or settings.contacts_fuzzy_limit))
+        if not total:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+        result = _list_response(matches[skip:], fields, media_type, response)
+        return _with_total_count(result, response, total) if count else result
+    contact = await repository_contacts.search_contacts(credentials, current_user, db, fields, skip, limit)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    result = _list_response(contact, fields, media_type, response)
+    if not count:
+        return result
+    if not skip and (limit is None or len(contact) < limit):
+        # The whole result is at hand
+        return _with_total_count(result, response, len(contact))
+    cap = settings.contacts_search_count_cap
+    total = await repository_contacts.count_search_contacts(credentials, current_user, db, cap)
+    return _with_total_count(result, response, min(total, cap), capped=total > cap)
 
 @router.get("/birthday/", response_model=List[ContactResponse], name='Upcoming birthdays')
 async def upcoming_birthday(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
         The route is intended for search of a contacts with the upcoming birthdays
-        in the future 7 days from current date.
+        in the future 7 days from current date. Served from the daily digest when it is cached.
 
         :param current_user: The user to retrieve contacts for
         :type current_user: User.
@@ -151,7 +631,11 @@ async def upcoming_birthday(db: Session = Depends(get_db), current_user: User =
         :return: Returns a searched contacts
         :rtype: contact.
         """
-    contact = await repository_contacts.upcoming_birthday(db, current_user)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacts not found")
-    return contact
\ No newline at end of file
+    today = date.today()
+    cached = birthdays.get_cached_digest(current_user.id, today)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    contacts = await repository_contacts.upcoming_birthday(current_user, db, today)
+    payload = json.dumps(jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts]))
+    birthdays.cache_digest(current_user.id, today, payload)
+    return Response(content=payload, media_type="application/json")
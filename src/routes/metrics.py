@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.services import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    """
+        Exposes the service metrics for Prometheus.
+
+        :return: The metrics in the text exposition format.
+        :rtype: str
+        """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
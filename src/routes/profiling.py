@@ -0,0 +1,98 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse
+
+from src.conf.config import settings
+from src.database.models import User
+from src.schemas import ProfileResponse, ProfilingRuleModel, ProfilingRuleResponse
+from src.services.auth import auth_service
+from src.services.profiling import profiler
+
+router = APIRouter(prefix="/profiling", tags=["profiling"])
+
+
+@router.get("/rules", response_model=List[ProfilingRuleResponse])
+async def read_rules(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+        The route is intended for reading the active profiling rules of this worker
+
+        :param current_user: The administrator.
+        :type current_user: User
+        :return: The rules
+        :rtype: List[Rule]
+        """
+    return profiler.active_rules()
+
+
+@router.post("/rules", response_model=ProfilingRuleResponse, status_code=status.HTTP_201_CREATED)
+async def create_rule(body: ProfilingRuleModel, request: Request,
+                      current_user: User = Depends(auth_service.get_current_admin)):
+    """
+        The route is intended for profiling a sample of the requests to a route, given by its path
+        template, e.g. ``/api/contacts/birthdays/``
+
+        :param body: The route, the share of its requests to profile, how many and for how long.
+        :type body: ProfilingRuleModel
+        :param request: The request, for the routes of the application.
+        :type request: Request
+        :param current_user: The administrator.
+        :type current_user: User
+        :return: The rule
+        :rtype: Rule
+        """
+    if body.route not in {getattr(route, "path_format", None) for route in request.app.routes}:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Route not found")
+    if len(profiler.active_rules()) >= settings.profiling_max_rules:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Too many profiling rules")
+    return profiler.add_rule(body.method, body.route, body.sample_rate, body.max_profiles, body.duration_seconds)
+
+
+@router.delete("/rules/{rule_id}", response_model=ProfilingRuleResponse)
+async def remove_rule(rule_id: int, current_user: User = Depends(auth_service.get_current_admin)):
+    """
+        The route is intended for stopping a profiling rule
+
+        :param rule_id: The rule id.
+        :type rule_id: int
+        :param current_user: The administrator.
+        :type current_user: User
+        :return: The removed rule
+        :rtype: Rule
+        """
+    rule = profiler.remove_rule(rule_id)
+    if rule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rule not found")
+    return rule
+
+
+@router.get("/profiles", response_model=List[ProfileResponse])
+async def read_profiles(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+        The route is intended for listing the written profiles, newest first
+
+        :param current_user: The administrator.
+        :type current_user: User
+        :return: The profiles
+        :rtype: List[dict]
+        """
+    return profiler.store.list()
+
+
+@router.get("/profiles/{name}", response_class=FileResponse)
+async def read_profile(name: str, current_user: User = Depends(auth_service.get_current_admin)):
+    """
+        The route is intended for downloading a profile in the folded stack format, as input of
+        flamegraph.pl or speedscope
+
+        :param name: The profile name, as sent in the X-Profile header.
+        :type name: str
+        :param current_user: The administrator.
+        :type current_user: User
+        :return: The profile
+        :rtype: FileResponse
+        """
+    path = profiler.store.path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status, UploadFile, File
 from sqlalchemy.orm import Session
 import cloudinary
 import cloudinary.uploader
@@ -8,7 +8,9 @@ from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.conf.config import settings
-from src.schemas import UserDb
+from src.schemas import UserDb, UsersBulkModel, UsersBulkResponse
+from src.services.email import send_emails
+from src.services.tracing import KIND_CLIENT, span
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -48,8 +50,59 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
         secure=True
     )
 
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
+    with span("cloudinary.upload", KIND_CLIENT):
+        r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
     src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
-    return user
\ No newline at end of file
+    return user
+
+
+@router.post("/bulk", response_model=UsersBulkResponse, name='Provision users')
+async def create_users_bulk(body: UsersBulkModel, background_tasks: BackgroundTasks, request: Request,
+                            current_user: User = Depends(auth_service.get_current_admin),
+                            db: Session = Depends(get_db)):
+    """
+        The route is intended for creating many users at once by an administrator. Registered emails
+        and repeated emails of the request are skipped; every created user gets a confirmation email.
+
+        :param body: The users to create.
+        :type body: UsersBulkModel
+        :param background_tasks: BackgroundTasks.
+        :type background_tasks: BackgroundTasks
+        :param request: Request.
+        :type request: Request
+        :param current_user: The administrator.
+        :type current_user: User
+        :param db: The database session.
+        :type db: Session
+        :return: The outcome for every user of the request, in order: created, exists or duplicate.
+        :rtype: dict
+        """
+    if len(body.users) > settings.users_bulk_max_users:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"No more than {settings.users_bulk_max_users} users per request")
+    users = {}
+    for user in body.users:
+        users.setdefault(user.email, user)
+    # Hashing is by far the slowest step, so registered emails are skipped before it
+    existing = await repository_users.get_existing_emails(list(users), db)
+    new_users = [user for email, user in users.items() if email not in existing]
+    hashes = await auth_service.get_password_hashes([user.password for user in new_users])
+    created = await repository_users.create_users(
+        [{"username": user.username, "email": user.email, "password": password}
+         for user, password in zip(new_users, hashes)], db)
+
+    results, seen = [], set()
+    for user in body.users:
+        if user.email in seen:
+            results.append({"email": user.email, "status": "duplicate"})
+        elif user.email in created:
+            results.append({"email": user.email, "status": "created", "id": created[user.email]})
+        else:
+            results.append({"email": user.email, "status": "exists"})
+        seen.add(user.email)
+    background_tasks.add_task(send_emails, [(user.email, user.username) for user in new_users
+                                            if user.email in created], request.base_url)
+    return {"created": len(created), "existing": len(users) - len(created),
+            "duplicates": len(body.users) - len(users), "results": results}
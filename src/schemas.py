@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, Field, EmailStr
+from typing import Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, EmailStr, validator
 
 
 class ContactBase(BaseModel):
@@ -12,11 +12,13 @@ class ContactBase(BaseModel):
 
 
 class ContactResponse(ContactBase):
+    id: int
     name: str
     surname: str
     email: EmailStr
     phone: str
     born_date: datetime
+    version: int
 
     class Config:
         orm_mode = True
@@ -25,12 +27,105 @@ class ContactResponse(ContactBase):
 class ContactUpdate(ContactBase):
     done: bool
 
+
+class ContactPatch(BaseModel):
+    name: str = Field(None, max_length=50)
+    surname: str = Field(None, max_length=50)
+    email: EmailStr = None
+    phone: str = Field(None, max_length=50)
+    born_date: datetime = None
+
+    @validator("*", pre=True)
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+
+class ContactIdList(BaseModel):
+    ids: List[int] = Field(min_items=1)
+
+
+class ContactBatchResponse(BaseModel):
+    found: List[ContactResponse]
+    missing: List[int]
+
+
+class BatchCreate(BaseModel):
+    op: Literal["create"]
+    data: ContactBase
+
+
+class BatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: ContactUpdate
+
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+class BatchModel(BaseModel):
+    operations: List[Union[BatchCreate, BatchUpdate, BatchDelete]] = Field(min_items=1)
+    atomic: bool = True
+
+
+class BatchResult(BaseModel):
+    op: str
+    status: int
+    contact: Optional[ContactResponse] = None
+    detail: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
+
+
+class ContactChanges(BaseModel):
+    changed: List[ContactResponse]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
+
+
+class ContactStats(BaseModel):
+    total: int
+    added_per_month: Dict[str, int]
+    birthdays_per_month: Dict[str, int]
+    email_domains: Dict[str, int]
+
+
+class DuplicatePair(BaseModel):
+    contact_ids: List[int]
+    reasons: List[str]
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
     password: str = Field(min_length=6, max_length=10)
 
 
+class UsersBulkModel(BaseModel):
+    users: List[UserModel] = Field(min_items=1)
+
+
+class UserBulkResult(BaseModel):
+    email: str
+    status: str
+    id: Optional[int] = None
+
+
+class UsersBulkResponse(BaseModel):
+    created: int
+    existing: int
+    duplicates: int
+    results: List[UserBulkResult]
+
+
 class UserDb(BaseModel):
     id: int
     username: str
@@ -53,4 +148,30 @@ class TokenModel(BaseModel):
     token_type: str = "bearer"
 
 class RequestEmail(BaseModel):
-    email: EmailStr
\ No newline at end of file
+    email: EmailStr
+
+class ProfilingRuleModel(BaseModel):
+    method: str = Field(default="GET", regex="^(GET|POST|PUT|PATCH|DELETE)$")
+    route: str = Field(min_length=1, max_length=200)
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
+    max_profiles: int = Field(default=10, ge=1, le=1000)
+    duration_seconds: int = Field(default=3600, ge=1, le=86400)
+
+
+class ProfilingRuleResponse(BaseModel):
+    id: int
+    method: str
+    route: str
+    sample_rate: float
+    max_profiles: int
+    profiles_taken: int
+    expires_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ProfileResponse(BaseModel):
+    name: str
+    size: int
+    created_at: datetime
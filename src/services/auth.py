@@ -1,17 +1,25 @@
-from typing import Optional
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from uuid import uuid4
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.services.redis_clients import redis_clients
+from src.services.resilience import LocalCache, UNAVAILABLE, redis_breaker
+from src.services.revocation import now_ms, revocation
+from src.services.singleflight import flight, refresh_early
+from src.services.tracing import span
 
 import pickle
-import redis
 from src.conf.config import settings
 
 class Auth:
@@ -19,13 +27,37 @@ class Auth:
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host='localhost', port=6379, db=0)
+    r = redis_clients.client()
+    # Users loaded while Redis is unavailable
+    local_users = LocalCache(settings.local_user_cache_size, settings.local_user_cache_ttl)
+    # One database read per user when the cached entry is missing or expires
+    user_loads = flight("users")
+    revocation = revocation
+    hashing_pool = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
 
     def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+        with span("auth.bcrypt_verify"):
+            return self.pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+        with span("auth.bcrypt_hash"):
+            return self.pwd_context.hash(password)
+
+    async def get_password_hashes(self, passwords: List[str]) -> List[str]:
+        """
+            Hashes many passwords on a thread pool; bcrypt releases the GIL, so they are hashed in
+            parallel without blocking the event loop.
+
+            :param passwords: Plain passwords.
+            :type passwords: List[str]
+            :return: The hashes, in the same order.
+            :rtype: List[str]
+            """
+        loop = asyncio.get_running_loop()
+        # Each hash runs in a copy of the caller's context, so that its span joins the request trace
+        return await asyncio.gather(*(loop.run_in_executor(self.hashing_pool, contextvars.copy_context().run,
+                                                           self.get_password_hash, password)
+                                      for password in passwords))
 
     def create_email_token(self, data: dict):
         to_encode = data.copy()
@@ -50,8 +82,9 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
+            expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
+        to_encode.update({"iat": datetime.utcnow(), "iat_ms": now_ms(), "exp": expire, "scope": "access_token",
+                          "jti": uuid4().hex})
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
@@ -94,16 +127,14 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def decode_access_token(self, token: str) -> dict:
         """
-            Searches contacts with the upcoming birthdays in the future 7 days from current date.
+            Decodes an access token and checks that it has not been revoked
 
             :param token: Token
             :type token: str
-            :param db: The database session.
-            :type db: Session
-            :return: User
-            :rtype: User
+            :return: Token payload
+            :rtype: dict
             """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,28 +144,90 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+            with span("auth.jwt_decode"):
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            if payload['scope'] != 'access_token' or payload.get("sub") is None:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-
-        user = await repository_users.get_user_by_email(email, db)
-        if user is None:
+        if self.revocation.is_revoked(payload):
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
-        if user is None:
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        """
+            Returns the user the access token was issued to.
+
+            :param token: Token
+            :type token: str
+            :param db: The database session.
+            :type db: Session
+            :return: User
+            :rtype: User
+            """
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+        payload = await self.decode_access_token(token)
+        email = payload["sub"]
+        key = f"user:{email}"
+
+        async def load_user() -> bytes:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            return pickle.dumps(user)
+
+        cached = redis_breaker.call(self._read_cached_user, key)
+        if cached is UNAVAILABLE:
+            # Degraded mode: a short-lived cache of this process, then the database
+            cached = self.local_users.get(email)
+            if cached is not None:
+                return pickle.loads(cached)
+
+            async def load_local() -> bytes:
+                loaded = await load_user()
+                self.local_users.set(email, loaded)
+                return loaded
+
+            return pickle.loads(await self.user_loads.do(key, load_local))
+        cached, ttl_ms = cached
+        if cached is not None and not refresh_early(ttl_ms / 1000, self.user_loads.load_time,
+                                                    settings.cache_refresh_beta):
+            return pickle.loads(cached)
+
+        async def load_cached() -> bytes:
+            loaded = await load_user()
+            redis_breaker.call(self.r.set, key, loaded, ex=900)
+            return loaded
+
+        return pickle.loads(await self.user_loads.do(key, load_cached,
+                                                     lambda: redis_breaker.call(self.r.get, key, fallback=None)))
+
+    def _read_cached_user(self, key: str) -> list:
+        # The entry and its remaining milliseconds, in one round trip
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        return pipe.execute()
+
+    async def get_current_admin(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        """
+            Returns the user the access token was issued to if it is an administrator.
+
+            :param token: Token
+            :type token: str
+            :param db: The database session.
+            :type db: Session
+            :return: User
+            :rtype: User
+            """
+        user = await self.get_current_user(token, db)
+        if not user.is_admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Administrator rights required")
         return user
 
     async def get_email_from_token(self, token: str):
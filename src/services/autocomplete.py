@@ -0,0 +1,336 @@
+import heapq
+import json
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+import redis
+
+from src.conf.config import settings
+from src.services import events
+from src.services.duplicates import normalize_phone
+from src.services.fuzzy import FuzzyIndex
+from src.services.redis_clients import redis_clients
+from src.services.singleflight import flight
+
+PHONE_QUERY = re.compile(r"^[\d\s+()\-.]*\d[\d\s+()\-.]*$")
+LAST_CHARACTER = chr(0x10FFFF)
+
+
+SEPARATOR = "\x01"
+
+
+def _key(token: str, contact_id: int) -> str:
+    return f"{token}\0{contact_id}"
+
+
+def _join(tokens: Tuple[str, ...]) -> str:
+    return SEPARATOR + SEPARATOR.join(tokens)
+
+
+def contact_tokens(contact: dict) -> Tuple[str, ...]:
+    """
+        The keys a contact is found by: the words of its name and surname, its email and the digits
+        of its phone, lowercased.
+
+        :param contact: The contact fields.
+        :type contact: dict
+        :return: Distinct tokens.
+        :rtype: Tuple[str, ...]
+        """
+    tokens = set(f"{contact['name']} {contact['surname']}".lower().split())
+    if contact.get("email"):
+        tokens.add(contact["email"].lower())
+    phone = normalize_phone(contact.get("phone"))
+    if phone:
+        tokens.add(phone)
+    return tuple(tokens)
+
+
+def name_words(contact: dict) -> List[str]:
+    """
+        The lowercase words of the name and surname of a contact, matched by fuzzy search.
+        """
+    return f"{contact['name']} {contact['surname']}".lower().split()
+
+
+def query_words(query: str) -> List[str]:
+    """
+        Splits the typed text into lowercase words; text made of phone characters only is one
+        phone number, matched by its digits.
+        """
+    if PHONE_QUERY.match(query):
+        return [normalize_phone(query)]
+    return query.lower().split()
+
+
+class ContactIndex:
+    """
+        Sorted prefix index over the contacts of one user. ``keys`` holds ``token\\0id`` for every
+        token of every contact in order and ``ids`` the contact of each key, so the contacts with
+        a token starting with a prefix are one contiguous run found by binary search.
+        """
+
+    def __init__(self, contacts: Iterable[dict]):
+        self.contacts: Dict[int, dict] = {}
+        # The tokens of each contact joined as "\x01token\x01token", for substring prefix checks
+        self.tokens: Dict[int, str] = {}
+        entries = []
+        for contact in contacts:
+            tokens = contact_tokens(contact)
+            self.contacts[contact["id"]] = contact
+            self.tokens[contact["id"]] = _join(tokens)
+            entries.extend((_key(token, contact["id"]), contact["id"]) for token in tokens)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = array("q", (contact_id for _, contact_id in entries))
+        # Built on the first fuzzy search
+        self.fuzzy: FuzzyIndex | None = None
+        self.deleted: Set[int] = set()
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, contact: dict) -> None:
+        self.remove(contact["id"])
+        tokens = contact_tokens(contact)
+        self.contacts[contact["id"]] = contact
+        self.tokens[contact["id"]] = _join(tokens)
+        if self.fuzzy is not None:
+            self.fuzzy.add(contact["id"], name_words(contact))
+        for token in tokens:
+            key = _key(token, contact["id"])
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.ids.insert(position, contact["id"])
+
+    def stale(self, contact: dict) -> bool:
+        """
+            Tells whether a changed contact is already indexed, or was deleted since: a change
+            published by this worker comes back through pub/sub after it was applied.
+            """
+        if contact["id"] in self.deleted:
+            return True
+        current = self.contacts.get(contact["id"])
+        if current is None or current.get("version") is None or contact.get("version") is None:
+            return False
+        return contact["version"] <= current["version"]
+
+    def remove(self, contact_id: int) -> None:
+        contact = self.contacts.pop(contact_id, None)
+        if contact is not None and self.fuzzy is not None:
+            self.fuzzy.remove(contact_id, name_words(contact))
+        for token in self.tokens.pop(contact_id, SEPARATOR)[1:].split(SEPARATOR):
+            key = _key(token, contact_id)
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+                del self.ids[position]
+
+    def _run(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + LAST_CHARACTER)
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+            Finds the contacts with a token starting with every word of the query, in token order.
+
+            :param query: The typed text.
+            :type query: str
+            :param limit: The maximum number of contacts to return.
+            :type limit: int
+            :return: The contacts.
+            :rtype: List[dict]
+            """
+        words = query_words(query)
+        if not words:
+            return []
+        # Walk the shortest run; the other words are matched against the joined tokens of each candidate
+        runs = sorted(((self._run(word), word) for word in words), key=lambda item: item[0][1] - item[0][0])
+        (start, stop), _ = runs[0]
+        others = [SEPARATOR + word for _, word in runs[1:]]
+        found, seen = [], set()
+        for position in range(start, stop):
+            contact_id = self.ids[position]
+            if contact_id in seen:
+                continue
+            seen.add(contact_id)
+            tokens = self.tokens[contact_id]
+            if all(word in tokens for word in others):
+                found.append(self.contacts[contact_id])
+                if len(found) == limit:
+                    break
+        return found
+
+    def fuzzy_search(self, query: str, max_distance: int, limit: int) -> Tuple[List[dict], int]:
+        """
+            Finds the contacts with a name or surname word within ``max_distance`` edits of every
+            word of the query, closest first and, at equal distance, oldest first.
+
+            :param query: The searched text.
+            :type query: str
+            :param max_distance: The largest number of edits per word.
+            :type max_distance: int
+            :param limit: The number of best matches to return.
+            :type limit: int
+            :return: The best matches and the number of all matches.
+            :rtype: Tuple[List[dict], int]
+            """
+        if self.fuzzy is None:
+            self.fuzzy = FuzzyIndex()
+            for contact_id, contact in self.contacts.items():
+                self.fuzzy.add(contact_id, name_words(contact))
+        scores = self.fuzzy.search(query.lower().split(), max_distance)
+        by_score = defaultdict(list)
+        for contact_id, score in scores.items():
+            by_score[score].append(contact_id)
+        best = []
+        for score in sorted(by_score):
+            best += heapq.nsmallest(limit - len(best), by_score[score])
+            if len(best) >= limit:
+                break
+        return [self.contacts[contact_id] for contact_id in best], len(scores)
+
+
+class AutocompleteCache:
+    """
+        Contact indexes of the recently active users, least recently used evicted first once the
+        indexes hold more than ``max_entries`` tokens. Writes committed by this process update the
+        indexes in place, and the writes of every worker arrive through the contact change events
+        on Redis pub/sub. While the listener is not subscribed, an index older than ``ttl`` seconds
+        is rebuilt, which bounds how long writes made by other workers stay invisible.
+        """
+
+    def __init__(self, max_entries: int, ttl: float, r: redis.Redis | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.r = r
+        self.indexes: OrderedDict[int, ContactIndex] = OrderedDict()
+        self.entries = 0
+        self.subscribed = False
+        self._loading: Dict[int, bool] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def get(self, user_id: int) -> ContactIndex | None:
+        """
+            Returns the index of a user, or None when it has to be built: call ``start_loading``,
+            load the contacts and pass them to ``store``.
+            """
+        with self._lock:
+            index = self.indexes.get(user_id)
+            if index is None:
+                return None
+            if not self.subscribed and time.monotonic() - index.built_at > self.ttl:
+                self._drop(user_id)
+                return None
+            self.indexes.move_to_end(user_id)
+            return index
+
+    def start_loading(self, user_id: int) -> None:
+        with self._lock:
+            self._loading[user_id] = False
+
+    def store(self, user_id: int, contacts: Iterable[dict]) -> ContactIndex:
+        """
+            Builds the index of a user from the contacts loaded after ``start_loading``. It is not
+            kept if the contacts changed while they were loaded.
+            """
+        index = ContactIndex(contacts)
+        with self._lock:
+            changed = self._loading.pop(user_id, True)
+            if not changed:
+                self._drop(user_id)
+                self.indexes[user_id] = index
+                self.entries += len(index)
+                while self.entries > self.max_entries and len(self.indexes) > 1:
+                    self._drop(next(iter(self.indexes)))
+        return index
+
+    def _drop(self, user_id: int) -> None:
+        index = self.indexes.pop(user_id, None)
+        if index is not None:
+            self.entries -= len(index)
+
+    def apply_changes(self, changes: List[tuple]) -> None:
+        """
+            Applies committed contact changes, given as (user_id, event_type, data), to the cached indexes.
+            """
+        with self._lock:
+            for user_id, event_type, data in changes:
+                if user_id in self._loading:
+                    self._loading[user_id] = True
+                index = self.indexes.get(user_id)
+                if index is None:
+                    continue
+                contact = json.loads(data)
+                if event_type != events.DELETED and index.stale(contact):
+                    continue
+                self.entries -= len(index)
+                if event_type == events.DELETED:
+                    index.remove(contact["id"])
+                    index.deleted.add(contact["id"])
+                else:
+                    index.add(contact)
+                self.entries += len(index)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.indexes.clear()
+            self.entries = 0
+            self._loading.clear()
+
+    def _handle(self, channel, data) -> None:
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+        data = data.decode() if isinstance(data, bytes) else data
+        _, event_type, payload = data.split("\n", 2)
+        self.apply_changes([(int(channel.rsplit(":", 1)[1]), event_type, payload)])
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(events.channel_name("*"))
+                # The changes published while we were not subscribed are unknown: start over
+                self.clear()
+                self.subscribed = True
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._handle(message["channel"], message["data"])
+                pubsub.close()
+            except redis.RedisError as err:
+                print(err)
+                self._stop.wait(1.0)
+            finally:
+                self.subscribed = False
+
+    def start(self) -> None:
+        """
+            Starts the background pub/sub listener for this worker.
+            """
+        if self._thread is None and self.r is not None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, name="autocomplete-events", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+            Stops the background pub/sub listener.
+            """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+cache = AutocompleteCache(settings.autocomplete_max_entries, settings.autocomplete_ttl, redis_clients.client())
+# Concurrent first searches of a user wait for one build of the index
+builds = flight("autocomplete")
+
+events.contact_change_listeners.append(cache.apply_changes)
@@ -0,0 +1,114 @@
+import json
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Iterator, List, Tuple
+
+from src.conf.config import settings
+from src.services import events
+from src.services.redis_clients import redis_clients
+from src.services.resilience import redis_breaker
+
+r = redis_clients.client()
+
+CONTACT_COLUMNS = ("id", "name", "surname", "email", "phone", "born_date", "version")
+
+
+def digest_key(user_id: int, day: date) -> str:
+    return f"birthdays:{day.isoformat()}:{user_id}"
+
+
+def build_digests(user_ids: Iterable[int], rows: Iterable[tuple],
+                  window: List[int]) -> Iterator[Tuple[int, List[dict]]]:
+    """
+        Merges the rows of upcoming_birthdays_all_users into per-user digests; users without upcoming
+        birthdays get an empty digest.
+
+        :param user_ids: Ids of all users, ascending.
+        :type user_ids: Iterable[int]
+        :param rows: Rows of (user_id, id, name, surname, email, phone, born_date, version) ordered by user.
+        :type rows: Iterable[tuple]
+        :param window: The birthday window as returned by birthday_window, to order each digest.
+        :type window: List[int]
+        :return: (user_id, contacts) pairs; contacts are serialized like ContactResponse.
+        :rtype: Iterator[Tuple[int, List[dict]]]
+        """
+    groups = groupby(rows, key=lambda row: row[0])
+    group_user_id, group_rows = next(groups, (None, None))
+    for user_id in user_ids:
+        while group_user_id is not None and group_user_id < user_id:
+            group_user_id, group_rows = next(groups, (None, None))
+        contacts = []
+        if user_id == group_user_id:
+            for row in sorted(group_rows, key=lambda row: window.index(row[6].month * 100 + row[6].day)):
+                contact = dict(zip(CONTACT_COLUMNS, row[1:]))
+                contact["born_date"] = contact["born_date"].isoformat()
+                contacts.append(contact)
+            group_user_id, group_rows = next(groups, (None, None))
+        yield user_id, contacts
+
+
+def store_digests(digests: Iterable[Tuple[int, List[dict]]], day: date, batch_size: int = 1000) -> int:
+    """
+        Caches the digests of a day in Redis.
+
+        :param digests: (user_id, contacts) pairs.
+        :type digests: Iterable[Tuple[int, List[dict]]]
+        :param day: The first day of the window.
+        :type day: date
+        :param batch_size: The number of digests written per pipeline round trip.
+        :type batch_size: int
+        :return: The number of digests stored.
+        :rtype: int
+        """
+    stored = 0
+    pipe = r.pipeline(transaction=False)
+    for user_id, contacts in digests:
+        pipe.set(digest_key(user_id, day), json.dumps(contacts), ex=settings.birthday_digest_ttl)
+        stored += 1
+        if stored % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    return stored
+
+
+def get_cached_digest(user_id: int, day: date) -> bytes | None:
+    """
+        Returns the cached digest of a user as a JSON array ready to send.
+
+        :param user_id: The user.
+        :type user_id: int
+        :param day: The first day of the window.
+        :type day: date
+        :return: The JSON payload, or None if it is not cached.
+        :rtype: bytes | None
+        """
+    return redis_breaker.call(r.get, digest_key(user_id, day), fallback=None)
+
+
+def cache_digest(user_id: int, day: date, payload: str) -> None:
+    """
+        Caches the digest of a single user computed on a cache miss.
+
+        :param user_id: The user.
+        :type user_id: int
+        :param day: The first day of the window.
+        :type day: date
+        :param payload: The JSON payload.
+        :type payload: str
+        """
+    redis_breaker.call(r.set, digest_key(user_id, day), payload, ex=settings.birthday_digest_ttl)
+
+
+def invalidate_digests(changes: List[tuple]) -> None:
+    """
+        Drops today's digests of the users whose contacts changed.
+
+        :param changes: Committed contact changes as (user_id, event_type, data).
+        :type changes: List[tuple]
+        """
+    today = date.today()
+    keys = {digest_key(user_id, today) for user_id, _, _ in changes}
+    redis_breaker.call(r.delete, *keys)
+
+
+events.contact_change_listeners.append(invalidate_digests)
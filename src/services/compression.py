@@ -0,0 +1,166 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "application/msgpack",
+                      "application/vnd.contacts.")
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+        Compresses responses with brotli, zstd (when the optional packages are installed) or gzip,
+        whichever the client accepts and prefers. Complete bodies shorter than ``minimum_size`` are
+        sent as is; streamed bodies are compressed chunk by chunk and flushed after every chunk.
+        """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4,
+                 zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressors = {"gzip": lambda: GzipCompressor(gzip_level)}
+        if zstandard is not None:
+            self.compressors["zstd"] = lambda: ZstdCompressor(zstd_level)
+        if brotli is not None:
+            self.compressors["br"] = lambda: BrotliCompressor(brotli_quality)
+        # Server preference for equal client weights
+        self.preference = [encoding for encoding in ("br", "zstd", "gzip") if encoding in self.compressors]
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        """
+            Chooses the encoding for the Accept-Encoding header.
+
+            :param accept_encoding: Value of the Accept-Encoding request header.
+            :type accept_encoding: str
+            :return: The encoding, or None to send the response uncompressed.
+            :rtype: str | None
+            """
+        weights = {}
+        for item in accept_encoding.split(","):
+            coding, _, params = item.strip().partition(";")
+            weight = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    weight = float(params[2:])
+                except ValueError:
+                    weight = 0.0
+            weights[coding.strip().lower()] = weight
+        wildcard = weights.get("*", 0.0)
+        best, best_weight = None, 0.0
+        for encoding in self.preference:
+            weight = weights.get(encoding, wildcard)
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        compressor_factory = self.compressors[encoding] if encoding is not None else None
+        responder = CompressionResponder(send, encoding, compressor_factory, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """
+        Compresses one response with ``encoding``, or sends it as is when ``encoding`` is None. Every
+        response of a compressible type varies on Accept-Encoding, compressed or not, so that shared
+        caches keep the encodings apart.
+        """
+
+    def __init__(self, send: Send, encoding: str | None, compressor_factory, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.compressor_factory = compressor_factory
+        self.minimum_size = minimum_size
+        self.start_message: Message | None = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = MutableHeaders(raw=message["headers"])
+            compressible = ("content-encoding" not in headers
+                            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES))
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            self.passthrough = self.encoding is None or not compressible or message["status"] in (204, 304)
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            self.compressor = self.compressor_factory()
+            if more_body:
+                del headers["Content-Length"]
+                body = self.compressor.compress(body)
+            else:
+                body = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if self.passthrough:
+            await self._send(message)
+            return
+        body = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
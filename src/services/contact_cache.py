@@ -0,0 +1,190 @@
+import json
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from src.conf.config import settings
+from src.schemas import ContactResponse
+from src.services import events, metrics
+from src.services.redis_clients import redis_clients
+from src.services.resilience import UNAVAILABLE, redis_breaker
+from src.services.singleflight import flight, refresh_early
+
+r = redis_clients.client()
+
+# The version of the user's cached responses and one entry of that version with its remaining
+# milliseconds, in one round trip. A missing version starts from the current time, above any version
+# whose entries may still be cached.
+READ_SCRIPT = r.register_script("""
+local version = redis.call('GET', KEYS[1])
+if not version then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2], 'NX')
+    version = redis.call('GET', KEYS[1])
+end
+local entry = ARGV[3] .. version .. ARGV[4]
+return {version, redis.call('GET', entry), redis.call('PTTL', entry)}
+""")
+
+# Moves the user to a new version, leaving every older entry unreachable, and caches the changed
+# contacts under it: ARGV[5], ARGV[6]... are pairs of entry suffix and payload
+WRITE_SCRIPT = r.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+local version = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+for i = 5, #ARGV, 2 do
+    redis.call('SET', ARGV[3] .. version .. ARGV[i], ARGV[i + 1], 'EX', ARGV[4])
+end
+return version
+""")
+
+CONTACT = "contact"
+LIST = "list"
+
+counters = {(kind, outcome): 0 for kind in (CONTACT, LIST) for outcome in ("hit", "miss", "refresh", "error")}
+loads = {CONTACT: flight("contact"), LIST: flight("contact_list")}
+
+
+def version_key(user_id: int) -> str:
+    return f"contacts:cache:version:{user_id}"
+
+
+def entry_prefix(user_id: int) -> str:
+    return f"contacts:cache:{user_id}:"
+
+
+def contact_suffix(contact_id: int) -> str:
+    return f":contact:{contact_id}"
+
+
+def list_suffix(skip: int, limit: int) -> str:
+    return f":list:{skip}:{limit}"
+
+
+def is_cached_page(skip: int, limit: int) -> bool:
+    """
+        Whether a page of the contact list is cached: only pages within the first
+        ``contacts_cache_list_rows`` contacts are, as later pages are rarely read.
+        """
+    return skip >= 0 and limit > 0 and skip + limit <= settings.contacts_cache_list_rows
+
+
+def serialize_contact(contact) -> str:
+    return json.dumps(jsonable_encoder(ContactResponse.from_orm(contact)))
+
+
+def serialize_contacts(contacts: Iterable) -> str:
+    return json.dumps(jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts]))
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def lookup(user_id: int, kind: str, suffix: str) -> Tuple[str | None, bytes | None]:
+    """
+        Reads an entry of the current version of the user's cache. An entry close to its expiry
+        may be reported missing to one reader, which reloads it early (see refresh_early).
+
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :param kind: CONTACT or LIST, for the metrics.
+        :type kind: str
+        :param suffix: The entry, from contact_suffix or list_suffix.
+        :type suffix: str
+        :return: The key to store the entry under on a miss (None when Redis is unavailable) and the
+            cached JSON payload, or None on a miss.
+        :rtype: Tuple[str | None, bytes | None]
+        """
+    result = redis_breaker.call(READ_SCRIPT, keys=[version_key(user_id)],
+                                args=[_now_ms(), settings.contacts_cache_version_ttl, entry_prefix(user_id), suffix])
+    if result is UNAVAILABLE:
+        counters[kind, "error"] += 1
+        return None, None
+    version, payload, ttl_ms = result
+    if payload is not None and refresh_early(ttl_ms / 1000, loads[kind].load_time, settings.cache_refresh_beta):
+        counters[kind, "refresh"] += 1
+        payload = None
+    else:
+        counters[kind, "hit" if payload is not None else "miss"] += 1
+    version = version.decode() if isinstance(version, bytes) else version
+    return f"{entry_prefix(user_id)}{version}{suffix}", payload
+
+
+def store(key: str | None, payload: str, ttl: int) -> None:
+    """
+        Caches a payload read from the database after a miss. The key carries the version read
+        before the database, so a payload of a version replaced meanwhile is never read.
+
+        :param key: The key returned by lookup.
+        :type key: str | None
+        :param payload: The JSON payload.
+        :type payload: str
+        :param ttl: Seconds to keep it.
+        :type ttl: int
+        """
+    if key is not None:
+        redis_breaker.call(r.set, key, payload, ex=ttl)
+
+
+async def load(kind: str, key: str | None, loader: Callable[[], Awaitable[str]], ttl: int) -> str | bytes:
+    """
+        Loads and stores a missed entry once for all the concurrent readers of the key. As the key
+        carries the cache version, a read started before a write is never shared with one started
+        after it.
+
+        :param kind: CONTACT or LIST.
+        :type kind: str
+        :param key: The key returned by lookup.
+        :type key: str | None
+        :param loader: Reads the JSON payload from the database.
+        :type loader: Callable[[], Awaitable[str]]
+        :param ttl: Seconds to keep it.
+        :type ttl: int
+        :return: The JSON payload.
+        :rtype: str | bytes
+        """
+    if key is None:
+        return await loader()
+
+    async def load_and_store() -> str:
+        payload = await loader()
+        store(key, payload, ttl)
+        return payload
+
+    return await loads[kind].do(key, load_and_store, lambda: redis_breaker.call(r.get, key, fallback=None))
+
+
+def apply_changes(changes: List[tuple]) -> None:
+    """
+        Moves the users whose contacts changed to a new cache version, caching the new state of the
+        created and updated contacts under it (write-through).
+
+        :param changes: Committed contact changes as (user_id, event_type, data).
+        :type changes: List[tuple]
+        """
+    written = defaultdict(dict)
+    for user_id, event_type, data in changes:
+        contact_id = json.loads(data)["id"]
+        entries = written[user_id]
+        if event_type == events.DELETED:
+            entries.pop(contact_suffix(contact_id), None)
+        else:
+            entries[contact_suffix(contact_id)] = data
+    for user_id, entries in written.items():
+        args = [_now_ms(), settings.contacts_cache_version_ttl, entry_prefix(user_id), settings.contacts_cache_ttl]
+        for suffix, data in entries.items():
+            args += [suffix, data]
+        redis_breaker.call(WRITE_SCRIPT, keys=[version_key(user_id)], args=args)
+
+
+def cache_metrics():
+    yield ("contacts_cache_requests_total", "counter", "Contact cache lookups by outcome",
+           [({"kind": kind, "outcome": outcome}, count) for (kind, outcome), count in counters.items()])
+
+
+events.contact_change_listeners.append(apply_changes)
+metrics.collectors.append(cache_metrics)
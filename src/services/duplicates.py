@@ -0,0 +1,84 @@
+import re
+from collections import defaultdict
+from typing import Iterable, List, Tuple
+
+NON_DIGITS = re.compile(r"\D")
+PHONE_SUFFIX_LENGTH = 9
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+        Normalizes an email for duplicate detection: trimmed and lower-cased.
+
+        :param email: Email as entered by the user.
+        :type email: str | None
+        :return: Normalized email, or None for an empty value.
+        :rtype: str | None
+        """
+    if not email:
+        return None
+    return email.strip().lower() or None
+
+
+def normalize_phone(phone: str | None) -> str | None:
+    """
+        Normalizes a phone number for duplicate detection: digits only, without the ``00``
+        international prefix, so that ``+421 900-123-456`` and ``00421900123456`` compare equal.
+
+        :param phone: Phone as entered by the user.
+        :type phone: str | None
+        :return: Normalized phone, or None if it holds no digits.
+        :rtype: str | None
+        """
+    if not phone:
+        return None
+    digits = NON_DIGITS.sub("", phone)
+    if digits.startswith("00"):
+        digits = digits[2:]
+    return digits or None
+
+
+def blocking_keys(name: str, surname: str, email: str | None, phone: str | None) -> List[Tuple[str, str]]:
+    """
+        Returns the blocking keys of a contact. Two contacts sharing any key are duplicate candidates.
+
+        :return: A list of (reason, key) tuples.
+        :rtype: List[Tuple[str, str]]
+        """
+    keys = []
+    email = normalize_email(email)
+    if email:
+        keys.append(("email", email))
+    phone = normalize_phone(phone)
+    if phone:
+        keys.append(("phone", phone))
+        if len(phone) > PHONE_SUFFIX_LENGTH:
+            # Same subscriber number written with and without the country code
+            keys.append(("phone", phone[-PHONE_SUFFIX_LENGTH:]))
+    full_name = f"{(name or '').strip().lower()} {(surname or '').strip().lower()}".strip()
+    if full_name:
+        keys.append(("name", full_name))
+    return keys
+
+
+def find_duplicate_pairs(rows: Iterable[tuple]) -> List[dict]:
+    """
+        Finds duplicate candidates in a single pass over the contacts.
+
+        Every contact is hashed into its blocking keys; a contact that lands in an occupied block is
+        paired with the first contact of that block only, so the work stays linear in the number of
+        contacts instead of comparing every pair.
+
+        :param rows: Iterable of (id, name, surname, email, phone) tuples.
+        :type rows: Iterable[tuple]
+        :return: A list of candidate pairs with the reasons they matched.
+        :rtype: List[dict]
+        """
+    blocks = {}
+    pairs = defaultdict(set)
+    for contact_id, name, surname, email, phone in rows:
+        for reason, key in blocking_keys(name, surname, email, phone):
+            first = blocks.setdefault((reason, key), contact_id)
+            if first != contact_id:
+                pairs[(min(first, contact_id), max(first, contact_id))].add(reason)
+    return [{"contact_ids": list(pair), "reasons": sorted(reasons)} for pair, reasons in sorted(pairs.items())]
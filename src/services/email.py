@@ -1,4 +1,6 @@
+import asyncio
 from pathlib import Path
+from typing import List, Tuple
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 from fastapi_mail.errors import ConnectionErrors
@@ -6,6 +8,7 @@ from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import settings
+from src.services.tracing import KIND_CLIENT, span
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
@@ -43,6 +46,54 @@ async def send_email(email: EmailStr, username: str, host: str):
         )
 
         fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
+        with span("mail.send", KIND_CLIENT, **{"mail.template": "email_template.html"}):
+            await fm.send_message(message, template_name="email_template.html")
+    except ConnectionErrors as err:
+        print(err)
+
+
+async def send_emails(recipients: List[Tuple[str, str]], host: str):
+    """
+        Sends the confirmation emails of many users, a few at a time
+
+        :param recipients: Email and username of every user
+        :type recipients: List[Tuple[str, str]]
+        :param host: Host
+        :type host: str
+        """
+    semaphore = asyncio.Semaphore(settings.mail_concurrency)
+
+    async def send(email, username):
+        async with semaphore:
+            await send_email(email, username, host)
+
+    results = await asyncio.gather(*(send(email, username) for email, username in recipients), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(result)
+
+
+async def send_birthday_digest(email: EmailStr, username: str, contacts: list):
+    """
+        Sends the upcoming birthdays digest to user
+
+        :param email: Email of user
+        :type email: EmailStr
+        :param username: Username
+        :type username: str
+        :param contacts: Contacts with upcoming birthdays, serialized like ContactResponse
+        :type contacts: list
+        """
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays",
+            recipients=[email],
+            template_body={"username": username, "contacts": contacts},
+            subtype=MessageType.html
+        )
+
+        fm = FastMail(conf)
+        with span("mail.send", KIND_CLIENT, **{"mail.template": "birthday_template.html"}):
+            await fm.send_message(message, template_name="birthday_template.html")
     except ConnectionErrors as err:
         print(err)
@@ -0,0 +1,206 @@
+import asyncio
+import json
+from typing import AsyncIterator, List
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.schemas import ContactResponse
+from src.services.redis_clients import redis_clients
+from src.services.resilience import redis_breaker
+
+r = redis_clients.client()
+async_r = redis_clients.async_client(subscriptions=True)
+
+# Append the event to the user's capped log (for Last-Event-ID replay) and publish it, in one round trip
+PUBLISH_SCRIPT = r.register_script("""
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'type', ARGV[2], 'data', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('PUBLISH', KEYS[2], id .. '\\n' .. ARGV[2] .. '\\n' .. ARGV[3])
+return id
+""")
+
+# Callables run after commit with the committed changes as a list of (user_id, event_type, data)
+contact_change_listeners = []
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+def channel_name(user_id: int) -> str:
+    return f"contacts:events:{user_id}"
+
+
+def log_name(user_id: int) -> str:
+    return f"contacts:events:log:{user_id}"
+
+
+def queue_contact_event(db: Session, event_type: str, contact) -> None:
+    """
+        Queues a contact change event; it is published once the session commits and dropped on rollback.
+        Must be called after the change is flushed, while the contact attributes are still loaded.
+
+        :param db: The database session.
+        :type db: Session
+        :param event_type: One of CREATED, UPDATED, DELETED.
+        :type event_type: str
+        :param contact: The changed contact.
+        :type contact: Contact
+        """
+    if event_type == DELETED:
+        data = json.dumps({"id": contact.id})
+    else:
+        data = json.dumps(jsonable_encoder({field: getattr(contact, field) for field in ContactResponse.__fields__}))
+    db.info.setdefault("contact_events", []).append((contact.user_id, event_type, data))
+
+
+def publish_contact_event(user_id: int, event_type: str, data: str) -> None:
+    """
+        Publishes a contact change event to the subscribers of the user on every worker.
+
+        :param user_id: The owner of the contact.
+        :type user_id: int
+        :param event_type: One of CREATED, UPDATED, DELETED.
+        :type event_type: str
+        :param data: JSON payload.
+        :type data: str
+        """
+    redis_breaker.call(PUBLISH_SCRIPT, keys=[log_name(user_id), channel_name(user_id)],
+                       args=[settings.contact_events_history, event_type, data, settings.contact_events_ttl])
+
+
+def publish_contact_events(changes: List[tuple]) -> None:
+    """
+        Publishes the change events of a commit. Several events are sent in one pipeline: one round
+        trip for all of them, after the one checking that the script is loaded.
+
+        :param changes: Committed contact changes as (user_id, event_type, data).
+        :type changes: List[tuple]
+        """
+    if len(changes) == 1:
+        publish_contact_event(*changes[0])
+        return
+    pipe = r.pipeline(transaction=False)
+    for user_id, event_type, data in changes:
+        PUBLISH_SCRIPT(keys=[log_name(user_id), channel_name(user_id)],
+                       args=[settings.contact_events_history, event_type, data, settings.contact_events_ttl],
+                       client=pipe)
+    redis_breaker.call(pipe.execute)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_queued_events(session: Session) -> None:
+    changes = session.info.pop("contact_events", [])
+    if not changes:
+        return
+    publish_contact_events(changes)
+    for listener in contact_change_listeners:
+        listener(changes)
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        marks = session.info.setdefault("contact_event_marks", {})
+        marks[transaction] = len(session.info.get("contact_events", ()))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_queued_events(session: Session, previous_transaction) -> None:
+    # A rolled back savepoint drops only the events queued since it began
+    marks = session.info.get("contact_event_marks", {})
+    if previous_transaction.nested and previous_transaction in marks:
+        del session.info.get("contact_events", [])[marks[previous_transaction]:]
+    elif previous_transaction.parent is None:
+        session.info.pop("contact_events", None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_savepoints(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("contact_event_marks", None)
+
+
+def _event_id_key(event_id: str) -> tuple:
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def _format(event_id: str | None, event_type: str, data: str) -> str:
+    if event_id is None:
+        return f"event: {event_type}\ndata: {data}\n\n"
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+async def contact_event_stream(user_id: int, last_event_id: str | None = None) -> AsyncIterator[str]:
+    """
+        Yields the Server-Sent Events of the contacts of a user: missed events after ``last_event_id``
+        first, then live events, with a comment line as heartbeat. A connection that falls more than
+        ``contact_events_buffer`` events behind is closed, and the client reconnects with its
+        Last-Event-ID. A ``reset`` event tells the client that the missed events are no longer
+        available and the address book must be reloaded.
+
+        :param user_id: The user to stream the events for.
+        :type user_id: int
+        :param last_event_id: The last event the client received.
+        :type last_event_id: str | None
+        :return: SSE formatted chunks.
+        :rtype: AsyncIterator[str]
+        """
+    pubsub = async_r.pubsub(ignore_subscribe_messages=True)
+    queue = asyncio.Queue(maxsize=settings.contact_events_buffer)
+    overflow = asyncio.Event()
+
+    async def read():
+        async for message in pubsub.listen():
+            try:
+                queue.put_nowait(message["data"])
+            except asyncio.QueueFull:
+                overflow.set()
+                return
+
+    yield f"retry: {settings.contact_events_retry_ms}\n\n"
+    await pubsub.subscribe(channel_name(user_id))
+    reader = asyncio.create_task(read())
+    try:
+        last_seen = (0, 0)
+        if last_event_id:
+            # Subscribed before the replay, so nothing falls in between; duplicates are skipped below
+            try:
+                last_seen = _event_id_key(last_event_id)
+            except ValueError:
+                yield _format(None, "reset", "{}")
+                return
+            async with async_r.pipeline(transaction=False) as pipe:
+                pipe.xrange(log_name(user_id), count=1)
+                pipe.xrange(log_name(user_id), min=f"({last_event_id}", count=settings.contact_events_history)
+                oldest, missed = await pipe.execute()
+            if oldest and _event_id_key(oldest[0][0].decode()) > last_seen:
+                yield _format(None, "reset", "{}")
+                return
+            for event_id, fields in missed:
+                event_id = event_id.decode()
+                last_seen = _event_id_key(event_id)
+                yield _format(event_id, fields[b"type"].decode(), fields[b"data"].decode())
+
+        while not overflow.is_set():
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=settings.contact_events_heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            event_id, event_type, data = message.decode().split("\n", 2)
+            if _event_id_key(event_id) <= last_seen:
+                continue
+            last_seen = _event_id_key(event_id)
+            yield _format(event_id, event_type, data)
+        if last_seen == (0, 0):
+            # Nothing delivered yet, so there is no id to resume from
+            yield _format(None, "reset", "{}")
+    finally:
+        reader.cancel()
+        await pubsub.unsubscribe()
+        await pubsub.close()
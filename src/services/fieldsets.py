@@ -0,0 +1,73 @@
+from functools import lru_cache
+from typing import Iterable, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, create_model
+
+from src.schemas import ContactResponse
+
+CONTACT_FIELDS = tuple(ContactResponse.__fields__)
+
+
+class SparseConfig:
+    orm_mode = True
+
+
+def parse_fields(fields: str | None) -> Tuple[str, ...] | None:
+    """
+        Parses the ``fields`` query parameter of the contact routes.
+
+        :param fields: Comma separated field names, e.g. ``name,phone``.
+        :type fields: str | None
+        :return: The requested fields in declaration order, or None when all fields are requested.
+        :rtype: Tuple[str, ...] | None
+        """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not requested or requested == set(CONTACT_FIELDS):
+        return None
+    # Declaration order keeps the cache key of sparse_model stable
+    return tuple(field for field in CONTACT_FIELDS if field in requested)
+
+
+@lru_cache(maxsize=128)
+def sparse_model(fields: Tuple[str, ...] | None) -> Type[BaseModel]:
+    """
+        Builds (once per field set) a response model holding only the requested contact fields.
+
+        :param fields: Field names as returned by parse_fields.
+        :type fields: Tuple[str, ...] | None
+        :return: The response model.
+        :rtype: Type[BaseModel]
+        """
+    if fields is None:
+        return ContactResponse
+    definitions = {field: (ContactResponse.__fields__[field].outer_type_, ...) for field in fields}
+    return create_model(f"ContactResponse_{'_'.join(fields)}", __config__=SparseConfig, **definitions)
+
+
+def _validate(model: Type[BaseModel], contact) -> BaseModel:
+    return model.parse_obj(contact) if isinstance(contact, dict) else model.from_orm(contact)
+
+
+def sparse_response(contacts, fields: Tuple[str, ...]) -> JSONResponse:
+    """
+        Serializes a contact or a list of contacts with the response model of the field set.
+
+        :param contacts: A contact or an iterable of contacts, as ORM objects or dicts.
+        :param fields: Field names as returned by parse_fields.
+        :type fields: Tuple[str, ...]
+        :return: JSON response.
+        :rtype: JSONResponse
+        """
+    model = sparse_model(fields)
+    if isinstance(contacts, Iterable) and not isinstance(contacts, dict):
+        return JSONResponse(content=jsonable_encoder([_validate(model, contact) for contact in contacts]))
+    return JSONResponse(content=jsonable_encoder(_validate(model, contacts)))
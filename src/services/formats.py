@@ -0,0 +1,145 @@
+import json
+from datetime import date
+from typing import Iterable, Iterator, List, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+
+from src.services.fieldsets import CONTACT_FIELDS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# One array per field instead of one object per contact: {"count": 2, "columns": {"id": [1, 2], ...}}
+COLUMNAR = "application/vnd.contacts.columnar+json"
+ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def available() -> Tuple[str, ...]:
+    """
+        The media types of the contact lists, in the order of preference of the server.
+        """
+    return (JSON, COLUMNAR, MSGPACK) if msgpack is not None else (JSON, COLUMNAR)
+
+
+def negotiate(accept: str | None) -> str:
+    """
+        Chooses the media type of a contact list from the Accept header. The most specific range
+        matching a media type gives its quality; ties go to the server preference, JSON first.
+
+        :param accept: The Accept header.
+        :type accept: str | None
+        :return: The media type.
+        :rtype: str
+        """
+    if not accept:
+        return JSON
+    qualities = {}
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        media_type = ALIASES.get(media_type.lower(), media_type.lower())
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        for candidate in available():
+            if media_type == candidate:
+                specificity = 2
+            elif media_type == candidate.split("/")[0] + "/*":
+                specificity = 1
+            elif media_type == "*/*":
+                specificity = 0
+            else:
+                continue
+            if specificity > qualities.get(candidate, (-1, 0.0))[0]:
+                qualities[candidate] = (specificity, quality)
+    candidates = [candidate for candidate in available() if qualities.get(candidate, (0, 0.0))[1] > 0]
+    if not candidates:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                            detail=f"Supported media types: {', '.join(available())}")
+    return max(candidates, key=lambda candidate: qualities[candidate][1])
+
+
+def _value(value):
+    # As jsonable_encoder writes dates, so that every format carries the same values
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def contact_rows(contacts: Iterable, fields: Tuple[str, ...]) -> Iterator[list]:
+    """
+        The values of the fields of each contact, read straight from the ORM objects (or dicts)
+        without building a response model per contact.
+
+        :param contacts: Contacts as ORM objects or dicts.
+        :type contacts: Iterable
+        :param fields: The fields, in output order.
+        :type fields: Tuple[str, ...]
+        :return: One list of values per contact.
+        :rtype: Iterator[list]
+        """
+    for contact in contacts:
+        if isinstance(contact, dict):
+            yield [_value(contact.get(field)) for field in fields]
+        else:
+            yield [_value(getattr(contact, field)) for field in fields]
+
+
+def encode_columnar(rows: List[list], fields: Tuple[str, ...]) -> bytes:
+    columns = list(zip(*rows)) if rows else [() for _ in fields]
+    return json.dumps({"count": len(rows), "columns": dict(zip(fields, map(list, columns)))},
+                      separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encode_msgpack(rows: Iterable[list], fields: Tuple[str, ...]) -> bytes:
+    return msgpack.packb([dict(zip(fields, row)) for row in rows])
+
+
+def contacts_response(contacts: Iterable, fields: Tuple[str, ...] | None, media_type: str) -> Response:
+    """
+        Serializes a list of contacts as MessagePack (the objects of the JSON response) or as
+        columnar JSON.
+
+        :param contacts: Contacts as ORM objects or dicts.
+        :type contacts: Iterable
+        :param fields: Field names as returned by parse_fields (all when None).
+        :type fields: Tuple[str, ...] | None
+        :param media_type: MSGPACK or COLUMNAR, as returned by negotiate.
+        :type media_type: str
+        :return: The response.
+        :rtype: Response
+        """
+    fields = fields or CONTACT_FIELDS
+    rows = list(contact_rows(contacts, fields))
+    content = encode_msgpack(rows, fields) if media_type == MSGPACK else encode_columnar(rows, fields)
+    return Response(content=content, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def stream_contacts(contacts: Iterable, fields: Tuple[str, ...] | None, media_type: str) -> Iterator[bytes]:
+    """
+        Serializes an export of contacts: MessagePack as a stream of one object per contact (read
+        with msgpack.Unpacker), columnar JSON once all the values are collected.
+
+        :param contacts: Contacts as ORM objects.
+        :type contacts: Iterable
+        :param fields: Field names as returned by parse_fields (all when None).
+        :type fields: Tuple[str, ...] | None
+        :param media_type: MSGPACK or COLUMNAR, as returned by negotiate.
+        :type media_type: str
+        :return: The chunks of the body.
+        :rtype: Iterator[bytes]
+        """
+    fields = fields or CONTACT_FIELDS
+    if media_type == MSGPACK:
+        packer = msgpack.Packer()
+        for row in contact_rows(contacts, fields):
+            yield packer.pack(dict(zip(fields, row)))
+        return
+    yield encode_columnar(list(contact_rows(contacts, fields)), fields)
@@ -0,0 +1,146 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set
+
+
+def trigrams(word: str) -> Set[str]:
+    """
+        The distinct trigrams of a word padded with a space on both sides, so that a word of n
+        characters has up to n trigrams and even one-letter words have one.
+        """
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """
+        Optimal string alignment distance (Levenshtein with adjacent transpositions, so "jonh" is one
+        edit from "john"), computed only as far as needed to tell whether it exceeds ``limit``.
+
+        :param a: The first word.
+        :type a: str
+        :param b: The second word.
+        :type b: str
+        :param limit: The largest distance of interest.
+        :type limit: int
+        :return: The distance, or ``limit + 1`` for any larger distance.
+        :rtype: int
+        """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_minimum = i
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+            row_minimum = min(row_minimum, value)
+        if row_minimum > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class FuzzyIndex:
+    """
+        Words of the contacts with the contacts using them, and a trigram posting list over the
+        distinct words. A word within ``k`` edits of the query shares at least ``|trigrams| - 4k`` of
+        its trigrams (an edit changes at most three, a transposition four), so distances are only
+        computed for words passing that count and the length filter. Queries too short for the
+        bound to require a shared trigram scan the words of a close length instead.
+        """
+
+    def __init__(self):
+        self.words: Dict[str, Set[int]] = {}
+        self.postings: Dict[str, Set[str]] = defaultdict(set)
+        self.lengths: Dict[int, Set[str]] = defaultdict(set)
+
+    def add(self, contact_id: int, words: Iterable[str]) -> None:
+        for word in words:
+            contacts = self.words.get(word)
+            if contacts is None:
+                contacts = self.words[word] = set()
+                self.lengths[len(word)].add(word)
+                for gram in trigrams(word):
+                    self.postings[gram].add(word)
+            contacts.add(contact_id)
+
+    def remove(self, contact_id: int, words: Iterable[str]) -> None:
+        for word in words:
+            contacts = self.words.get(word)
+            if contacts is None:
+                continue
+            contacts.discard(contact_id)
+            if not contacts:
+                del self.words[word]
+                self.lengths[len(word)].discard(word)
+                if not self.lengths[len(word)]:
+                    del self.lengths[len(word)]
+                for gram in trigrams(word):
+                    self.postings[gram].discard(word)
+                    if not self.postings[gram]:
+                        del self.postings[gram]
+
+    def matches(self, word: str, max_distance: int) -> Dict[str, int]:
+        """
+            The indexed words within ``max_distance`` edits of a word, with their distances.
+            """
+        grams = trigrams(word)
+        # An edit changes up to 3 trigrams, a transposition up to 4
+        needed = len(grams) - 4 * max_distance
+        if needed > 0:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.postings.get(gram, ()))
+            candidates = [candidate for candidate, shared in counts.items() if shared >= needed]
+        else:
+            # No count bound: a match may share no trigram at all
+            candidates = [candidate for length in range(len(word) - max_distance, len(word) + max_distance + 1)
+                          for candidate in self.lengths.get(length, ())]
+        found = {}
+        for candidate in candidates:
+            if abs(len(candidate) - len(word)) > max_distance:
+                continue
+            distance = bounded_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                found[candidate] = distance
+        return found
+
+    def closest(self, word: str, max_distance: int) -> Dict[int, int]:
+        """
+            The contacts with a word within ``max_distance`` edits of a word, with the smallest distance.
+            """
+        by_distance = defaultdict(list)
+        for candidate, distance in self.matches(word, max_distance).items():
+            by_distance[distance].append(self.words[candidate])
+        best = {}
+        for distance in sorted(by_distance):
+            contacts = set().union(*by_distance[distance])
+            contacts.difference_update(best)
+            best.update(dict.fromkeys(contacts, distance))
+        return best
+
+    def search(self, words: List[str], max_distance: int) -> Dict[int, int]:
+        """
+            Finds the contacts with a word close to every query word.
+
+            :param words: The query words, lowercased.
+            :type words: List[str]
+            :param max_distance: The largest number of edits per word.
+            :type max_distance: int
+            :return: The total distance of each matching contact by contact id.
+            :rtype: Dict[int, int]
+            """
+        scores = {}
+        for position, word in enumerate(words):
+            best = self.closest(word, max_distance)
+            if position == 0:
+                scores = best
+            else:
+                scores = {contact_id: scores[contact_id] + best[contact_id] for contact_id in scores.keys() & best.keys()}
+            if not scores:
+                break
+        return scores
@@ -0,0 +1,372 @@
+import json
+import re
+from datetime import datetime
+from typing import Dict, List
+from uuid import uuid4
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+COLUMN = r'(?:"?(\w+)"?\.)?"?(\w+)"?'
+CLAUSE_END = re.compile(r"\b(?:GROUP BY|ORDER BY|LIMIT|OFFSET|RETURNING|FOR UPDATE|HAVING)\b", re.I)
+TABLE = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+"?(\w+)"?(?:\s+AS\s+"?(\w+)"?)?', re.I)
+JOIN_ON = re.compile(r"\bON\b(.*?)(?=\b(?:LEFT|RIGHT|INNER|OUTER|FULL|CROSS)?\s*JOIN\b|\bWHERE\b|$)", re.I | re.S)
+EQUALITY = re.compile(rf"^{COLUMN}\s*(?:=|\bIN\b)\s*(.*)$", re.I | re.S)
+NULL_TEST = re.compile(rf"^{COLUMN}\s+IS\s+(?:NOT\s+)?NULL$", re.I)
+RANGE = re.compile(rf"^{COLUMN}\s*(?:<=|>=|<|>|\bBETWEEN\b)", re.I)
+TUPLE_RANGE = re.compile(rf"^\(\s*({COLUMN}(?:\s*,\s*{COLUMN})*)\s*\)\s*(?:<=|>=|<|>)", re.I)
+LIKE = re.compile(rf"^{COLUMN}\s+(?:NOT\s+)?I?LIKE\b", re.I)
+ORDER_ITEM = re.compile(rf"^{COLUMN}(?:\s+(?:ASC|DESC))?(?:\s+NULLS\s+(?:FIRST|LAST))?$", re.I)
+COLUMN_ONLY = re.compile(rf"^{COLUMN}$")
+QUALIFIED = re.compile(r'"?(\w+)"?\."?(\w+)"?')
+
+
+def _split_top_level(text: str, separator: str) -> List[str]:
+    """
+        Splits on a separator (``AND``, ``OR`` or ``,``) outside parentheses.
+        """
+    pattern = re.compile(rf"\s+{separator}\s+" if separator.isalpha() else rf"\s*{separator}\s*", re.I)
+    parts, depth, start, position = [], 0, 0, 0
+    while position < len(text):
+        char = text[position]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            match = pattern.match(text, position)
+            if match:
+                parts.append(text[start:position])
+                start = position = match.end()
+                continue
+        position += 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _strip_parentheses(text: str) -> str:
+    while text.startswith("(") and text.endswith(")") and not _split_top_level(text[1:-1], ",")[1:]:
+        inner = text[1:-1].strip()
+        depth = 0
+        for char in inner:
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if depth < 0:
+                return text
+        text = inner
+    return text
+
+
+def analyze_statement(statement: str) -> Dict[str, dict]:
+    """
+        Extracts how a statement accesses its tables: columns compared for equality, range predicates,
+        sort order, IS NULL conditions (for partial indexes) and predicates no plain index can serve.
+
+        :param statement: SQL as captured (SQLAlchemy output of SELECT, UPDATE or DELETE).
+        :type statement: str
+        :return: Access per table name.
+        :rtype: Dict[str, dict]
+        """
+    statement = re.sub(r"\s+", " ", statement).strip()
+    if not re.match(r"^(SELECT|UPDATE|DELETE)\b", statement, re.I):
+        return {}
+    aliases = {}
+    for table, alias in TABLE.findall(statement):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    tables = sorted(set(aliases.values()))
+    accesses = {table: {"equality": [], "range": [], "order": [], "conditions": [], "notes": []} for table in tables}
+
+    def resolve(qualifier: str, column: str):
+        if qualifier:
+            table = aliases.get(qualifier)
+        else:
+            table = tables[0] if len(tables) == 1 else None
+        return (table, column) if table in accesses else (None, column)
+
+    def add(kind: str, qualifier: str, column: str):
+        table, column = resolve(qualifier, column)
+        if table is not None and column not in accesses[table][kind]:
+            accesses[table][kind].append(column)
+
+    conjuncts = []
+    for on in JOIN_ON.findall(statement):
+        conjuncts += _split_top_level(on.strip(), "AND")
+    where = re.search(r"\bWHERE\b(.*)$", statement, re.I)
+    if where:
+        clause = CLAUSE_END.split(where.group(1), maxsplit=1)[0]
+        parts = _split_top_level(clause.strip(), "AND")
+        # The AND of BETWEEN x AND y is not a conjunction
+        for part in parts:
+            if conjuncts and re.search(r"\bBETWEEN\s+\S+$", conjuncts[-1], re.I):
+                conjuncts[-1] += f" AND {part}"
+            else:
+                conjuncts.append(part)
+
+    for conjunct in conjuncts:
+        conjunct = _strip_parentheses(conjunct)
+        if len(_split_top_level(conjunct, "OR")) > 1:
+            notes_for = {resolve(qualifier, column)[0] for qualifier, column in QUALIFIED.findall(conjunct)}
+            for table in notes_for - {None}:
+                accesses[table]["notes"].append(f"OR condition: {conjunct}")
+            continue
+        match = EQUALITY.match(conjunct)
+        if match:
+            add("equality", match.group(1), match.group(2))
+            other = COLUMN_ONLY.match(match.group(3).strip())
+            if other and other.group(1):
+                add("equality", other.group(1), other.group(2))
+            continue
+        match = NULL_TEST.match(conjunct)
+        if match:
+            table, column = resolve(match.group(1), match.group(2))
+            if table is not None:
+                accesses[table]["conditions"].append(re.sub(r'^(?:"?\w+"?\.)', "", conjunct))
+            continue
+        match = TUPLE_RANGE.match(conjunct)
+        if match:
+            for qualifier, column in re.findall(COLUMN, match.group(1)):
+                add("range", qualifier, column)
+            continue
+        match = RANGE.match(conjunct)
+        if match:
+            add("range", match.group(1), match.group(2))
+            continue
+        match = LIKE.match(conjunct)
+        if match:
+            table, column = resolve(match.group(1), match.group(2))
+            if table is not None:
+                accesses[table]["notes"].append(f"LIKE on {column}: a b-tree index only serves prefix "
+                                                f"patterns; consider a pg_trgm GIN index")
+            continue
+        for qualifier, column in QUALIFIED.findall(conjunct):
+            table, column = resolve(qualifier, column)
+            if table is not None:
+                accesses[table]["notes"].append(f"expression on {column}: needs an expression index")
+                break
+
+    order = re.search(r"\bORDER BY\b(.*?)(?=\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|$)", statement, re.I)
+    if order:
+        for item in _split_top_level(order.group(1).strip(), ","):
+            match = ORDER_ITEM.match(item)
+            if match:
+                add("order", match.group(1), match.group(2))
+    return accesses
+
+
+def candidate_index(table: str, access: dict) -> dict | None:
+    """
+        Proposes the index serving an access: equality columns first, then the first range column,
+        or the sort columns when there is no range.
+
+        :param table: The table.
+        :type table: str
+        :param access: The access as returned by analyze_statement.
+        :type access: dict
+        :return: ``{"table", "columns", "where"}``, or None when no index helps.
+        :rtype: dict | None
+        """
+    columns = list(access["equality"])
+    if access["range"]:
+        columns.append(access["range"][0])
+    elif access["order"]:
+        columns += [column for column in access["order"] if column not in columns]
+    if not columns:
+        return None
+    where = " AND ".join(sorted(set(access["conditions"]))) or None
+    return {"table": table, "columns": tuple(columns), "where": where}
+
+
+def existing_indexes(connection: Connection) -> Dict[str, List[tuple]]:
+    """
+        Column lists of the primary keys, unique constraints and indexes of every table.
+        """
+    inspector = inspect(connection)
+    indexes = {}
+    for table in inspector.get_table_names():
+        columns = indexes.setdefault(table, [])
+        primary_key = inspector.get_pk_constraint(table).get("constrained_columns")
+        if primary_key:
+            columns.append(tuple(primary_key))
+        for constraint in inspector.get_unique_constraints(table):
+            columns.append(tuple(constraint["column_names"]))
+        for index in inspector.get_indexes(table):
+            if None not in index["column_names"]:
+                columns.append(tuple(index["column_names"]))
+    return indexes
+
+
+def is_covered(candidate: dict, access: dict, indexes: Dict[str, List[tuple]]) -> bool:
+    """
+        Whether an existing index lets the database seek instead of scanning: its leading column is
+        compared for equality, or is the range/sort column when there is no equality.
+        """
+    leading = set(access["equality"]) or {candidate["columns"][0]}
+    return any(index and index[0] in leading for index in indexes.get(candidate["table"], []))
+
+
+def explain(connection: Connection, statement: str, parameters) -> dict:
+    """
+        Runs EXPLAIN (without executing the statement) and lists the tables read by full scans.
+
+        :param connection: A connection to a database with representative data.
+        :type connection: Connection
+        :param statement: SQL as captured.
+        :type statement: str
+        :param parameters: The captured parameters.
+        :return: ``{"full_scans": [...], "plan": ...}``, or ``{"error": ...}``.
+        :rtype: dict
+        """
+    if isinstance(parameters, list):
+        parameters = tuple(parameters)
+    dialect = connection.dialect.name
+    try:
+        if dialect == "postgresql":
+            plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            scans, nodes = [], [plan[0]["Plan"]]
+            while nodes:
+                node = nodes.pop()
+                if node["Node Type"] == "Seq Scan":
+                    scans.append(node["Relation Name"])
+                nodes += node.get("Plans", [])
+            return {"full_scans": sorted(set(scans)), "plan": plan}
+        if dialect == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            details = [row[-1] for row in rows]
+            scans = [detail.split()[1] for detail in details
+                     if detail.startswith("SCAN ") and "USING INTEGER PRIMARY KEY" not in detail]
+            return {"full_scans": sorted(set(scans)), "plan": details}
+        return {"error": f"EXPLAIN is not supported for {dialect}"}
+    except Exception as err:
+        connection.rollback()
+        return {"error": str(err).splitlines()[0]}
+
+
+def index_name(candidate: dict) -> str:
+    return f"ix_{candidate['table']}_{'_'.join(candidate['columns'])}"[:63]
+
+
+def advise(statements: Dict[str, dict], connection: Connection | None = None, min_calls: int = 1) -> dict:
+    """
+        Analyzes a captured workload and proposes the indexes it lacks, heaviest first.
+
+        :param statements: The capture, as saved by QueryCapture.
+        :type statements: Dict[str, dict]
+        :param connection: The database to read the existing indexes from and EXPLAIN against.
+        :type connection: Connection | None
+        :param min_calls: Ignore statements executed fewer times.
+        :type min_calls: int
+        :return: ``{"statements": [...], "proposals": [...]}``.
+        :rtype: dict
+        """
+    indexes = existing_indexes(connection) if connection is not None else {}
+    reports, proposals = [], {}
+    for key, entry in sorted(statements.items(), key=lambda item: -item[1]["total_seconds"]):
+        if entry["calls"] < min_calls:
+            continue
+        accesses = analyze_statement(entry["statement"])
+        if not accesses:
+            continue
+        report = {"statement": key, "calls": entry["calls"],
+                  "total_ms": round(entry["total_seconds"] * 1000, 2),
+                  "mean_ms": round(entry["total_seconds"] * 1000 / entry["calls"], 3),
+                  "notes": [note for access in accesses.values() for note in access["notes"]],
+                  "proposed": []}
+        if connection is not None and entry["parameters"] is not None:
+            report.update(explain(connection, entry["statement"], entry["parameters"]))
+            report.pop("plan", None)
+        for table, access in accesses.items():
+            candidate = candidate_index(table, access)
+            if candidate is None or is_covered(candidate, access, indexes):
+                continue
+            name = index_name(candidate)
+            proposal = proposals.setdefault((table, candidate["columns"], candidate["where"]),
+                                            dict(candidate, name=name, calls=0, total_ms=0.0))
+            proposal["calls"] += entry["calls"]
+            proposal["total_ms"] += report["total_ms"]
+            report["proposed"].append(name)
+        reports.append(report)
+
+    # An index also serves the queries on a prefix of its columns
+    merged = sorted(proposals.values(), key=lambda proposal: -len(proposal["columns"]))
+    result = []
+    for proposal in merged:
+        wider = next((other for other in result if other["table"] == proposal["table"]
+                      and other["where"] == proposal["where"]
+                      and other["columns"][:len(proposal["columns"])] == proposal["columns"]), None)
+        if wider is None:
+            result.append(proposal)
+            continue
+        wider["calls"] += proposal["calls"]
+        wider["total_ms"] += proposal["total_ms"]
+        for report in reports:
+            report["proposed"] = [wider["name"] if name == proposal["name"] else name for name in report["proposed"]]
+    result.sort(key=lambda proposal: -proposal["total_ms"])
+    for proposal in result:
+        proposal["columns"] = list(proposal["columns"])
+        proposal["total_ms"] = round(proposal["total_ms"], 2)
+    return {"statements": reports, "proposals": result}
+
+
+MIGRATION_TEMPLATE = '''"""{message}
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {create_date}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '{revision}'
+down_revision = '{down_revision}'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not lock writes but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+{upgrade}
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+{downgrade}
+'''
+
+
+def render_migration(proposals: List[dict], down_revision: str, message: str = "Indexes proposed by the index advisor",
+                     revision: str | None = None) -> str:
+    """
+        Renders an Alembic migration creating the proposed indexes.
+
+        :param proposals: The proposals as returned by advise.
+        :type proposals: List[dict]
+        :param down_revision: The current head revision.
+        :type down_revision: str
+        :param message: The migration message.
+        :type message: str
+        :param revision: The revision id (random when None).
+        :type revision: str | None
+        :return: The migration source.
+        :rtype: str
+        """
+    upgrade, downgrade = [], []
+    for proposal in proposals:
+        options = "unique=False, postgresql_concurrently=True"
+        if proposal["where"]:
+            where = proposal["where"].replace("'", "\\'")
+            options += f",\n                        postgresql_where=sa.text('{where}')"
+        upgrade.append(f"        # {proposal['calls']} calls, {proposal['total_ms']} ms captured\n"
+                       f"        op.create_index('{proposal['name']}', '{proposal['table']}', {proposal['columns']!r}, "
+                       f"{options})")
+        downgrade.insert(0, f"        op.drop_index('{proposal['name']}', table_name='{proposal['table']}', "
+                            f"postgresql_concurrently=True)")
+    return MIGRATION_TEMPLATE.format(message=message, revision=revision or uuid4().hex[:12],
+                                     down_revision=down_revision, create_date=datetime.now(),
+                                     upgrade="\n".join(upgrade) or "        pass",
+                                     downgrade="\n".join(downgrade) or "        pass")
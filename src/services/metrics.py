@@ -0,0 +1,27 @@
+from typing import Callable, Iterable, List, Tuple
+
+# Callables yielding (name, type, help, [(labels, value), ...]) for every metric they export
+collectors: List[Callable[[], Iterable[Tuple[str, str, str, list]]]] = []
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def render() -> str:
+    """
+        Collects the metrics of every registered collector.
+
+        :return: The metrics in the Prometheus text exposition format.
+        :rtype: str
+        """
+    lines = []
+    for collector in collectors:
+        for name, kind, description, samples in collector():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,251 @@
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.services.auth import auth_service
+from src.services.tracing import current_span
+
+# Stands for the samples taken while the request was not running on the event loop thread: awaiting
+# I/O, waiting for the threadpool or for the loop to switch back from another request
+AWAITING = "[awaiting]"
+PROFILE_NAME = re.compile(r"^[\w.-]+\.folded$")
+
+
+class Profile:
+    """
+        The stack samples of one request: only the frames below ``anchor``, the frame of the
+        middleware handling the request, are counted, so concurrent requests on the same event loop
+        do not mix.
+        """
+
+    def __init__(self, name: str, thread_id: int, anchor):
+        self.name = name
+        self.thread_id = thread_id
+        self.anchor = anchor
+        self.samples: Counter = Counter()
+        self.started = time.monotonic()
+
+    def sample(self, frame) -> None:
+        stack = []
+        while frame is not None and frame is not self.anchor:
+            code = frame.f_code
+            # co_qualname is new in Python 3.11
+            name = getattr(code, "co_qualname", code.co_name)
+            stack.append(f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack)) if frame is not None and stack else AWAITING] += 1
+
+    def folded(self) -> str:
+        """
+            The samples in the folded stack format read by flamegraph.pl, speedscope and inferno.
+            """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class Sampler:
+    """
+        A thread sampling the stacks of the profiled requests every ``interval`` seconds. It only
+        runs while a request is being profiled.
+        """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.profiles: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self.profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self._lock:
+            self.profiles.remove(profile)
+
+    def _run(self) -> None:
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self.profiles:
+                        self._thread = None
+                        return
+                    frames = sys._current_frames()
+                    for profile in self.profiles:
+                        profile.sample(frames.get(profile.thread_id))
+        finally:
+            # After an error, so that the next profile starts a new thread
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+
+class ProfileStore:
+    """
+        A directory of folded stack files, deleting the oldest ones beyond ``max_bytes``.
+        """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if PROFILE_NAME.match(entry.name):
+                stat = entry.stat()
+                profiles.append({"name": entry.name, "size": stat.st_size, "created_at": stat.st_mtime})
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def path(self, name: str) -> str | None:
+        path = os.path.join(self.directory, name)
+        return path if PROFILE_NAME.match(name) and os.path.isfile(path) else None
+
+    def write(self, name: str, content: str) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), "w") as file:
+                file.write(content)
+            profiles = self.list()
+            total = sum(profile["size"] for profile in profiles)
+            while profiles and total > self.max_bytes:
+                oldest = profiles.pop()
+                os.remove(os.path.join(self.directory, oldest["name"]))
+                total -= oldest["size"]
+
+
+@dataclass
+class Rule:
+    """
+        Profiles ``sample_rate`` of the requests to a route until ``max_profiles`` were taken or
+        the rule expires.
+        """
+    id: int
+    method: str
+    route: str
+    sample_rate: float
+    max_profiles: int
+    expires_at: float
+    profiles_taken: int = field(default=0)
+
+
+class Profiler:
+    """
+        Decides which requests are profiled: those of administrators sending ``X-Profile: 1`` and
+        a sample of the requests matching the rules. Rules are kept by each worker process.
+        """
+
+    def __init__(self, store: ProfileStore, interval: float, is_admin: Callable[[str], Awaitable[bool]]):
+        self.store = store
+        self.sampler = Sampler(interval)
+        self.is_admin = is_admin
+        self.rules: Dict[int, Rule] = {}
+        self._ids = itertools.count(1)
+
+    def add_rule(self, method: str, route: str, sample_rate: float, max_profiles: int, duration: float) -> Rule:
+        rule = Rule(next(self._ids), method.upper(), route, sample_rate, max_profiles, time.time() + duration)
+        self.rules[rule.id] = rule
+        return rule
+
+    def remove_rule(self, rule_id: int) -> Rule | None:
+        return self.rules.pop(rule_id, None)
+
+    def active_rules(self) -> List[Rule]:
+        now = time.time()
+        for rule in list(self.rules.values()):
+            if rule.expires_at <= now or rule.profiles_taken >= rule.max_profiles:
+                self.rules.pop(rule.id, None)
+        return list(self.rules.values())
+
+    def _matching_rule(self, scope: Scope) -> Rule | None:
+        rules = [rule for rule in self.active_rules() if rule.method == scope["method"]]
+        if not rules:
+            return None
+        for route in scope["app"].routes:
+            if route.matches(scope)[0] == Match.FULL:
+                for rule in rules:
+                    if rule.route == getattr(route, "path_format", None) and random.random() < rule.sample_rate:
+                        rule.profiles_taken += 1
+                        return rule
+                return None
+        return None
+
+    async def should_profile(self, scope: Scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1":
+            scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and await self.is_admin(token):
+                return True
+        return bool(self.rules) and self._matching_rule(scope) is not None
+
+
+class ProfilingMiddleware:
+    """
+        Profiles the requests chosen by the profiler and names the written profile in the
+        ``X-Profile`` response header. Added innermost, so that the requests run in its task.
+        """
+
+    def __init__(self, app: ASGIApp, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not await self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        root = current_span()
+        request_id = root.trace.trace_id[:16] if root is not None else f"{random.getrandbits(64):016x}"
+        slug = re.sub(r"[^\w]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{time.time_ns() // 1_000_000}-{scope['method']}-{slug[:64]}-{request_id}.folded"
+        profile = Profile(name, threading.get_ident(), sys._getframe())
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile"] = name
+            await send(message)
+
+        self.profiler.sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            self.profiler.sampler.remove(profile)
+            try:
+                await run_in_threadpool(self.profiler.store.write, name, profile.folded())
+            except OSError as err:
+                print(err)
+
+
+async def _is_admin(token: str) -> bool:
+    db = SessionLocal()
+    try:
+        user = await auth_service.get_current_user(token, db)
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+    return bool(user.is_admin)
+
+
+profiler = Profiler(ProfileStore(settings.profiling_dir, settings.profiling_max_bytes),
+                    settings.profiling_interval_ms / 1000, _is_admin)
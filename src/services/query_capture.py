@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Expanded IN lists and multi-row VALUES differ only in their number of placeholders
+PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+REPEATED_LISTS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+        Reduces a statement to the shape shared by its executions.
+
+        :param statement: SQL as sent to the driver.
+        :type statement: str
+        :return: The statement with whitespace collapsed and placeholder lists shortened to ``(?...)``.
+        :rtype: str
+        """
+    statement = PLACEHOLDER_LIST.sub("(?...)", WHITESPACE.sub(" ", statement).strip())
+    return REPEATED_LISTS.sub("(?...)", statement)
+
+
+def _jsonable(parameters):
+    if isinstance(parameters, dict):
+        return {key: _jsonable(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_jsonable(value) for value in parameters]
+    if parameters is None or isinstance(parameters, (str, int, float, bool)):
+        return parameters
+    return str(parameters)
+
+
+class QueryCapture:
+    """
+        Records the statements an engine executes with their number of calls and timings, and one
+        sample of their parameters for EXPLAIN.
+        """
+
+    def __init__(self):
+        self.statements: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def detach(self, engine: Engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before)
+        event.remove(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        self.record(statement, None if executemany else parameters, elapsed)
+
+    def record(self, statement: str, parameters, elapsed: float) -> None:
+        """
+            Adds one execution of a statement.
+
+            :param statement: SQL as sent to the driver.
+            :type statement: str
+            :param parameters: The driver parameters, or None for executemany.
+            :param elapsed: Execution time in seconds.
+            :type elapsed: float
+            """
+        key = normalize_statement(statement)
+        with self._lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {"statement": statement, "parameters": None, "calls": 0,
+                                                "total_seconds": 0.0, "max_seconds": 0.0}
+            entry["calls"] += 1
+            entry["total_seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+            if entry["parameters"] is None and parameters is not None:
+                # The statement text must match the parameters, so keep the sampled execution's text
+                entry["statement"] = statement
+                entry["parameters"] = _jsonable(parameters)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {key: dict(entry) for key, entry in self.statements.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.statements.clear()
+
+    def save(self, path: str) -> None:
+        """
+            Merges the captured statements into a capture file, so that several processes may share one.
+
+            :param path: The capture file (JSON).
+            :type path: str
+            """
+        statements = load_capture(path) if os.path.exists(path) else {}
+        merge_captures(statements, self.snapshot())
+        with open(path, "w") as file:
+            json.dump(statements, file, indent=1)
+
+
+def merge_captures(into: Dict[str, dict], other: Dict[str, dict]) -> Dict[str, dict]:
+    for key, entry in other.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = dict(entry)
+            continue
+        current["calls"] += entry["calls"]
+        current["total_seconds"] += entry["total_seconds"]
+        current["max_seconds"] = max(current["max_seconds"], entry["max_seconds"])
+        if current["parameters"] is None and entry["parameters"] is not None:
+            current["statement"], current["parameters"] = entry["statement"], entry["parameters"]
+    return into
+
+
+def load_capture(path: str) -> Dict[str, dict]:
+    with open(path) as file:
+        return json.load(file)
+
+
+capture = QueryCapture()
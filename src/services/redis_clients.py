@@ -0,0 +1,117 @@
+from typing import Dict, Iterable
+
+import redis
+import redis.asyncio as aioredis
+
+from src.conf.config import settings
+from src.services import metrics
+from src.services.resilience import redis_options
+from src.services.tracing import instrument_redis
+
+
+def _pool_stats(pool) -> tuple:
+    # The blocking pools queue their idle connections, with None standing for the ones not yet made
+    queue = pool.pool
+    items = queue.queue if hasattr(queue, "queue") else queue._queue
+    idle = sum(1 for connection in items if connection is not None)
+    return len(pool._connections), idle
+
+
+class RedisClients:
+    """
+        The Redis connections of a worker process: one pool shared by the blocking clients of every
+        service and one pool per set of options for the asyncio clients (event streams and the
+        rate limiter). The pools are blocking, so a worker never opens more than ``max_connections``
+        (``async_max_connections``) connections and a caller waits up to ``pool_timeout`` seconds
+        for a free one. Every subscribed event stream holds an asyncio connection while it is open.
+        """
+
+    def __init__(self, host: str, port: int, db: int = 0, max_connections: int = 50,
+                 async_max_connections: int = 1000, pool_timeout: float = 0.1):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.async_max_connections = async_max_connections
+        self.pool_timeout = pool_timeout
+        self.pool = redis.BlockingConnectionPool(host=host, port=port, db=db, max_connections=max_connections,
+                                                 timeout=pool_timeout, **redis_options())
+        self.async_pools: Dict[tuple, aioredis.BlockingConnectionPool] = {}
+        self._client = None
+        self._async_clients: Dict[tuple, aioredis.Redis] = {}
+
+    def client(self) -> redis.Redis:
+        """
+            The blocking client, shared by the services.
+
+            :return: The client.
+            :rtype: redis.Redis
+            """
+        if self._client is None:
+            self._client = instrument_redis(redis.Redis(connection_pool=self.pool))
+        return self._client
+
+    def async_client(self, decode_responses: bool = False, subscriptions: bool = False) -> aioredis.Redis:
+        """
+            An asyncio client, sharing its pool with the other clients of the same options.
+
+            :param decode_responses: Whether replies are decoded to str.
+            :type decode_responses: bool
+            :param subscriptions: For pub/sub, which waits for messages indefinitely: only
+                connecting is bounded.
+            :type subscriptions: bool
+            :return: The client.
+            :rtype: aioredis.Redis
+            """
+        key = (decode_responses, subscriptions)
+        client = self._async_clients.get(key)
+        if client is None:
+            options = {"encoding": "utf-8", "decode_responses": True} if decode_responses else {}
+            if subscriptions:
+                options["socket_connect_timeout"] = settings.redis_connect_timeout
+            else:
+                options.update(redis_options())
+            pool = aioredis.BlockingConnectionPool(host=self.host, port=self.port, db=self.db,
+                                                   max_connections=self.async_max_connections,
+                                                   timeout=self.pool_timeout, **options)
+            self.async_pools[key] = pool
+            client = self._async_clients[key] = instrument_redis(aioredis.Redis(connection_pool=pool))
+        return client
+
+    def pools(self) -> Iterable[tuple]:
+        """
+            The pools opened so far, as (name, pool).
+            """
+        yield "sync", self.pool
+        for (decode_responses, subscriptions), pool in list(self.async_pools.items()):
+            name = "async" + ("_decoded" if decode_responses else "")
+            yield name + ("_subscriptions" if subscriptions else ""), pool
+
+    def close(self) -> None:
+        """
+            Closes the connections of the blocking pool.
+            """
+        self.pool.disconnect()
+
+    async def aclose(self) -> None:
+        """
+            Closes the connections of every pool, on shutdown.
+            """
+        for pool in list(self.async_pools.values()):
+            await pool.disconnect()
+        self.close()
+
+
+redis_clients = RedisClients(settings.redis_host, settings.redis_port, 0, settings.redis_max_connections,
+                             settings.redis_async_max_connections, settings.redis_pool_timeout)
+
+
+def pool_metrics():
+    stats = [(name, pool.max_connections, *_pool_stats(pool)) for name, pool in redis_clients.pools()]
+    yield ("redis_pool_max_connections", "gauge", "Connections a Redis pool may open",
+           [({"pool": name}, maximum) for name, maximum, _, _ in stats])
+    yield ("redis_pool_connections", "gauge", "Open connections of a Redis pool by state",
+           [({"pool": name, "state": state}, value) for name, _, created, idle in stats
+            for state, value in (("in_use", created - idle), ("idle", idle))])
+
+
+metrics.collectors.append(pool_metrics)
@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+import redis
+from fastapi_limiter import FastAPILimiter, default_identifier, http_default_callback
+from fastapi_limiter.depends import RateLimiter
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.conf.config import settings
+from src.services import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+logger = logging.getLogger(__name__)
+
+# Returned by CircuitBreaker.call when the call was not made or failed, unless another fallback is given
+UNAVAILABLE = object()
+
+
+class CircuitBreaker:
+    """
+        Stops calling a dependency after ``failure_threshold`` consecutive failures. While open,
+        calls fail immediately; after ``reset_timeout`` seconds one trial call is let through and
+        its outcome closes the breaker again or keeps it open for another ``reset_timeout``.
+        Opening and closing again are logged, not the failures in between.
+        """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0,
+                 errors: Tuple[type, ...] = (Exception,), clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.errors = errors
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.counters = {"failures": 0, "opened": 0, "rejected": 0}
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+            Tells whether a call may be made now. A True answer while half-open reserves the trial
+            call, so its outcome must be reported with ``record_success`` or ``record_failure``.
+            """
+        with self._lock:
+            now = self.clock()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_at = None
+            if self.state == CLOSED:
+                return True
+            # A trial whose outcome was never reported is given up after reset_timeout
+            if self.state == HALF_OPEN and (self._trial_at is None or now - self._trial_at >= self.reset_timeout):
+                self._trial_at = now
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_at = None
+        if recovered:
+            logger.warning("%s circuit breaker closed: calls resumed", self.name)
+
+    def record_failure(self, err: BaseException | None = None) -> None:
+        with self._lock:
+            previous = self.state
+            self.failures += 1
+            self.counters["failures"] += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self._trial_at = None
+        if previous == CLOSED and self.state == OPEN:
+            logger.error("%s circuit breaker opened after %d consecutive failures: %s", self.name,
+                         self.failure_threshold, err)
+        elif previous == HALF_OPEN and self.state == OPEN:
+            logger.debug("%s circuit breaker trial call failed: %s", self.name, err)
+
+    def call(self, func: Callable, *args, fallback=UNAVAILABLE, **kwargs):
+        """
+            Calls ``func`` unless the breaker is open.
+
+            :param func: The call to the dependency.
+            :type func: Callable
+            :param fallback: The result when the call is not made or raises one of ``errors``.
+            :return: The result of the call, or ``fallback``.
+            """
+        if not self.allow():
+            return fallback
+        try:
+            result = func(*args, **kwargs)
+        except self.errors as err:
+            self.record_failure(err)
+            return fallback
+        self.record_success()
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_at = None
+
+
+class LocalCache:
+    """
+        A small in-process LRU cache with a time to live, used while the shared cache is unavailable.
+        """
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if self.clock() >= expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = (self.clock() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class LocalRateLimits:
+    """
+        Fixed windows counted in process memory, with the semantics of the fastapi-limiter script:
+        ``check`` returns 0 when the request is allowed, otherwise the milliseconds left in the window.
+        """
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def check(self, key: str, times: int, milliseconds: int) -> int:
+        now = self.clock()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now >= window[1]:
+                if len(self._windows) >= self.max_keys:
+                    self._windows = {k: w for k, w in self._windows.items() if now < w[1]}
+                self._windows[key] = [1, now + milliseconds / 1000]
+                return 0
+            if window[0] + 1 > times:
+                return max(1, int((window[1] - now) * 1000))
+            window[0] += 1
+            return 0
+
+
+class ResilientRateLimiter(RateLimiter):
+    """
+        fastapi-limiter's RateLimiter, counting in process memory while Redis is unavailable. The
+        local limit applies per worker process, so the effective limit is looser until Redis is back.
+        """
+    local = LocalRateLimits()
+
+    async def __call__(self, request: Request, response: Response):
+        if FastAPILimiter.redis is None:
+            # Startup could not reach Redis at all; count with the defaults of FastAPILimiter.init
+            identifier = self.identifier or FastAPILimiter.identifier or default_identifier
+            callback = self.callback or FastAPILimiter.http_callback or http_default_callback
+            pexpire = self.local.check(f"local:{await identifier(request)}:{request.scope['path']}",
+                                       self.times, self.milliseconds)
+            if pexpire != 0:
+                return await callback(request, response, pexpire)
+            return
+        return await super().__call__(request, response)
+
+    async def _check(self, key):
+        if not redis_breaker.allow():
+            return self.local.check(key, self.times, self.milliseconds)
+        try:
+            if FastAPILimiter.lua_sha is None:
+                FastAPILimiter.lua_sha = await FastAPILimiter.redis.script_load(FastAPILimiter.lua_script)
+            pexpire = await super()._check(key)
+        except redis.exceptions.NoScriptError:
+            # Redis answered; RateLimiter reloads the script and retries
+            redis_breaker.record_success()
+            raise
+        except redis.RedisError as err:
+            redis_breaker.record_failure(err)
+            return self.local.check(key, self.times, self.milliseconds)
+        redis_breaker.record_success()
+        return pexpire
+
+
+def redis_options() -> dict:
+    """
+        Connection options bounding how long a Redis call may block a request.
+        """
+    return {"socket_timeout": settings.redis_socket_timeout,
+            "socket_connect_timeout": settings.redis_connect_timeout}
+
+
+redis_breaker = CircuitBreaker("redis", settings.redis_breaker_failures, settings.redis_breaker_reset_seconds,
+                               errors=(redis.RedisError,))
+
+breakers = [redis_breaker]
+
+
+def breaker_metrics():
+    yield ("circuit_breaker_state", "gauge", "1 for the current state of the circuit breaker",
+           [({"name": breaker.name, "state": state}, int(breaker.state == state))
+            for breaker in breakers for state in STATES])
+    for counter in ("failures", "opened", "rejected"):
+        yield (f"circuit_breaker_{counter}_total", "counter", f"Circuit breaker {counter} count",
+               [({"name": breaker.name}, breaker.counters[counter]) for breaker in breakers])
+
+
+metrics.collectors.append(breaker_metrics)
@@ -0,0 +1,221 @@
+import hashlib
+import math
+import threading
+import time
+
+import redis
+
+from src.conf.config import settings
+from src.services.redis_clients import redis_clients
+from src.services.resilience import UNAVAILABLE, redis_breaker
+
+
+class BloomFilter:
+    """
+        A fixed-size Bloom filter over strings.
+
+        Membership tests may return false positives (bounded by ``error_rate`` while the filter
+        holds no more than ``capacity`` items) but never false negatives.
+        """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def issued_at_ms(payload: dict) -> int:
+    """
+        When a token was issued, in milliseconds: from the ``iat_ms`` claim, or for tokens issued
+        without it, the last millisecond of their ``iat`` second.
+        """
+    if "iat_ms" in payload:
+        return int(payload["iat_ms"])
+    return int(payload.get("iat", 0)) * 1000 + 999
+
+
+def _cutoff_ms(value) -> int:
+    # Cut-offs stored before they were kept in milliseconds are in seconds
+    value = int(value)
+    return value if value >= 10 ** 12 else value * 1000 + 999
+
+
+class TokenRevocation:
+    """
+        Revoked access tokens live in Redis; each worker mirrors the revoked ``jti`` values into a
+        Bloom filter (and the per-user "revoke all sessions" marks into a dict), kept current through
+        Redis pub/sub, so the common not-revoked case is answered without a network call.
+        """
+    channel = "auth:revocations"
+    jti_prefix = "revoked:jti:"
+    user_prefix = "revoked:user:"
+
+    def __init__(self, r: redis.Redis, capacity: int = 100_000, error_rate: float = 0.001,
+                 rebuild_seconds: int = 300, token_lifetime: int = 900):
+        self.r = r
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self.token_lifetime = token_lifetime
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._revoked_before: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def revoke_token(self, jti: str, expires_at: int) -> bool:
+        """
+            Revokes a single access token until its expiry.
+
+            :param jti: The token ID.
+            :type jti: str
+            :param expires_at: The token ``exp`` claim.
+            :type expires_at: int
+            :return: False when Redis is unavailable and nothing was revoked.
+            :rtype: bool
+            """
+        ttl = max(1, int(expires_at - time.time()))
+        pipe = self.r.pipeline()
+        pipe.set(f"{self.jti_prefix}{jti}", 1, ex=ttl)
+        pipe.publish(self.channel, f"jti:{jti}")
+        if redis_breaker.call(pipe.execute) is UNAVAILABLE:
+            return False
+        with self._lock:
+            self._bloom.add(jti)
+        return True
+
+    def revoke_all(self, email: str) -> bool:
+        """
+            Revokes every access token issued to the user up to now.
+
+            :param email: User's email.
+            :type email: str
+            :return: False when Redis is unavailable and nothing was revoked.
+            :rtype: bool
+            """
+        # In milliseconds, so that a token issued right after, in the same second, stays valid
+        issued_before = now_ms()
+        pipe = self.r.pipeline()
+        pipe.set(f"{self.user_prefix}{email}", issued_before, ex=self.token_lifetime)
+        pipe.publish(self.channel, f"user:{issued_before}:{email}")
+        if redis_breaker.call(pipe.execute) is UNAVAILABLE:
+            return False
+        with self._lock:
+            self._revoked_before[email] = issued_before
+        return True
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+            Checks a decoded access token against the revocation list.
+
+            :param payload: The decoded token claims.
+            :type payload: dict
+            :return: True if the token was revoked.
+            :rtype: bool
+            """
+        issued_before = self._revoked_before.get(payload.get("sub"))
+        if issued_before is not None and issued_at_ms(payload) <= issued_before:
+            return True
+        jti = payload.get("jti")
+        if jti is None or jti not in self._bloom:
+            return False
+        # Possibly revoked and Redis cannot tell: refuse the token
+        return bool(redis_breaker.call(self.r.exists, f"{self.jti_prefix}{jti}", fallback=True))
+
+    def rebuild(self) -> None:
+        """
+            Reloads the local mirror from Redis, dropping entries that have expired there.
+            """
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for key in self.r.scan_iter(match=f"{self.jti_prefix}*", count=1000):
+            key = key.decode() if isinstance(key, bytes) else key
+            bloom.add(key[len(self.jti_prefix):])
+        revoked_before = {}
+        keys = list(self.r.scan_iter(match=f"{self.user_prefix}*", count=1000))
+        # One round trip per thousand users instead of one per user
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            for key, value in zip(chunk, self.r.mget(chunk)):
+                if value is not None:
+                    key = key.decode() if isinstance(key, bytes) else key
+                    revoked_before[key[len(self.user_prefix):]] = _cutoff_ms(value)
+        with self._lock:
+            self._bloom = bloom
+            self._revoked_before = revoked_before
+
+    def _handle(self, data) -> None:
+        data = data.decode() if isinstance(data, bytes) else data
+        kind, _, value = data.partition(":")
+        with self._lock:
+            if kind == "jti":
+                self._bloom.add(value)
+            elif kind == "user":
+                issued_before, _, email = value.partition(":")
+                self._revoked_before[email] = _cutoff_ms(issued_before)
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed is picked up by the rebuild.
+                self.rebuild()
+                rebuilt_at = time.monotonic()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._handle(message["data"])
+                    if time.monotonic() - rebuilt_at > self.rebuild_seconds:
+                        self.rebuild()
+                        rebuilt_at = time.monotonic()
+                pubsub.close()
+            except redis.RedisError as err:
+                print(err)
+                self._stop.wait(1.0)
+
+    def start(self) -> None:
+        """
+            Starts the background pub/sub listener for this worker.
+            """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, name="token-revocation", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+            Stops the background pub/sub listener.
+            """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+revocation = TokenRevocation(
+    redis_clients.client(),
+    capacity=settings.revocation_bloom_capacity,
+    error_rate=settings.revocation_bloom_error_rate,
+    rebuild_seconds=settings.revocation_rebuild_seconds,
+    token_lifetime=settings.access_token_expire_minutes * 60,
+)
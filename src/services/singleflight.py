@@ -0,0 +1,164 @@
+import asyncio
+import math
+import random
+import time
+from typing import Awaitable, Callable, Dict
+from uuid import uuid4
+
+from src.conf.config import settings
+from src.services import metrics
+from src.services.redis_clients import redis_clients
+from src.services.resilience import redis_breaker
+
+# Deletes a lock only if it is still the one taken, in case it expired and another worker took it
+UNLOCK_SCRIPT = redis_clients.client().register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+OUTCOMES = ("loaded", "coalesced", "filled_elsewhere")
+
+
+def refresh_early(ttl: float, delta: float, beta: float = 1.0, rand: Callable[[], float] = random.random) -> bool:
+    """
+        Probabilistic early expiration (XFetch): tells a reader to reload a cache entry before it
+        expires, with a probability rising as the expiry nears, so that one reader reloads it ahead
+        of time instead of every reader at once after.
+
+        :param ttl: Seconds the entry has left, negative when it does not expire.
+        :type ttl: float
+        :param delta: Seconds a reload takes.
+        :type delta: float
+        :param beta: Above 1 favours earlier reloads.
+        :type beta: float
+        :return: Whether to reload the entry now.
+        :rtype: bool
+        """
+    if ttl < 0:
+        return False
+    return delta * beta * -math.log(1.0 - rand()) >= ttl
+
+
+class SingleFlight:
+    """
+        Coalesces concurrent loads of the same key: the first caller runs the loader and the others
+        wait for its result. With a Redis client, the caller loading in each worker also takes a
+        lock for ``lock_ttl`` seconds, so that only one worker loads; the others wait up to
+        ``lock_wait`` seconds for it to fill the cache, read through ``recheck``. ``load_time``
+        follows how long the loader takes, for refresh_early.
+        """
+
+    def __init__(self, name: str, r=None, lock_ttl: float = 5.0, lock_wait: float = 1.0,
+                 poll_interval: float = 0.02):
+        self.name = name
+        self.r = r
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.poll_interval = poll_interval
+        self.load_time = 0.0
+        self.counters = {outcome: 0 for outcome in OUTCOMES}
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, loader: Callable[[], Awaitable], recheck: Callable[[], object] | None = None):
+        """
+            Returns the result of ``loader``, run once for all the concurrent callers of ``key``.
+
+            :param key: The cache key.
+            :type key: str
+            :param loader: Loads the value, and caches it for ``recheck`` to find.
+            :type loader: Callable[[], Awaitable]
+            :param recheck: Reads the cached value, or None when it is missing; needed for the lock.
+            :type recheck: Callable[[], object] | None
+            :return: The value.
+            """
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only the request that was loading went away: take over the load
+                if not future.cancelled():
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await self._load(key, loader, recheck)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as err:
+            future.set_exception(err)
+            # Retrieved, so that it is not reported when nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable], recheck: Callable[[], object] | None):
+        if self.r is None or recheck is None:
+            return await self._timed(loader)
+        lock = f"singleflight:{self.name}:{key}"
+        token = uuid4().hex
+        # Redis unavailable: load here rather than wait for a lock nobody can take
+        acquired = redis_breaker.call(self.r.set, lock, token, nx=True, px=int(self.lock_ttl * 1000), fallback=True)
+        if not acquired:
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                result = recheck()
+                if result is not None:
+                    self.counters["filled_elsewhere"] += 1
+                    return result
+                if not redis_breaker.call(self.r.exists, lock, fallback=0):
+                    break
+        try:
+            return await self._timed(loader)
+        finally:
+            if acquired:
+                redis_breaker.call(UNLOCK_SCRIPT, keys=[lock], args=[token], client=self.r)
+
+    async def _timed(self, loader: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        result = await loader()
+        elapsed = time.perf_counter() - started
+        self.load_time = elapsed if self.counters["loaded"] == 0 else 0.8 * self.load_time + 0.2 * elapsed
+        self.counters["loaded"] += 1
+        return result
+
+
+flights = []
+
+
+def flight(name: str) -> SingleFlight:
+    """
+        A SingleFlight configured from the settings, locking across workers when
+        ``singleflight_redis_lock`` is set.
+
+        :param name: The name of the cache, in the lock keys and the metrics.
+        :type name: str
+        :return: The SingleFlight.
+        :rtype: SingleFlight
+        """
+    r = redis_clients.client() if settings.singleflight_redis_lock else None
+    item = SingleFlight(name, r, settings.singleflight_lock_ttl, settings.singleflight_lock_wait)
+    flights.append(item)
+    return item
+
+
+def singleflight_metrics():
+    yield ("singleflight_calls_total", "counter", "Cache miss loads by outcome",
+           [({"name": item.name, "outcome": outcome}, item.counters[outcome]) for item in flights
+            for outcome in OUTCOMES])
+    yield ("singleflight_load_seconds", "gauge", "Moving average of the load time",
+           [({"name": item.name}, round(item.load_time, 6)) for item in flights])
+
+
+metrics.collectors.append(singleflight_metrics)
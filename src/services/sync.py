@@ -0,0 +1,35 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_sync_token(updated_at: datetime, contact_id: int) -> str:
+    """
+        Encodes a delta-sync position as an opaque token.
+
+        :param updated_at: The updated_at of the last change returned.
+        :type updated_at: datetime
+        :param contact_id: The id of the last change returned.
+        :type contact_id: int
+        :return: Token
+        :rtype: str
+        """
+    return base64.urlsafe_b64encode(f"{updated_at.isoformat()}|{contact_id}".encode()).decode()
+
+
+def decode_sync_token(token: str) -> Tuple[datetime, int]:
+    """
+        Decodes a token produced by encode_sync_token.
+
+        :param token: Token
+        :type token: str
+        :return: The (updated_at, id) position.
+        :rtype: Tuple[datetime, int]
+        :raises ValueError: If the token is malformed.
+        """
+    try:
+        updated_at, _, contact_id = base64.urlsafe_b64decode(token.encode()).decode().partition("|")
+        return datetime.fromisoformat(updated_at), int(contact_id)
+    except (binascii.Error, UnicodeDecodeError) as err:
+        raise ValueError(str(err))
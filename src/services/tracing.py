@@ -0,0 +1,459 @@
+import contextvars
+import functools
+import inspect
+import json
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Trace:
+    """
+        The spans of one request. Spans are only recorded when the trace is recorded, which is
+        decided when it starts (sampling, or a slow request threshold).
+        """
+
+    def __init__(self, trace_id: str, sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.recording = recording
+        self.spans: List["Span"] = []
+
+
+class Span:
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None, kind: int = KIND_INTERNAL,
+                 attributes: dict | None = None, span_id: str | None = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = span_id or random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_error(self, err: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.attributes["exception.type"] = type(err).__name__
+        self.attributes["exception.message"] = str(err)[:500]
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.trace.recording:
+                self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+_current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes) -> Span | None:
+    """
+        Starts a child of the current span; end it with ``Span.end``. Nothing is started outside a
+        recorded trace.
+
+        :param name: The span name.
+        :type name: str
+        :param kind: One of the KIND_* constants.
+        :type kind: int
+        :return: The span, or None.
+        :rtype: Span | None
+        """
+    parent = _current.get()
+    if parent is None or not parent.trace.recording:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """
+        Runs the block in a child span of the current span.
+        """
+    child = start_span(name, kind, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as err:
+        child.set_error(err)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def traced(name: str, kind: int = KIND_INTERNAL):
+    """
+        Decorates a function, sync or async, to run in a span.
+        """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def instrument_module(module, prefix: str) -> None:
+    """
+        Runs every public coroutine function defined in a module in a span named ``prefix.name``.
+        Call at the end of the module.
+        """
+    for name, func in list(vars(module).items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(func) and func.__module__ == module.__name__:
+            setattr(module, name, traced(f"{prefix}.{name}")(func))
+
+
+def instrument_redis(client):
+    """
+        Records a client span for every command sent by a Redis client (sync or asyncio).
+
+        :param client: The Redis client.
+        :return: The client.
+        """
+    execute_command = client.execute_command
+    if inspect.iscoroutinefunction(execute_command):
+        async def traced_execute_command(*args, **options):
+            with span(f"redis {args[0]}", KIND_CLIENT, **{"db.system": "redis"}):
+                return await execute_command(*args, **options)
+    else:
+        def traced_execute_command(*args, **options):
+            with span(f"redis {args[0]}", KIND_CLIENT, **{"db.system": "redis"}):
+                return execute_command(*args, **options)
+    client.execute_command = traced_execute_command
+    if hasattr(client, "pipeline"):
+        client.pipeline = _traced_pipeline(client.pipeline)
+    return client
+
+
+def _traced_pipeline(pipeline):
+    # Pipelines send their commands on their own, so the whole batch is one span
+    def traced_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+        if inspect.iscoroutinefunction(execute):
+            async def traced_execute(*execute_args, **options):
+                with span("redis PIPELINE", KIND_CLIENT, **{"db.system": "redis", "db.redis.commands": len(pipe)}):
+                    return await execute(*execute_args, **options)
+        else:
+            def traced_execute(*execute_args, **options):
+                with span("redis PIPELINE", KIND_CLIENT, **{"db.system": "redis", "db.redis.commands": len(pipe)}):
+                    return execute(*execute_args, **options)
+        pipe.execute = traced_execute
+        return pipe
+    return traced_pipeline
+
+
+def instrument_engine(engine) -> None:
+    """
+        Records a client span for every statement an SQLAlchemy engine executes.
+        """
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        query = start_span(f"db {statement.split(None, 1)[0].upper()}" if statement else "db", KIND_CLIENT,
+                           **{"db.system": engine.dialect.name, "db.statement": statement[:1000]})
+        conn.info.setdefault("trace_spans", []).append(query)
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        query = conn.info["trace_spans"].pop()
+        if query is not None:
+            query.end()
+
+    def error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            query = spans.pop()
+            if query is not None:
+                query.set_error(context.original_exception)
+                query.end()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", error)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def otlp_json(spans: List[Span], service_name: str) -> dict:
+    """
+        Encodes spans as an OTLP/JSON ExportTraceServiceRequest, as accepted by the OpenTelemetry
+        Collector on ``/v1/traces`` and by its ``otlpjsonfile`` receiver (one request per line).
+
+        :param spans: Finished spans.
+        :type spans: List[Span]
+        :param service_name: The ``service.name`` resource attribute.
+        :type service_name: str
+        :return: The request body.
+        :rtype: dict
+        """
+    encoded = []
+    for item in spans:
+        data = {"traceId": item.trace.trace_id, "spanId": item.span_id, "name": item.name, "kind": item.kind,
+                "startTimeUnixNano": str(item.start_ns), "endTimeUnixNano": str(item.end_ns),
+                "attributes": [_attribute(key, value) for key, value in item.attributes.items()],
+                "status": {"code": item.status}}
+        if item.parent_id:
+            data["parentSpanId"] = item.parent_id
+        encoded.append(data)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", service_name)]},
+        "scopeSpans": [{"scope": {"name": "src.services.tracing"}, "spans": encoded}],
+    }]}
+
+
+class FileExporter:
+    """
+        Appends every trace to a file as one line of OTLP/JSON, from a background thread so that
+        requests never wait for the disk, dropping traces when the queue is full.
+        """
+
+    def __init__(self, path: str, service_name: str, batch_size: int = 100, max_queue: int = 10000):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-file-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            traces = [self._queue.get()]
+            while len(traces) < self.batch_size and not self._queue.empty():
+                traces.append(self._queue.get_nowait())
+            try:
+                self.write(traces)
+            except OSError as err:
+                print(err)
+            finally:
+                for _ in traces:
+                    self._queue.task_done()
+
+    def write(self, traces: List[List[Span]]) -> None:
+        lines = "".join(json.dumps(otlp_json(spans, self.service_name), separators=(",", ":")) + "\n"
+                        for spans in traces)
+        with open(self.path, "a") as file:
+            file.write(lines)
+
+    def flush(self) -> None:
+        """
+            Waits until the queued traces are written.
+            """
+        self._queue.join()
+
+
+class OTLPHttpExporter:
+    """
+        Posts traces in OTLP/JSON to a collector from a background thread, in batches, dropping
+        traces when the queue is full rather than slowing requests down.
+        """
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = 100, max_queue: int = 10000,
+                 timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+
+    def export(self, spans: List[Span]) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = list(self._queue.get())
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.extend(self._queue.get_nowait())
+            self.send(batch)
+
+    def send(self, spans: List[Span]) -> None:
+        body = json.dumps(otlp_json(spans, self.service_name)).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as err:
+            print(err)
+
+
+class Tracer:
+    """
+        Starts the traces of requests: a trace continues the one of an incoming ``traceparent``
+        header and follows its sampling decision, otherwise ``sample_rate`` of the traces are
+        sampled. With ``slow_ms`` every trace is recorded and the unsampled ones are exported
+        only if the request took longer.
+        """
+
+    def __init__(self, sample_rate: float = 0.0, exporters: List | None = None, slow_ms: float | None = None):
+        self.sample_rate = sample_rate
+        self.exporters = exporters or []
+        self.slow_ms = slow_ms
+
+    def start(self, name: str, traceparent: str | None = None, **attributes) -> Span:
+        match = TRACEPARENT.match(traceparent or "")
+        if match and match.group(1) != "0" * 32:
+            trace_id, parent_id, sampled = match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+        else:
+            trace_id, parent_id = random.getrandbits(128).to_bytes(16, "big").hex(), None
+            sampled = random.random() < self.sample_rate
+        recording = bool(self.exporters) and (sampled or self.slow_ms is not None)
+        return Span(Trace(trace_id, sampled, recording), name, parent_id, KIND_SERVER, attributes)
+
+    def flush(self) -> None:
+        """
+            Writes out the traces queued by the exporters that buffer them, on shutdown.
+            """
+        for exporter in self.exporters:
+            if hasattr(exporter, "flush"):
+                exporter.flush()
+
+    def finish(self, root: Span) -> None:
+        """
+            Exports a trace once all its spans, including those of background tasks, have ended.
+            """
+        trace = root.trace
+        if not trace.recording or not (trace.sampled or root.duration_ms >= self.slow_ms):
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace.spans)
+            except OSError as err:
+                print(err)
+
+
+class TracingMiddleware:
+    """
+        Runs every HTTP request in a trace and sends its ids back in ``X-Trace-Id`` and
+        ``traceresponse`` (W3C Trace Context).
+        """
+
+    def __init__(self, app: ASGIApp, tracer: "Tracer"):
+        self.app = app
+        self.tracer = tracer
+        self._routes: Dict[Callable, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return scope["path"]
+        if endpoint not in self._routes:
+            paths = [route.path_format for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint]
+            self._routes[endpoint] = paths[0] if paths else scope["path"]
+        return self._routes[endpoint]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+        root = self.tracer.start(f"{scope['method']} {scope['path']}", traceparent,
+                                 **{"http.method": scope["method"], "http.target": scope["path"]})
+
+        async def send_with_trace(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    root.status = STATUS_ERROR
+                headers = MutableHeaders(scope=message)
+                headers["X-Trace-Id"] = root.trace.trace_id
+                headers["traceresponse"] = f"00-{root.trace.trace_id}-{root.span_id}-{'01' if root.trace.sampled else '00'}"
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # The response is complete; background tasks may still add spans
+                root.end()
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as err:
+            root.set_error(err)
+            raise
+        finally:
+            _current.reset(token)
+            route = self._route(scope)
+            root.name = f"{scope['method']} {route}"
+            root.attributes["http.route"] = route
+            root.end()
+            self.tracer.finish(root)
+
+
+def _exporters() -> list:
+    exporters = []
+    if settings.tracing_file:
+        exporters.append(FileExporter(settings.tracing_file, settings.tracing_service_name))
+    if settings.tracing_otlp_endpoint:
+        exporters.append(OTLPHttpExporter(settings.tracing_otlp_endpoint, settings.tracing_service_name))
+    return exporters
+
+
+tracer = Tracer(settings.tracing_sample_rate, _exporters(), settings.tracing_slow_request_ms)
@@ -4,7 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from main import app
-from src.database.models import Base
+from src.database.models import Base, User
 from src.database.db import get_db
 
 
@@ -47,4 +47,27 @@ def client(session):
 
 @pytest.fixture(scope="module")
 def user():
-    return {"username": "Example", "email": "example@exmpl.com", "password": "qwerty"}
\ No newline at end of file
+    return {"username": "Example", "email": "example@exmpl.com", "password": "qwerty"}
+
+
+@pytest.fixture
+def memory_session(request):
+    """
+        A session on a fresh in-memory database holding one user. On a unittest class marked
+        ``@pytest.mark.usefixtures("memory_session")`` it is set as ``self.session``, with the
+        user as ``self.user``, before ``setUp`` runs.
+        """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    user = User(username="Example", email="example@exmpl.com", password="qwerty")
+    db.add(user)
+    db.commit()
+    if request.instance is not None:
+        request.instance.session = db
+        request.instance.user = user
+    try:
+        yield db
+    finally:
+        db.close()
+        engine.dispose()
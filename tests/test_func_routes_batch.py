@@ -0,0 +1,81 @@
+import pytest
+
+from main import app
+from src.database.models import Contact, ContactStat, User
+from src.services.auth import auth_service
+
+
+@pytest.fixture(scope="module")
+def batch_user(client, session):
+    user = User(username="Batcher", email="batch@exmpl.com", password="qwerty", confirmed=True)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    # The route commits and closes the module session; the user must stay loaded
+    session.expunge(user)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    yield user
+    del app.dependency_overrides[auth_service.get_current_user]
+
+
+def contact(number, **extra):
+    return {"name": f"Name{number}", "surname": "Surname", "email": f"contact{number}@example.com",
+            "phone": f"+38050{number:07}", "born_date": "1990-01-01T00:00:00", **extra}
+
+
+def contacts_of(session, user):
+    session.expire_all()
+    return {row.id: row.name for row in session.query(Contact).filter(Contact.user_id == user.id,
+                                                                      Contact.deleted_at.is_(None))}
+
+
+def test_batch_create(client, session, batch_user):
+    response = client.post("/api/batch", json={"operations": [{"op": "create", "data": contact(1)},
+                                                              {"op": "create", "data": contact(2)}]})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["committed"] is True
+    assert [result["status"] for result in data["results"]] == [201, 201]
+    assert sorted(contacts_of(session, batch_user).values()) == ["Name1", "Name2"]
+
+
+def test_batch_atomic_rolls_back(client, session, batch_user):
+    before = contacts_of(session, batch_user)
+    first = min(before)
+    response = client.post("/api/batch", json={"operations": [
+        {"op": "update", "id": first, "data": contact(10, done=False)},
+        {"op": "create", "data": contact(2)},
+        {"op": "delete", "id": first},
+    ]})
+    assert response.status_code == 409, response.text
+    data = response.json()
+    assert data["committed"] is False
+    assert [(result["status"], result["detail"]) for result in data["results"]] == [
+        (424, "Rolled back"), (409, "Contact with this email or phone already exists"), (424, "Not executed")]
+    assert contacts_of(session, batch_user) == before
+
+
+def test_batch_per_operation(client, session, batch_user):
+    first, second = sorted(contacts_of(session, batch_user))
+    response = client.post("/api/batch", json={"atomic": False, "operations": [
+        {"op": "update", "id": first, "data": contact(10, done=False)},
+        {"op": "create", "data": contact(2)},
+        {"op": "delete", "id": second},
+        {"op": "delete", "id": 10 ** 6},
+        {"op": "create", "data": contact(3)},
+    ]})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["committed"] is True
+    assert [result["status"] for result in data["results"]] == [200, 409, 200, 404, 201]
+    assert sorted(contacts_of(session, batch_user).values()) == ["Name10", "Name3"]
+    total = session.query(ContactStat).filter(ContactStat.user_id == batch_user.id, ContactStat.kind == "total").one()
+    assert total.count == 2
+
+
+def test_batch_limits(client, batch_user, monkeypatch):
+    monkeypatch.setattr("src.routes.batch.settings.batch_max_operations", 1)
+    response = client.post("/api/batch", json={"operations": [{"op": "delete", "id": 1}, {"op": "delete", "id": 2}]})
+    assert response.status_code == 422, response.text
+    response = client.post("/api/batch", json={"operations": [{"op": "rename", "id": 1}]})
+    assert response.status_code == 422, response.text
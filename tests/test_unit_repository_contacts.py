@@ -1,18 +1,26 @@
 import unittest
+from datetime import datetime
 from unittest.mock import MagicMock
 
+import pytest
 from sqlalchemy.orm import Session
 
-from src.database.models import Contact, User
+from src.database.models import Contact, ContactStat, User
 from src.schemas import ContactBase, ContactUpdate, ContactResponse
 from src.repository.contacts import (
     show_contacts,
     get_contact,
+    get_contacts_by_ids,
     create_contact,
     remove_contact,
     update_contact,
     search_contacts,
+    count_search_contacts,
     upcoming_birthday,
+    contact_changes,
+    find_duplicates,
+    merge_contacts,
+    patch_contact,
 )
 
 
@@ -39,6 +47,12 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
+    async def test_get_contacts_by_ids(self):
+        contacts = [Contact(id=1), Contact(id=3)]
+        self.session.query().filter().all.return_value = contacts
+        result = await get_contacts_by_ids(contact_ids=[1, 2, 3], user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+
     async def test_create_contact(self):
         body = ContactBase(name="test", surname="test surname", email="testemail@email.com", phone="+421123456789", born_date="2023-04-26T09:31:02.618Z")
         result = await create_contact(body=body, user=self.user, db=self.session)
@@ -54,6 +68,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.session.query().filter().first.return_value = contact
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.assertIsNotNone(result.deleted_at)
 
     async def test_remove_contact_not_found(self):
         self.session.query().filter().first.return_value = None
@@ -85,6 +100,16 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await search_contacts(credentials="test", user=self.user, db=self.session)
         self.assertNotEqual(result.name, body.name)
 
+    async def test_count_search_contacts(self):
+        self.session.query().select_from().scalar.return_value = 7
+        result = await count_search_contacts(credentials="test", user=self.user, db=self.session, cap=1000)
+        self.assertEqual(result, 7)
+
+    async def test_count_search_contacts_not_found(self):
+        self.session.query().select_from().scalar.return_value = 0
+        result = await count_search_contacts(credentials="test", user=self.user, db=self.session, cap=1000)
+        self.assertEqual(result, 0)
+
     async def test_upcoming_birthday(self):
 
         body = ContactBase(name="test", surname="test surname", email="testemail@email.com", phone="+421123456789",
@@ -93,5 +118,77 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await upcoming_birthday(user=self.user, db=self.session)
         self.assertIsNotNone(result)
 
+    async def test_contact_changes(self):
+        contacts = [Contact(id=1), Contact(id=2)]
+        self.session.query().filter().order_by().limit().all.return_value = contacts
+        result = await contact_changes(since=(datetime(2023, 4, 26), 1), limit=10, user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+
+    async def test_create_contact_normalized(self):
+        body = ContactBase(name="test", surname="test surname", email="TestEmail@email.com", phone="+421 123 456 789", born_date="2023-04-26T09:31:02.618Z")
+        result = await create_contact(body=body, user=self.user, db=self.session)
+        self.assertEqual(result.email_normalized, "testemail@email.com")
+        self.assertEqual(result.phone_normalized, "421123456789")
+
+    async def test_find_duplicates(self):
+        rows = [(1, "test", "test", "a@email.com", "+421123456789"), (2, "other", "other", "A@email.com", "+421000000000")]
+        self.session.query().filter().order_by().yield_per.return_value = rows
+        result = await find_duplicates(user=self.user, db=self.session)
+        self.assertEqual(result, [{"contact_ids": [1, 2], "reasons": ["email"]}])
+
+    async def test_merge_contacts(self):
+        contact = Contact(id=1, name="test", surname="test", email=None, phone="+421123456789")
+        duplicate = Contact(id=2, name="test", surname="test", email="a@email.com", phone="+421123456789")
+        self.session.query().filter().all.return_value = [contact, duplicate]
+        result = await merge_contacts(contact_id=1, duplicate_id=2, user=self.user, db=self.session)
+        self.assertEqual(result.email, "a@email.com")
+        self.assertIsNotNone(duplicate.deleted_at)
+
+    async def test_merge_contacts_not_found(self):
+        self.session.query().filter().all.return_value = [Contact(id=1)]
+        result = await merge_contacts(contact_id=1, duplicate_id=2, user=self.user, db=self.session)
+        self.assertIsNone(result)
+
+
+@pytest.mark.usefixtures("memory_session")
+class TestPatchContact(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        body = ContactBase(name="test", surname="test surname", email="test@email.com", phone="+421123456789",
+                           born_date="1990-04-26T09:31:02")
+        self.contact = await create_contact(body=body, user=self.user, db=self.session)
+
+    def stats(self):
+        return {(stat.kind, stat.key): stat.count for stat in self.session.query(ContactStat) if stat.count}
+
+    async def test_patch_changes_only_given_fields(self):
+        result = await patch_contact(self.contact.id, {"name": "patched", "phone": "+421 000 111 222"}, self.user,
+                                     self.session, versions=[1])
+        self.assertEqual((result.name, result.surname, result.version), ("patched", "test surname", 2))
+        self.assertEqual(result.phone_normalized, "421000111222")
+        self.session.expire_all()
+        self.assertEqual(self.session.get(Contact, self.contact.id).name, "patched")
+
+    async def test_patch_version_mismatch(self):
+        await patch_contact(self.contact.id, {"name": "first"}, self.user, self.session, versions=[1])
+        result = await patch_contact(self.contact.id, {"name": "second"}, self.user, self.session, versions=[1])
+        self.assertIsNone(result)
+        self.session.expire_all()
+        self.assertEqual(self.session.get(Contact, self.contact.id).name, "first")
+
+    async def test_patch_moves_stats(self):
+        await patch_contact(self.contact.id, {"email": "Test@Other.org", "born_date": datetime(1990, 7, 1)}, self.user,
+                            self.session)
+        stats = self.stats()
+        self.assertEqual(stats[("email_domain", "other.org")], 1)
+        self.assertEqual(stats[("birth_month", "07")], 1)
+        self.assertNotIn(("email_domain", "email.com"), stats)
+        self.assertNotIn(("birth_month", "04"), stats)
+
+    async def test_patch_other_user(self):
+        result = await patch_contact(self.contact.id, {"name": "x"}, User(id=self.user.id + 1), self.session)
+        self.assertIsNone(result)
+
+
 if __name__ == '__main__':
     unittest.main()
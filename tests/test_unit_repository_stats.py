@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import Session
+
+from src.database.models import ContactStat, User
+from src.repository.stats import stat_keys, record_contact_stats, get_contact_stats, get_contacts_total
+
+
+class TestStats(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.user = User(id=1)
+
+    def test_stat_keys(self):
+        result = stat_keys(datetime(2023, 4, 26), datetime(1990, 5, 1), "Test@Email.com")
+        self.assertEqual(result, [("total", ""), ("added", "2023-04"), ("birth_month", "05"),
+                                  ("email_domain", "email.com")])
+
+    def test_stat_keys_without_created_at(self):
+        result = stat_keys(None, None, None)
+        self.assertEqual(result, [("total", "")])
+
+    def test_record_contact_stats(self):
+        record_contact_stats(self.session, 1, added=[("total", ""), ("birth_month", "05")],
+                             removed=[("total", ""), ("birth_month", "04")])
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual(statement.table, ContactStat.__table__)
+
+    def test_record_contact_stats_no_change(self):
+        record_contact_stats(self.session, 1, added=[("total", "")], removed=[("total", "")])
+        self.session.execute.assert_not_called()
+
+    async def test_get_contact_stats(self):
+        self.session.query().filter().all.return_value = [("total", "", 3), ("email_domain", "email.com", 2)]
+        result = await get_contact_stats(user=self.user, db=self.session)
+        self.assertEqual(result["total"], {"": 3})
+        self.assertEqual(result["email_domain"], {"email.com": 2})
+        self.assertEqual(result["added"], {})
+
+    async def test_get_contacts_total(self):
+        self.session.query().filter().scalar.return_value = 3
+        result = await get_contacts_total(user=self.user, db=self.session)
+        self.assertEqual(result, 3)
+
+    async def test_get_contacts_total_no_contacts(self):
+        self.session.query().filter().scalar.return_value = None
+        result = await get_contacts_total(user=self.user, db=self.session)
+        self.assertEqual(result, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
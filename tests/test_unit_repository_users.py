@@ -1,13 +1,17 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+import pytest
 from sqlalchemy.orm import Session
 from libgravatar import Gravatar
 from src.database.models import User
 from src.schemas import UserModel
 from src.repository.users import (get_user_by_email,
+                                  get_existing_emails,
                                   create_user,
-                                  update_avatar)
+                                  create_users,
+                                  update_avatar,
+                                  update_token)
 
 class TestUsers(unittest.IsolatedAsyncioTestCase):
 
@@ -36,5 +40,46 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         result = await update_avatar(email="example@exmpl.com", url=avatar_link, db=self.session)
         self.assertEqual(result.avatar, avatar_link)
 
+
+@pytest.mark.usefixtures("memory_session")
+class TestConnectionRelease(unittest.IsolatedAsyncioTestCase):
+
+    async def test_read_releases_connection(self):
+        user = await get_user_by_email("example@exmpl.com", self.session)
+        self.assertFalse(self.session.in_transaction())
+        self.assertEqual(user.username, "Example")
+        await update_token(user, "token", self.session)
+        self.session.expire_all()
+        self.assertEqual(self.session.query(User).one().refresh_token, "token")
+
+    async def test_read_keeps_pending_writes(self):
+        self.session.add(User(username="Other", email="other@exmpl.com", password="qwerty"))
+        self.session.flush()
+        await get_user_by_email("example@exmpl.com", self.session)
+        self.assertTrue(self.session.in_transaction())
+        self.session.rollback()
+        self.assertIsNone(await get_user_by_email("other@exmpl.com", self.session))
+
+
+@pytest.mark.usefixtures("memory_session")
+class TestBulkCreate(unittest.IsolatedAsyncioTestCase):
+
+    async def test_get_existing_emails(self):
+        result = await get_existing_emails(["other@exmpl.com", "example@exmpl.com"], self.session)
+        self.assertEqual(result, {"example@exmpl.com"})
+
+    async def test_create_users_skips_registered(self):
+        users = [{"username": f"User{i}", "email": f"user{i}@exmpl.com", "password": "hash"} for i in range(3)]
+        users.append({"username": "Again", "email": "example@exmpl.com", "password": "hash"})
+        with patch("src.repository.users.settings.users_bulk_batch_size", 2):
+            created = await create_users(users, self.session)
+        self.assertEqual(set(created), {"user0@exmpl.com", "user1@exmpl.com", "user2@exmpl.com"})
+        self.assertEqual(self.session.query(User).count(), 4)
+        user = self.session.get(User, created["user1@exmpl.com"])
+        self.assertEqual((user.username, user.confirmed, user.is_admin), ("User1", False, False))
+        self.assertTrue(user.avatar)
+        self.assertEqual(self.session.query(User).filter_by(email="example@exmpl.com").one().username, "Example")
+
+
 if __name__ == '__main__':
     unittest.main()
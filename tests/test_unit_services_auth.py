@@ -0,0 +1,33 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+
+from src.database.models import User
+from src.services.auth import Auth
+
+
+class TestAuth(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+
+    async def test_get_password_hashes(self):
+        with patch.object(self.auth.pwd_context, "hash", lambda password: f"hash:{password}"):
+            result = await self.auth.get_password_hashes(["one", "two", "three"])
+        self.assertEqual(result, ["hash:one", "hash:two", "hash:three"])
+
+    async def test_get_current_admin(self):
+        admin = User(id=1, email="admin@exmpl.com", is_admin=True)
+        self.auth.get_current_user = AsyncMock(return_value=admin)
+        self.assertIs(await self.auth.get_current_admin("token", None), admin)
+
+    async def test_get_current_admin_forbidden(self):
+        self.auth.get_current_user = AsyncMock(return_value=User(id=2, email="user@exmpl.com", is_admin=False))
+        with self.assertRaises(HTTPException) as context:
+            await self.auth.get_current_admin("token", None)
+        self.assertEqual(context.exception.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from src.services import events
+from src.services.autocomplete import ContactIndex, AutocompleteCache
+
+
+def contact(contact_id, name, surname, email=None, phone="+380501234567", **fields):
+    return {"id": contact_id, "name": name, "surname": surname, "email": email, "phone": phone,
+            "born_date": "1990-01-01T00:00:00", **fields}
+
+
+class TestContactIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ContactIndex([contact(1, "Anna", "Smith", "anna@example.com"),
+                                   contact(2, "Andrew", "Anders", "andrew@example.com", "+380671112233"),
+                                   contact(3, "Bob", "Annenberg")])
+
+    def names(self, query, limit=10):
+        return [item["name"] for item in self.index.search(query, limit)]
+
+    def test_prefix(self):
+        self.assertEqual(self.names("an"), ["Andrew", "Anna", "Bob"])
+        self.assertEqual(self.names("AN", limit=1), ["Andrew"])
+        self.assertEqual(self.names("smi"), ["Anna"])
+        self.assertEqual(self.names("mith"), [])
+
+    def test_several_words(self):
+        self.assertEqual(self.names("an sm"), ["Anna"])
+        self.assertEqual(self.names("bob ann"), ["Bob"])
+
+    def test_phone(self):
+        self.assertEqual(self.names("+38 067 111"), ["Andrew"])
+        self.assertEqual(self.names("0038067"), ["Andrew"])
+
+    def test_add_and_remove(self):
+        self.index.add(contact(1, "Hanna", "Smith", "anna@example.com"))
+        self.assertEqual(self.names("han"), ["Hanna"])
+        self.assertEqual(self.names("anna"), ["Hanna"])
+        self.index.remove(2)
+        self.assertEqual(self.names("and"), [])
+        self.assertEqual(len(self.index), 7)
+
+
+class TestAutocompleteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = AutocompleteCache(max_entries=7, ttl=60)
+
+    def load(self, user_id, contacts):
+        self.cache.start_loading(user_id)
+        return self.cache.store(user_id, contacts)
+
+    def test_changes_applied(self):
+        self.load(1, [contact(1, "Anna", "Smith")])
+        self.cache.apply_changes([(1, events.CREATED, json.dumps(contact(2, "Bob", "Brown"))),
+                                  (1, events.DELETED, json.dumps({"id": 1}))])
+        self.assertEqual([item["name"] for item in self.cache.get(1).search("b")], ["Bob"])
+        self.assertEqual(self.cache.get(1).search("anna"), [])
+
+    def test_changed_while_loading(self):
+        self.cache.start_loading(1)
+        self.cache.apply_changes([(1, events.CREATED, json.dumps(contact(2, "Bob", "Brown")))])
+        self.cache.store(1, [contact(1, "Anna", "Smith")])
+        self.assertIsNone(self.cache.get(1))
+
+    def test_lru_eviction(self):
+        self.load(1, [contact(1, "Anna", "Smith")])
+        self.load(2, [contact(2, "Bob", "Brown")])
+        self.cache.get(1)
+        self.load(3, [contact(3, "Carl", "Cole")])
+        self.assertIsNotNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.entries, 6)
+
+    def test_expired(self):
+        self.load(1, [contact(1, "Anna", "Smith")])
+        with patch("src.services.autocomplete.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.entries, 0)
+
+    def test_not_expired_while_subscribed(self):
+        self.load(1, [contact(1, "Anna", "Smith")])
+        self.cache.subscribed = True
+        with patch("src.services.autocomplete.time.monotonic", return_value=10 ** 9):
+            self.assertIsNotNone(self.cache.get(1))
+
+    def test_published_change(self):
+        self.load(1, [contact(1, "Anna", "Smith")])
+        self.cache._handle(b"contacts:events:1",
+                           b"1700000000000-0\ncreated\n" + json.dumps(contact(2, "Bob", "Brown")).encode())
+        self.assertEqual([item["name"] for item in self.cache.get(1).search("b")], ["Bob"])
+
+    def test_echo_of_applied_change_skipped(self):
+        self.load(1, [contact(1, "Anna", "Smith", version=1), contact(2, "Bob", "Brown", version=1)])
+        updated = json.dumps(contact(1, "Hanna", "Smith", version=2))
+        self.cache.apply_changes([(1, events.UPDATED, updated),
+                                  (1, events.UPDATED, json.dumps(contact(2, "Bobby", "Brown", version=2))),
+                                  (1, events.DELETED, json.dumps({"id": 2}))])
+        # The same changes coming back through pub/sub, after a newer one
+        self.cache.apply_changes([(1, events.UPDATED, json.dumps(contact(1, "Anny", "Smith", version=3))),
+                                  (1, events.UPDATED, updated),
+                                  (1, events.UPDATED, json.dumps(contact(2, "Bobby", "Brown", version=2)))])
+        self.assertEqual([item["name"] for item in self.cache.get(1).search("smith")], ["Anny"])
+        self.assertEqual(self.cache.get(1).search("bob"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from datetime import date, datetime
+
+from src.repository.contacts import birthday_window
+from src.services.birthdays import build_digests
+
+
+class TestBirthdays(unittest.TestCase):
+
+    def test_birthday_window(self):
+        self.assertEqual(birthday_window(date(2023, 12, 29), days=3), [1229, 1230, 1231, 101])
+
+    def test_birthday_window_leap_day(self):
+        self.assertIn(229, birthday_window(date(2023, 2, 25)))
+        self.assertNotIn(229, birthday_window(date(2023, 3, 1)))
+
+    def test_build_digests(self):
+        window = birthday_window(date(2023, 4, 26))
+        rows = [
+            (1, 10, "a", "a", "a@email.com", "+421000000001", datetime(1990, 4, 30)),
+            (1, 11, "b", "b", "b@email.com", "+421000000002", datetime(1985, 4, 27)),
+            (3, 12, "c", "c", "c@email.com", "+421000000003", datetime(2000, 5, 1)),
+        ]
+        result = dict(build_digests([1, 2, 3], rows, window))
+        self.assertEqual([contact["id"] for contact in result[1]], [11, 10])
+        self.assertEqual(result[2], [])
+        self.assertEqual(result[3][0]["born_date"], "2000-05-01T00:00:00")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import unittest
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services.compression import CompressionMiddleware, brotli, zstandard
+
+PAYLOAD = [{"name": "test", "surname": "test surname", "email": "testemail@email.com"}] * 100
+
+
+def large(request):
+    return JSONResponse(PAYLOAD)
+
+
+def small(request):
+    return JSONResponse({"message": "Hello World"})
+
+
+def stream(request):
+    def content():
+        for _ in range(10):
+            yield '{"name": "test", "surname": "test surname"}' * 20
+    return StreamingResponse(content(), media_type="application/json")
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        app = Starlette(routes=[Route("/large", large), Route("/small", small), Route("/stream", stream)])
+        app.add_middleware(CompressionMiddleware, minimum_size=500)
+        self.client = TestClient(app)
+
+    def test_large_response_compressed(self):
+        response = self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json(), PAYLOAD)
+        self.assertLess(int(response.headers["content-length"]), len(response.content))
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+
+    def test_small_response_not_compressed(self):
+        response = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+
+    def test_not_accepted(self):
+        response = self.client.get("/large", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+
+    def test_streaming_response_compressed(self):
+        response = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", response.headers)
+        self.assertEqual(response.text, '{"name": "test", "surname": "test surname"}' * 200)
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = self.client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(response.json(), PAYLOAD)
+        response = self.client.get("/stream", headers={"Accept-Encoding": "br"})
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(response.text, '{"name": "test", "surname": "test surname"}' * 200)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        # httpx does not decode zstd, so the body arrives as sent
+        response = self.client.get("/large", headers={"Accept-Encoding": "gzip, zstd"})
+        self.assertEqual(response.headers["content-encoding"], "zstd")
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(response.content)
+        self.assertEqual(json.loads(body), PAYLOAD)
+        response = self.client.get("/stream", headers={"Accept-Encoding": "zstd"})
+        self.assertEqual(response.headers["content-encoding"], "zstd")
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(response.content)
+        self.assertEqual(body, b'{"name": "test", "surname": "test surname"}' * 200)
+
+    def test_negotiate(self):
+        middleware = CompressionMiddleware(None)
+        self.assertEqual(middleware.negotiate("deflate, gzip;q=0.5"), "gzip")
+        self.assertIsNone(middleware.negotiate("gzip;q=0"))
+        self.assertIsNone(middleware.negotiate(""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import random
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException, Response
+
+from src.database.models import Contact
+from src.repository import contacts as repository_contacts
+from src.routes.contacts import read_contact, show_contacts
+from src.schemas import ContactBase, ContactUpdate
+from src.services import birthdays, contact_cache, events
+from src.services.resilience import redis_breaker
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  fakeredis runs the cache scripts with it
+except ImportError:
+    fakeredis = None
+
+
+def body(number, model=ContactBase, **extra):
+    return model(name=f"Name{number}", surname=f"Surname{number}", email=f"contact{number}@example.com",
+                 phone=f"+38050{number:07}", born_date=datetime(1990, 1, 1), **extra)
+
+
+@unittest.skipIf(fakeredis is None, "needs fakeredis[lua]")
+@pytest.mark.usefixtures("memory_session")
+class TestContactCacheConsistency(unittest.IsolatedAsyncioTestCase):
+    """
+        Reads through the routes must always match the database, whatever writes happen between
+        the cache lookup and the store of a miss.
+        """
+
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        redis_breaker.reset()
+        self.patches = [
+            patch.object(contact_cache, "r", self.r),
+            patch.object(contact_cache, "READ_SCRIPT", self.r.register_script(contact_cache.READ_SCRIPT.script)),
+            patch.object(contact_cache, "WRITE_SCRIPT", self.r.register_script(contact_cache.WRITE_SCRIPT.script)),
+            patch.object(birthdays, "r", self.r),
+            patch.object(events, "PUBLISH_SCRIPT", MagicMock()),
+        ]
+        for item in self.patches:
+            item.start()
+        self.counter = 0
+
+    def tearDown(self):
+        for item in self.patches:
+            item.stop()
+
+    async def create(self):
+        self.counter += 1
+        return await repository_contacts.create_contact(body(self.counter), self.user, self.session)
+
+    async def read(self, contact_id):
+        try:
+            response = await read_contact(contact_id, fields=None, db=self.session, current_user=self.user)
+        except HTTPException as err:
+            self.assertEqual(err.status_code, 404)
+            return None
+        return json.loads(response.body)
+
+    async def read_list(self, skip=0, limit=100):
+        response = await show_contacts(Response(), skip=skip, limit=limit, fields=None, count=False, accept=None,
+                                       db=self.session, current_user=self.user)
+        return json.loads(response.body)
+
+    def expected(self, contact_id):
+        contact = self.session.query(Contact).filter(Contact.id == contact_id, Contact.deleted_at.is_(None)).first()
+        return None if contact is None else json.loads(contact_cache.serialize_contact(contact))
+
+    def expected_list(self, skip=0, limit=100):
+        contacts = self.session.query(Contact).filter(Contact.user_id == self.user.id, Contact.deleted_at.is_(None))\
+            .offset(skip).limit(limit).all()
+        return json.loads(contact_cache.serialize_contacts(contacts))
+
+    async def test_hit_after_miss(self):
+        contact = await self.create()
+        before = dict(contact_cache.counters)
+        self.assertEqual(await self.read(contact.id), self.expected(contact.id))
+        self.assertEqual(await self.read(contact.id), self.expected(contact.id))
+        self.assertEqual(contact_cache.counters["contact", "hit"] - before["contact", "hit"], 2)
+
+    async def test_concurrent_misses_read_database_once(self):
+        await self.create()
+        self.r.flushall()
+        show = repository_contacts.show_contacts
+
+        async def slow_show(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return await show(*args, **kwargs)
+
+        with patch.object(repository_contacts, "show_contacts", side_effect=slow_show) as query:
+            lists = await asyncio.gather(*(self.read_list() for _ in range(5)))
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(lists, [self.expected_list()] * 5)
+
+    async def test_entry_near_expiry_reloaded_early(self):
+        contact = await self.create()
+        before = contact_cache.counters["contact", "refresh"]
+        with patch.object(contact_cache, "refresh_early", return_value=True), \
+                patch.object(repository_contacts, "get_contact", wraps=repository_contacts.get_contact) as query:
+            self.assertEqual(await self.read(contact.id), self.expected(contact.id))
+        query.assert_awaited_once()
+        self.assertEqual(contact_cache.counters["contact", "refresh"] - before, 1)
+
+    async def test_write_through_and_delete(self):
+        contact = await self.create()
+        await self.read_list()
+        await repository_contacts.update_contact(contact.id, body(99, ContactUpdate, done=False), self.user, self.session)
+        self.assertEqual((await self.read(contact.id))["name"], "Name99")
+        self.assertEqual(await self.read_list(), self.expected_list())
+        await repository_contacts.remove_contact(contact.id, self.user, self.session)
+        self.assertIsNone(await self.read(contact.id))
+        self.assertEqual(await self.read_list(), [])
+
+    async def test_write_between_lookup_and_store(self):
+        contact = await self.create()
+        get_contact = repository_contacts.get_contact
+
+        async def read_then_write(*args, **kwargs):
+            stale = await get_contact(*args, **kwargs)
+            stale = Contact(**{field: getattr(stale, field) for field in ("id", "name", "surname", "email",
+                                                                          "phone", "born_date", "version")})
+            await repository_contacts.update_contact(contact.id, body(42, ContactUpdate, done=False),
+                                                     self.user, self.session)
+            return stale
+
+        # Drop the entry cached on create, so that the read misses
+        self.r.flushall()
+        with patch.object(repository_contacts, "get_contact", read_then_write):
+            self.assertEqual((await self.read(contact.id))["name"], "Name1")
+        self.assertEqual((await self.read(contact.id))["name"], "Name42")
+
+    async def test_interleaved_reads_and_writes(self):
+        rng = random.Random(7)
+        ids = [(await self.create()).id for _ in range(5)]
+        get_contact, show = repository_contacts.get_contact, repository_contacts.show_contacts
+
+        alive = list(ids)
+
+        async def write():
+            operation = rng.choice(["create", "update", "delete"])
+            if operation == "create" or not alive:
+                contact_id = (await self.create()).id
+                ids.append(contact_id)
+                alive.append(contact_id)
+            elif operation == "update":
+                self.counter += 1
+                await repository_contacts.update_contact(rng.choice(alive), body(self.counter, ContactUpdate,
+                                                                                 done=False), self.user, self.session)
+            else:
+                contact_id = rng.choice(alive)
+                alive.remove(contact_id)
+                await repository_contacts.remove_contact(contact_id, self.user, self.session)
+
+        async def racing_get_contact(*args, **kwargs):
+            # A write may commit between the cache lookup and the database read
+            if rng.random() < 0.3:
+                await write()
+            return await get_contact(*args, **kwargs)
+
+        async def racing_show_contacts(*args, **kwargs):
+            if rng.random() < 0.3:
+                await write()
+            return await show(*args, **kwargs)
+
+        with patch.object(repository_contacts, "get_contact", racing_get_contact), \
+                patch.object(repository_contacts, "show_contacts", racing_show_contacts):
+            for _ in range(300):
+                step = rng.random()
+                if step < 0.3:
+                    await write()
+                elif step < 0.7:
+                    contact_id = rng.choice(ids)
+                    # The first read may store the state read before a racing write; the next must not see it
+                    await self.read(contact_id)
+                    self.assertEqual(await self.read(contact_id), self.expected(contact_id))
+                else:
+                    await self.read_list(limit=3)
+                    self.assertEqual(await self.read_list(limit=3), self.expected_list(limit=3))
+        self.assertGreater(contact_cache.counters["contact", "hit"], 0)
+        self.assertGreater(contact_cache.counters["list", "hit"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from src.services.duplicates import normalize_email, normalize_phone, find_duplicate_pairs
+
+
+class TestDuplicates(unittest.TestCase):
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email(" Example@Exmpl.COM "), "example@exmpl.com")
+        self.assertIsNone(normalize_email(None))
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone("+421 900-123-456"), "421900123456")
+        self.assertEqual(normalize_phone("00421900123456"), "421900123456")
+        self.assertIsNone(normalize_phone("n/a"))
+
+    def test_find_duplicate_pairs(self):
+        rows = [
+            (1, "John", "Smith", "john@exmpl.com", "+421900123456"),
+            (2, "Anna", "Smith", "anna@exmpl.com", "+421900000000"),
+            (3, "Johnny", "Smith", "JOHN@exmpl.com", "0900 123 456"),
+            (4, "anna", "smith", None, "+380500000000"),
+        ]
+        result = find_duplicate_pairs(rows)
+        self.assertEqual(result, [
+            {"contact_ids": [1, 3], "reasons": ["email", "phone"]},
+            {"contact_ids": [2, 4], "reasons": ["name"]},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+from src.database.models import Contact
+from src.repository.contacts import create_contact, remove_contact
+from src.schemas import ContactBase
+from src.services import events
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  fakeredis runs the publish script with it
+except ImportError:
+    fakeredis = None
+
+
+@pytest.mark.usefixtures("memory_session")
+class TestContactEvents(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.body = ContactBase(name="test", surname="test surname", email="testemail@email.com",
+                                phone="+421123456789", born_date="2023-04-26T09:31:02.618Z")
+
+    async def test_events_published_after_commit(self):
+        with patch("src.services.events.publish_contact_event") as publish:
+            contact = await create_contact(body=self.body, user=self.user, db=self.session)
+            await remove_contact(contact_id=contact.id, user=self.user, db=self.session)
+        self.assertEqual([call.args[:2] for call in publish.call_args_list],
+                         [(self.user.id, "created"), (self.user.id, "deleted")])
+        self.assertIn('"phone": "+421123456789"', publish.call_args_list[0].args[2])
+
+    async def test_events_dropped_on_rollback(self):
+        with patch("src.services.events.publish_contact_event") as publish:
+            contact = Contact(name="test", surname="test", phone="+421123456789", user_id=self.user.id)
+            self.session.add(contact)
+            self.session.flush()
+            events.queue_contact_event(self.session, events.CREATED, contact)
+            self.session.rollback()
+            self.session.commit()
+        publish.assert_not_called()
+
+    async def test_savepoint_rollback_keeps_earlier_events(self):
+        with patch("src.services.events.publish_contact_event") as publish:
+            contact = await create_contact(body=self.body, user=self.user, db=self.session, commit=False)
+            savepoint = self.session.begin_nested()
+            await remove_contact(contact_id=contact.id, user=self.user, db=self.session, commit=False)
+            savepoint.rollback()
+            self.session.commit()
+        self.assertEqual([call.args[:2] for call in publish.call_args_list], [(self.user.id, "created")])
+
+    @unittest.skipIf(fakeredis is None, "needs fakeredis[lua]")
+    async def test_events_of_a_commit_published_in_one_pipeline(self):
+        r = fakeredis.FakeRedis()
+        with patch.object(events, "r", r), \
+                patch.object(events, "PUBLISH_SCRIPT", r.register_script(events.PUBLISH_SCRIPT.script)), \
+                patch.object(r, "pipeline", wraps=r.pipeline) as pipeline:
+            await create_contact(body=self.body, user=self.user, db=self.session, commit=False)
+            self.body.email, self.body.phone = "other@email.com", "+421987654321"
+            await create_contact(body=self.body, user=self.user, db=self.session, commit=False)
+            self.session.commit()
+        pipeline.assert_called_once()
+        log = r.xrange(events.log_name(self.user.id))
+        self.assertEqual([fields[b"type"] for _, fields in log], [b"created", b"created"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services.fieldsets import parse_fields, sparse_model
+
+
+class TestFieldsets(unittest.TestCase):
+
+    def test_parse_fields(self):
+        self.assertEqual(parse_fields("phone, name"), ("name", "phone"))
+        self.assertIsNone(parse_fields(None))
+        self.assertIsNone(parse_fields(",".join(ContactResponse.__fields__)))
+
+    def test_parse_unknown_fields(self):
+        with self.assertRaises(HTTPException) as error:
+            parse_fields("name,password")
+        self.assertEqual(error.exception.status_code, 422)
+
+    def test_sparse_model_is_cached(self):
+        self.assertIs(sparse_model(("name", "phone")), sparse_model(("name", "phone")))
+        self.assertIs(sparse_model(None), ContactResponse)
+
+    def test_sparse_model_from_orm(self):
+        contact = Contact(id=1, name="test", surname="test", email="a@email.com", phone="+421123456789",
+                          born_date=datetime(2000, 1, 1))
+        result = sparse_model(("name", "phone")).from_orm(contact)
+        self.assertEqual(result.dict(), {"name": "test", "phone": "+421123456789"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import json
+import unittest
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services import formats
+from src.services.formats import COLUMNAR, JSON, MSGPACK, contacts_response, negotiate, stream_contacts
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def make_contacts(count):
+    return [Contact(id=number, name=f"Name{number}", surname="Прізвище", email=f"contact{number}@example.com",
+                    phone=f"+38050{number:07}", born_date=datetime(1990, 1, number % 28 + 1, 12, 30), version=1)
+            for number in range(1, count + 1)]
+
+
+def from_columns(body):
+    columns = json.loads(body)["columns"]
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+class TestNegotiate(unittest.TestCase):
+
+    def test_default_is_json(self):
+        self.assertEqual(negotiate(None), JSON)
+        self.assertEqual(negotiate("*/*"), JSON)
+        self.assertEqual(negotiate("text/html,application/*;q=0.9,*/*;q=0.8"), JSON)
+
+    def test_preferences(self):
+        self.assertEqual(negotiate(COLUMNAR), COLUMNAR)
+        self.assertEqual(negotiate(f"{JSON};q=0.5, {COLUMNAR}"), COLUMNAR)
+        self.assertEqual(negotiate(f"{COLUMNAR};q=0, */*"), JSON)
+        self.assertEqual(negotiate(f"*/*;q=0.1, {JSON};q=0"), COLUMNAR)
+
+    @unittest.skipIf(msgpack is None, "needs msgpack")
+    def test_msgpack_alias(self):
+        self.assertEqual(negotiate("application/x-msgpack"), MSGPACK)
+
+    def test_not_acceptable(self):
+        with self.assertRaises(HTTPException) as error:
+            negotiate("text/html")
+        self.assertEqual(error.exception.status_code, 406)
+
+
+class TestEncode(unittest.TestCase):
+
+    def setUp(self):
+        self.contacts = make_contacts(30)
+        self.expected = jsonable_encoder([ContactResponse.from_orm(contact) for contact in self.contacts])
+
+    def test_columnar_matches_json(self):
+        response = contacts_response(self.contacts, None, COLUMNAR)
+        self.assertEqual(response.media_type, COLUMNAR)
+        self.assertEqual(json.loads(response.body)["count"], 30)
+        self.assertEqual(from_columns(response.body), self.expected)
+
+    def test_columnar_sparse_and_dicts(self):
+        response = contacts_response(self.expected, ("name", "phone"), COLUMNAR)
+        self.assertEqual(from_columns(response.body), [{"name": contact["name"], "phone": contact["phone"]}
+                                                       for contact in self.expected])
+        self.assertEqual(json.loads(contacts_response([], ("name",), COLUMNAR).body),
+                         {"count": 0, "columns": {"name": []}})
+
+    @unittest.skipIf(msgpack is None, "needs msgpack")
+    def test_msgpack_matches_json(self):
+        self.assertEqual(msgpack.unpackb(contacts_response(self.contacts, None, MSGPACK).body), self.expected)
+        stream = b"".join(stream_contacts(iter(self.contacts), None, MSGPACK))
+        self.assertEqual(list(msgpack.Unpacker(io.BytesIO(stream))), self.expected)
+
+    def test_without_msgpack(self):
+        available = formats.msgpack
+        formats.msgpack = None
+        try:
+            self.assertEqual(formats.available(), (JSON, COLUMNAR))
+            with self.assertRaises(HTTPException):
+                negotiate(MSGPACK)
+        finally:
+            formats.msgpack = available
+
+
+if __name__ == '__main__':
+    unittest.main()
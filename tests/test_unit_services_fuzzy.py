@@ -0,0 +1,99 @@
+import unittest
+
+from src.services.autocomplete import ContactIndex
+from src.services.fuzzy import FuzzyIndex, bounded_distance, trigrams
+
+
+def contact(contact_id, name, surname):
+    return {"id": contact_id, "name": name, "surname": surname, "email": None, "phone": "+380501234567",
+            "born_date": "1990-01-01T00:00:00"}
+
+
+class TestDistance(unittest.TestCase):
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("jon"), {" jo", "jon", "on "})
+        self.assertEqual(trigrams("a"), {" a "})
+
+    def test_bounded_distance(self):
+        self.assertEqual(bounded_distance("john", "john", 2), 0)
+        self.assertEqual(bounded_distance("jonh", "john", 2), 1)
+        self.assertEqual(bounded_distance("jon", "john", 2), 1)
+        self.assertEqual(bounded_distance("joan", "john", 2), 1)
+        self.assertEqual(bounded_distance("smith", "smyth", 0), 1)
+        self.assertEqual(bounded_distance("petrov", "ivanov", 2), 3)
+        self.assertEqual(bounded_distance("al", "alexander", 2), 3)
+
+
+class TestFuzzyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = FuzzyIndex()
+        self.index.add(1, ["john", "petrov"])
+        self.index.add(2, ["jon", "smith"])
+        self.index.add(3, ["maria", "ivanova"])
+
+    def test_matches(self):
+        self.assertEqual(self.index.matches("jonh", 0), {})
+        self.assertEqual(self.index.matches("jonh", 1), {"john": 1, "jon": 1})
+        self.assertEqual(self.index.matches("smiht", 2), {"smith": 1})
+        self.assertEqual(self.index.matches("xyz", 2), {})
+
+    def test_matches_transpositions(self):
+        self.index.add(4, ["alexander"])
+        self.assertEqual(self.index.matches("petorv", 1), {"petrov": 1})
+        self.assertEqual(self.index.matches("pertov", 1), {"petrov": 1})
+        self.assertEqual(self.index.matches("alexnader", 1), {"alexander": 1})
+
+    def test_short_queries_match_brute_force(self):
+        words = ["yurii", "daria", "ivan", "petro", "olga", "ian", "li", "jo"]
+        self.index.add(5, words)
+        for query in ("yrie", "dra", "iae", "oetdo", "ia", "x", "oo"):
+            for max_distance in (1, 2):
+                expected = {}
+                for candidate in self.index.words:
+                    distance = bounded_distance(query, candidate, max_distance)
+                    if distance <= max_distance:
+                        expected[candidate] = distance
+                self.assertEqual(self.index.matches(query, max_distance), expected, (query, max_distance))
+        self.assertEqual(self.index.matches("dra", 2)["daria"], 2)
+
+    def test_search(self):
+        self.assertEqual(self.index.search(["jonh"], 2), {1: 1, 2: 1})
+        self.assertEqual(self.index.search(["johns"], 1), {1: 1})
+        self.assertEqual(self.index.search(["jonh", "petrof"], 2), {1: 2})
+        self.assertEqual(self.index.search(["jonh", "ivanova"], 2), {})
+
+    def test_remove(self):
+        self.index.add(4, ["jon"])
+        self.index.remove(2, ["jon", "smith"])
+        self.assertEqual(self.index.search(["jon"], 0), {4: 0})
+        self.index.remove(4, ["jon"])
+        self.assertEqual(self.index.search(["jon"], 0), {})
+        self.assertNotIn("smith", self.index.words)
+        self.assertNotIn("smi", self.index.postings)
+
+
+class TestContactIndexFuzzySearch(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ContactIndex([contact(1, "Jon", "Smith"), contact(2, "John", "Petrov"),
+                                   contact(3, "Joan", "Petroff"), contact(4, "Maria", "Ivanova")])
+
+    def names(self, query, max_distance=2, limit=20):
+        found, total = self.index.fuzzy_search(query, max_distance, limit)
+        return [f"{item['name']} {item['surname']}" for item in found], total
+
+    def test_closest_first(self):
+        self.assertEqual(self.names("Johan"), (["John Petrov", "Joan Petroff", "Jon Smith"], 3))
+        self.assertEqual(self.names("jonh", max_distance=1), (["Jon Smith", "John Petrov"], 2))
+        self.assertEqual(self.names("joan petrov"), (["John Petrov", "Joan Petroff"], 2))
+
+    def test_limit_keeps_total(self):
+        self.assertEqual(self.names("johan", limit=2), (["John Petrov", "Joan Petroff"], 3))
+
+    def test_follows_changes(self):
+        self.names("jonh")
+        self.index.add(contact(5, "Jonh", "Doe"))
+        self.index.remove(2)
+        self.assertEqual(self.names("jonh", max_distance=1), (["Jonh Doe", "Jon Smith"], 2))
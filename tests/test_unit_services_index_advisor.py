@@ -0,0 +1,71 @@
+import unittest
+
+import pytest
+
+from src.services.index_advisor import analyze_statement, candidate_index, is_covered, advise, render_migration
+
+
+class TestIndexAdvisor(unittest.TestCase):
+
+    def test_analyze_statement(self):
+        accesses = analyze_statement(
+            "SELECT contacts.id FROM contacts WHERE contacts.user_id = ? AND contacts.deleted_at IS NULL "
+            "AND (contacts.updated_at, contacts.id) > (?, ?) AND contacts.name LIKE ? "
+            "ORDER BY contacts.updated_at, contacts.id LIMIT ?")
+        access = accesses["contacts"]
+        self.assertEqual(access["equality"], ["user_id"])
+        self.assertEqual(access["range"], ["updated_at", "id"])
+        self.assertEqual(access["order"], ["updated_at", "id"])
+        self.assertEqual(access["conditions"], ["deleted_at IS NULL"])
+        self.assertEqual(len(access["notes"]), 1)
+
+    def test_analyze_join(self):
+        accesses = analyze_statement("SELECT users.id FROM users JOIN contacts AS c ON c.user_id = users.id "
+                                     "WHERE c.surname = ?")
+        self.assertEqual(accesses["contacts"]["equality"], ["user_id", "surname"])
+        self.assertEqual(accesses["users"]["equality"], ["id"])
+
+    def test_analyze_insert(self):
+        self.assertEqual(analyze_statement("INSERT INTO contacts (name) VALUES (?)"), {})
+
+    def test_candidate_index(self):
+        access = analyze_statement("SELECT contacts.id FROM contacts WHERE contacts.surname = ? "
+                                   "AND contacts.deleted_at IS NULL ORDER BY contacts.name")["contacts"]
+        candidate = candidate_index("contacts", access)
+        self.assertEqual(candidate["columns"], ("surname", "name"))
+        self.assertEqual(candidate["where"], "deleted_at IS NULL")
+        self.assertFalse(is_covered(candidate, access, {"contacts": [("id",), ("user_id", "updated_at", "id")]}))
+        self.assertTrue(is_covered(candidate, access, {"contacts": [("surname",)]}))
+
+    @pytest.mark.usefixtures("memory_session")
+    def test_advise(self):
+        statements = {
+            "by_user": {"statement": "SELECT contacts.id FROM contacts WHERE contacts.user_id = ? "
+                                     "AND contacts.deleted_at IS NULL LIMIT ?",
+                        "parameters": [1, 10], "calls": 10, "total_seconds": 0.01, "max_seconds": 0.001},
+            "by_surname": {"statement": "SELECT contacts.id FROM contacts WHERE contacts.surname = ? "
+                                        "AND contacts.name = ?",
+                           "parameters": ["a", "b"], "calls": 5, "total_seconds": 0.02, "max_seconds": 0.01},
+            "by_surname_only": {"statement": "SELECT contacts.id FROM contacts WHERE contacts.surname = ?",
+                                "parameters": ["a"], "calls": 1, "total_seconds": 0.001, "max_seconds": 0.001},
+        }
+        report = advise(statements, self.session.connection())
+        self.assertEqual([proposal["columns"] for proposal in report["proposals"]], [["surname", "name"]])
+        self.assertEqual(report["proposals"][0]["calls"], 6)
+        by_surname = next(item for item in report["statements"] if item["statement"] == "by_surname")
+        self.assertEqual(by_surname["full_scans"], ["contacts"])
+        by_user = next(item for item in report["statements"] if item["statement"] == "by_user")
+        self.assertEqual(by_user["proposed"], [])
+
+    def test_render_migration(self):
+        proposals = [{"name": "ix_contacts_surname", "table": "contacts", "columns": ["surname"],
+                      "where": "deleted_at IS NULL", "calls": 1, "total_ms": 1.0}]
+        source = render_migration(proposals, "c2cefd58e52c", revision="0123456789ab")
+        compile(source, "migration.py", "exec")
+        self.assertIn("postgresql_concurrently=True", source)
+        self.assertIn("autocommit_block", source)
+        self.assertIn("down_revision = 'c2cefd58e52c'", source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services.profiling import AWAITING, Profile, Profiler, ProfileStore, ProfilingMiddleware, Sampler
+
+
+def busy():
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.1:
+        pass
+
+
+class TestProfilingMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        app = FastAPI()
+
+        @app.get("/slow/{item_id}")
+        async def slow(item_id: int):
+            busy()
+            return {"id": item_id}
+
+        async def is_admin(token):
+            return token == "admin"
+
+        self.profiler = Profiler(ProfileStore(self.directory.name, 10 ** 6), 0.001, is_admin)
+        app.add_middleware(ProfilingMiddleware, profiler=self.profiler)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_admin_header(self):
+        response = self.client.get("/slow/1", headers={"X-Profile": "1", "Authorization": "Bearer admin"})
+        with open(self.profiler.store.path(response.headers["X-Profile"])) as file:
+            lines = file.read().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(stack.endswith(f";busy (test_unit_services_profiling.py:{busy.__code__.co_firstlineno})"))
+        self.assertIn(".slow (test_unit_services_profiling.py", stack)
+        self.assertGreater(int(count), 0)
+
+    def test_header_ignored_for_other_users(self):
+        response = self.client.get("/slow/1", headers={"X-Profile": "1", "Authorization": "Bearer user"})
+        self.assertNotIn("X-Profile", response.headers)
+        self.assertEqual(self.profiler.store.list(), [])
+
+    def test_rules(self):
+        self.profiler.add_rule("get", "/slow/{item_id}", 1.0, 2, 60)
+        self.profiler.add_rule("POST", "/slow/{item_id}", 1.0, 2, 60)
+        profiled = ["X-Profile" in self.client.get(f"/slow/{number}").headers for number in range(3)]
+        self.assertEqual(profiled, [True, True, False])
+        self.assertEqual([rule.method for rule in self.profiler.active_rules()], ["POST"])
+        self.assertEqual(len(self.profiler.store.list()), 2)
+
+    def test_expired_rule(self):
+        self.profiler.add_rule("GET", "/slow/{item_id}", 1.0, 2, -1)
+        self.assertNotIn("X-Profile", self.client.get("/slow/1").headers)
+        self.assertEqual(self.profiler.rules, {})
+
+
+class TestProfile(unittest.TestCase):
+
+    def test_not_running(self):
+        profile = Profile("test.folded", 0, sys._getframe())
+        profile.sample(None)
+        profile.sample(sys._getframe().f_back)
+        self.assertEqual(profile.folded(), f"{AWAITING} 2\n")
+
+    def test_sampler_restarts_after_error(self):
+        class Broken(Profile):
+            def sample(self, frame):
+                raise AttributeError("co_qualname")
+
+        sampler = Sampler(0.001)
+        broken = Broken("broken.folded", threading.get_ident(), sys._getframe())
+        with patch.object(threading, "excepthook"):
+            sampler.add(broken)
+            thread = sampler._thread
+            thread.join(timeout=1)
+        self.assertIsNone(sampler._thread)
+        sampler.remove(broken)
+        profile = Profile("test.folded", threading.get_ident(), sys._getframe())
+        sampler.add(profile)
+        time.sleep(0.05)
+        sampler.remove(profile)
+        self.assertTrue(profile.samples)
+
+    def test_store_keeps_newest_within_max_bytes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, 25)
+            for number in range(4):
+                store.write(f"{number}.folded", "a;b 1\n")
+                os.utime(os.path.join(directory, f"{number}.folded"), (number, number))
+            self.assertEqual(len(store.list()), 4)
+            store.write("4.folded", "a;b 1\n")
+            self.assertEqual([profile["name"] for profile in store.list()], ["4.folded", "3.folded", "2.folded",
+                                                                               "1.folded"])
+            self.assertIsNone(store.path("../secret.folded"))
+
+
+if __name__ == '__main__':
+    unittest.main()
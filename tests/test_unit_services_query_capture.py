@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from src.services.query_capture import QueryCapture, normalize_statement, load_capture
+
+
+class TestQueryCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.capture = QueryCapture()
+        self.capture.attach(self.engine)
+
+    def tearDown(self):
+        self.capture.detach(self.engine)
+
+    def test_normalize_statement(self):
+        self.assertEqual(normalize_statement("SELECT a FROM t\n WHERE t.id IN (?, ?, ?)"),
+                         "SELECT a FROM t WHERE t.id IN (?...)")
+        self.assertEqual(normalize_statement("INSERT INTO t (a, b) VALUES (%(a_m0)s, %(b_m0)s), (%(a_m1)s, %(b_m1)s)"),
+                         "INSERT INTO t (a, b) VALUES (?...)")
+
+    def test_capture(self):
+        with self.engine.connect() as connection:
+            for value in (1, 2, 3):
+                connection.execute(text("SELECT :value"), {"value": value})
+        entry = self.capture.snapshot()["SELECT ?"]
+        self.assertEqual(entry["calls"], 3)
+        self.assertEqual(entry["parameters"], [1])
+        self.assertGreater(entry["total_seconds"], 0)
+
+    def test_save_merges(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.json")
+            self.capture.save(path)
+            self.capture.save(path)
+            self.assertEqual(load_capture(path)["SELECT 1"]["calls"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import socket
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from src.services import birthdays, contact_cache, events, metrics, redis_clients as redis_clients_module
+from src.services.auth import Auth
+from src.services.redis_clients import RedisClients, redis_clients
+from src.services.revocation import revocation
+
+
+class TestRedisClients(unittest.IsolatedAsyncioTestCase):
+    """
+        Redis accepts connections and is never sent a command: only the pools are exercised.
+        """
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(10)
+        self.clients = RedisClients("127.0.0.1", self.server.getsockname()[1], max_connections=2,
+                                    pool_timeout=0.05)
+
+    def tearDown(self):
+        self.clients.close()
+        self.server.close()
+
+    def test_services_share_one_client(self):
+        for client in (events.r, contact_cache.r, birthdays.r, revocation.r):
+            self.assertIs(client, Auth.r)
+        self.assertIs(Auth.r.connection_pool, redis_clients.pool)
+
+    def test_pool_is_bounded(self):
+        first = self.clients.pool.get_connection("GET")
+        second = self.clients.pool.get_connection("GET")
+        with self.assertRaises(redis.ConnectionError):
+            self.clients.pool.get_connection("GET")
+        self.clients.pool.release(first)
+        self.assertEqual(redis_clients_module._pool_stats(self.clients.pool), (2, 1))
+        self.clients.pool.release(second)
+
+    def test_pool_metrics(self):
+        self.clients.pool.release(self.clients.pool.get_connection("GET"))
+        self.clients.async_client(decode_responses=True)
+        with patch.object(redis_clients_module, "redis_clients", self.clients):
+            text = metrics.render()
+        self.assertIn('redis_pool_max_connections{pool="sync"} 2', text)
+        self.assertIn('redis_pool_connections{pool="sync",state="idle"} 1', text)
+        self.assertIn('redis_pool_connections{pool="sync",state="in_use"} 0', text)
+        self.assertIn('redis_pool_connections{pool="async_decoded",state="in_use"} 0', text)
+
+    async def test_async_clients_share_pools_by_options(self):
+        client = self.clients.async_client()
+        self.assertIs(self.clients.async_client(), client)
+        streams = self.clients.async_client(subscriptions=True)
+        self.assertIsNot(streams.connection_pool, client.connection_pool)
+        self.assertIsNone(streams.connection_pool.connection_kwargs.get("socket_timeout"))
+        connection = await client.connection_pool.get_connection("GET")
+        await client.connection_pool.release(connection)
+        await self.clients.aclose()
+        self.assertFalse(connection.is_connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
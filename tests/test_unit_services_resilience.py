@@ -0,0 +1,159 @@
+import socket
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis
+from fastapi_limiter import FastAPILimiter
+
+from src.database.models import User
+from src.services import metrics
+from src.services.auth import Auth
+from src.services.resilience import (CLOSED, HALF_OPEN, OPEN, UNAVAILABLE, CircuitBreaker, LocalCache, LocalRateLimits,
+                                     ResilientRateLimiter, redis_breaker)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10, errors=(OSError,),
+                                      clock=self.clock)
+
+    def fail(self):
+        raise OSError("down")
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.assertIs(self.breaker.call(self.fail), UNAVAILABLE)
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        for _ in range(3):
+            self.breaker.call(self.fail)
+        self.assertEqual(self.breaker.state, OPEN)
+        func = MagicMock()
+        self.assertIsNone(self.breaker.call(func, fallback=None))
+        func.assert_not_called()
+        self.assertEqual(self.breaker.counters, {"failures": 5, "opened": 1, "rejected": 1})
+
+    def test_half_open_trial(self):
+        for _ in range(3):
+            self.breaker.call(self.fail)
+        self.clock.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.now += 10
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_logs_transitions_only(self):
+        with self.assertLogs("src.services.resilience") as logs:
+            for _ in range(10):
+                self.breaker.call(self.fail)
+            self.clock.now += 10
+            self.breaker.call(lambda: "ok")
+            self.breaker.call(lambda: "ok")
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("opened after 3 consecutive failures: down", logs.records[0].getMessage())
+        self.assertIn("closed", logs.records[1].getMessage())
+
+    def test_errors_not_listed_propagate(self):
+        with self.assertRaises(ValueError):
+            self.breaker.call(int, "x")
+        self.assertEqual(self.breaker.failures, 0)
+
+
+class TestLocalRateLimits(unittest.TestCase):
+
+    def test_fixed_window(self):
+        clock = Clock()
+        limits = LocalRateLimits(clock=clock)
+        self.assertEqual([limits.check("key", 2, 60000) for _ in range(2)], [0, 0])
+        clock.now += 15
+        self.assertEqual(limits.check("key", 2, 60000), 45000)
+        self.assertEqual(limits.check("other", 2, 60000), 0)
+        clock.now += 45
+        self.assertEqual(limits.check("key", 2, 60000), 0)
+
+
+class TestRedisFaultInjection(unittest.IsolatedAsyncioTestCase):
+    """
+        Redis accepts connections but never answers, as a stalled server would.
+        """
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(100)
+        self.r = redis.Redis(host="127.0.0.1", port=self.server.getsockname()[1],
+                             socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.clock = Clock()
+        redis_breaker.reset()
+        self.patches = [patch.object(redis_breaker, "clock", self.clock), patch.object(redis_breaker, "errors",
+                                                                                      (redis.RedisError,))]
+        for item in self.patches:
+            item.start()
+
+    def tearDown(self):
+        for item in self.patches:
+            item.stop()
+        redis_breaker.reset()
+        self.r.close()
+        self.server.close()
+
+    async def test_auth_latency_stays_bounded(self):
+        auth = Auth()
+        auth.r = self.r
+        auth.local_users = LocalCache(100, 60)
+        user = User(id=1, username="user", email="user@example.com")
+        auth.decode_access_token = AsyncMock(return_value={"sub": user.email})
+        with patch("src.services.auth.repository_users.get_user_by_email", AsyncMock(return_value=user)) as lookup, \
+                patch.object(auth, "_read_cached_user", wraps=auth._read_cached_user) as read:
+            latencies = []
+            for _ in range(50):
+                started = time.perf_counter()
+                self.assertEqual((await auth.get_current_user("token", MagicMock())).email, user.email)
+                latencies.append(time.perf_counter() - started)
+        self.assertEqual(redis_breaker.state, OPEN)
+        self.assertLess(max(latencies), 0.5)
+        # Only the calls before the breaker opened waited for the socket timeout
+        self.assertEqual(read.call_count, redis_breaker.failure_threshold)
+        lookup.assert_awaited_once()
+
+        auth.r = MagicMock()
+        auth.r.pipeline.return_value.execute.return_value = [None, -2]
+        self.clock.now += redis_breaker.reset_timeout
+        with patch("src.services.auth.repository_users.get_user_by_email", AsyncMock(return_value=user)):
+            await auth.get_current_user("token", MagicMock())
+        self.assertEqual(redis_breaker.state, CLOSED)
+        auth.r.set.assert_called_once()
+
+    async def test_rate_limit_falls_back_to_local_counts(self):
+        limiter = ResilientRateLimiter(times=2, seconds=60)
+        limiter.local = LocalRateLimits()
+        redis_client = MagicMock()
+        redis_client.evalsha = AsyncMock(side_effect=redis.ConnectionError("down"))
+        with patch.object(FastAPILimiter, "redis", redis_client), patch.object(FastAPILimiter, "lua_sha", "sha"):
+            results = [await limiter._check("fastapi-limiter:ip:0:0") for _ in range(3)]
+        self.assertEqual(results[:2], [0, 0])
+        self.assertGreater(results[2], 0)
+        self.assertGreaterEqual(redis_breaker.counters["failures"], 3)
+
+    def test_breaker_metrics(self):
+        for _ in range(redis_breaker.failure_threshold):
+            redis_breaker.record_failure()
+        text = metrics.render()
+        self.assertIn('circuit_breaker_state{name="redis",state="open"} 1', text)
+        self.assertIn('circuit_breaker_state{name="redis",state="closed"} 0', text)
+        self.assertIn("# TYPE circuit_breaker_opened_total counter", text)
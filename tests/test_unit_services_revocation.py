@@ -0,0 +1,90 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import redis
+
+from src.services.resilience import redis_breaker
+from src.services.revocation import BloomFilter, TokenRevocation
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        items = [f"jti-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestTokenRevocation(unittest.TestCase):
+
+    def setUp(self):
+        redis_breaker.reset()
+        self.r = MagicMock()
+        self.revocation = TokenRevocation(self.r, capacity=100)
+
+    def test_not_revoked_without_network_call(self):
+        result = self.revocation.is_revoked({"sub": "example@exmpl.com", "jti": "abc", "iat": int(time.time())})
+        self.assertFalse(result)
+        self.r.exists.assert_not_called()
+
+    def test_revoke_token(self):
+        self.revocation.revoke_token("abc", int(time.time()) + 60)
+        self.r.exists.return_value = 1
+        result = self.revocation.is_revoked({"sub": "example@exmpl.com", "jti": "abc", "iat": int(time.time())})
+        self.assertTrue(result)
+
+    def test_revoke_all(self):
+        issued_at = int(time.time()) - 10
+        self.revocation.revoke_all("example@exmpl.com")
+        self.assertTrue(self.revocation.is_revoked({"sub": "example@exmpl.com", "jti": "abc", "iat": issued_at}))
+        self.assertFalse(self.revocation.is_revoked({"sub": "other@exmpl.com", "jti": "abc", "iat": issued_at}))
+
+    def test_revoke_while_redis_unavailable(self):
+        self.r.pipeline.return_value.execute.side_effect = redis.ConnectionError("Connection refused")
+        self.addCleanup(redis_breaker.reset)
+        self.assertFalse(self.revocation.revoke_token("abc", int(time.time()) + 60))
+        self.assertFalse(self.revocation.revoke_all("example@exmpl.com"))
+        self.assertFalse(self.revocation.is_revoked({"sub": "example@exmpl.com", "jti": "abc",
+                                                     "iat": int(time.time()) - 10}))
+
+    def test_token_issued_right_after_revoke_all(self):
+        self.revocation.revoke_all("example@exmpl.com")
+        cutoff = self.revocation._revoked_before["example@exmpl.com"]
+        before = {"sub": "example@exmpl.com", "iat": cutoff // 1000, "iat_ms": cutoff}
+        after = {"sub": "example@exmpl.com", "iat": (cutoff + 1) // 1000, "iat_ms": cutoff + 1}
+        self.assertTrue(self.revocation.is_revoked(before))
+        self.assertFalse(self.revocation.is_revoked(after))
+
+    def test_cutoff_in_seconds_still_applies(self):
+        self.revocation._handle(b"user:100:example@exmpl.com")
+        self.assertTrue(self.revocation.is_revoked({"sub": "example@exmpl.com", "iat": 100, "iat_ms": 100_500}))
+        self.assertFalse(self.revocation.is_revoked({"sub": "example@exmpl.com", "iat": 101, "iat_ms": 101_000}))
+
+    def test_handle_published_revocation(self):
+        self.revocation._handle(b"jti:def")
+        self.r.exists.return_value = 1
+        self.assertTrue(self.revocation.is_revoked({"sub": "example@exmpl.com", "jti": "def", "iat": 0}))
+
+    def test_rebuild_reads_users_in_one_call(self):
+        self.r.scan_iter.side_effect = [[b"revoked:jti:abc"],
+                                        [b"revoked:user:a@exmpl.com", b"revoked:user:b@exmpl.com"]]
+        self.r.mget.return_value = [b"100", None]
+        self.revocation.rebuild()
+        self.r.mget.assert_called_once()
+        self.r.get.assert_not_called()
+        self.assertTrue(self.revocation.is_revoked({"sub": "a@exmpl.com", "iat": 100}))
+        self.assertFalse(self.revocation.is_revoked({"sub": "b@exmpl.com", "iat": 100}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import pickle
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.database.models import User
+from src.services.auth import Auth
+from src.services.resilience import redis_breaker
+from src.services.singleflight import SingleFlight, refresh_early
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  fakeredis runs the unlock script with it
+except ImportError:
+    fakeredis = None
+
+
+class TestRefreshEarly(unittest.TestCase):
+
+    def test_never_without_expiry(self):
+        self.assertFalse(refresh_early(-1, 10.0, rand=lambda: 0.999))
+
+    def test_more_likely_near_expiry(self):
+        # -log(1 - 0.5) ~ 0.69 reloads
+        self.assertFalse(refresh_early(60, 0.1, rand=lambda: 0.5))
+        self.assertTrue(refresh_early(0.05, 0.1, rand=lambda: 0.5))
+        self.assertTrue(refresh_early(0.1, 0.1, beta=2.0, rand=lambda: 0.5))
+        self.assertTrue(refresh_early(0, 0.0, rand=lambda: 0.5))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight("test")
+        self.calls = 0
+
+    async def load(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.calls
+
+    async def test_concurrent_misses_load_once(self):
+        results = await asyncio.gather(*(self.flight.do("key", self.load) for _ in range(10)))
+        self.assertEqual(results, [1] * 10)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.counters["coalesced"], 9)
+        self.assertEqual(await self.flight.do("key", self.load), 2)
+        self.assertGreater(self.flight.load_time, 0)
+
+    async def test_error_reaches_every_caller(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("down")
+
+        results = await asyncio.gather(*(self.flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(await self.flight.do("key", self.load), 1)
+
+    async def test_waiter_takes_over_cancelled_load(self):
+        leader = asyncio.create_task(self.flight.do("key", self.load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.flight.do("key", self.load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await waiter, 2)
+
+
+@unittest.skipIf(fakeredis is None, "needs fakeredis[lua]")
+class TestSingleFlightAcrossWorkers(unittest.IsolatedAsyncioTestCase):
+
+    async def test_other_worker_waits_for_the_cache(self):
+        r = fakeredis.FakeRedis()
+        redis_breaker.reset()
+        workers = [SingleFlight("test", r, poll_interval=0.005) for _ in range(2)]
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            r.set("key", b"value")
+            return b"value"
+
+        results = await asyncio.gather(*(worker.do("key", load, lambda: r.get("key")) for worker in workers))
+        self.assertEqual(results, [b"value", b"value"])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(workers[1].counters["filled_elsewhere"], 1)
+        self.assertEqual(r.keys("singleflight:*"), [])
+
+
+class TestUserCacheStampede(unittest.IsolatedAsyncioTestCase):
+
+    async def test_expired_user_read_once(self):
+        auth = Auth()
+        auth.r = MagicMock()
+        auth.r.pipeline.return_value.execute.return_value = [None, -2]
+        auth.r.get.return_value = None
+        auth.user_loads = SingleFlight("users")
+        auth.decode_access_token = AsyncMock(return_value={"sub": "user@example.com"})
+        user = User(id=1, username="user", email="user@example.com")
+
+        async def get_user(email, db):
+            await asyncio.sleep(0.01)
+            return user
+
+        redis_breaker.reset()
+        with patch("src.services.auth.repository_users.get_user_by_email", side_effect=get_user) as lookup:
+            users = await asyncio.gather(*(auth.get_current_user("token", MagicMock()) for _ in range(20)))
+        self.assertEqual({item.email for item in users}, {user.email})
+        self.assertEqual(lookup.call_count, 1)
+        auth.r.set.assert_called_once()
+        self.assertEqual(pickle.loads(auth.r.set.call_args.args[1]).email, user.email)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+
+from src.services import tracing
+from src.services.tracing import (KIND_CLIENT, STATUS_ERROR, FileExporter, Tracer, TracingMiddleware, instrument_redis,
+                                  otlp_json, span, start_span)
+
+
+class ListExporter:
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+class TestSpans(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.tracer = Tracer(sample_rate=1.0, exporters=[self.exporter])
+
+    def run_trace(self, root, body):
+        token = tracing._current.set(root)
+        try:
+            body()
+        finally:
+            tracing._current.reset(token)
+            root.end()
+            self.tracer.finish(root)
+
+    def test_nested_spans(self):
+        root = self.tracer.start("GET /")
+
+        def body():
+            with span("outer"):
+                with span("inner", KIND_CLIENT, key="value"):
+                    pass
+            with self.assertRaises(ValueError), span("failing"):
+                raise ValueError("boom")
+
+        self.run_trace(root, body)
+        spans = {item.name: item for item in self.exporter.traces[0]}
+        self.assertEqual(spans["inner"].parent_id, spans["outer"].span_id)
+        self.assertEqual(spans["outer"].parent_id, root.span_id)
+        self.assertEqual(spans["inner"].attributes, {"key": "value"})
+        self.assertEqual(spans["failing"].status, STATUS_ERROR)
+        self.assertEqual(spans["failing"].attributes["exception.message"], "boom")
+
+    def test_not_sampled(self):
+        self.tracer.sample_rate = 0.0
+        root = self.tracer.start("GET /")
+        self.run_trace(root, lambda: self.assertIsNone(start_span("child")))
+        self.assertEqual(self.exporter.traces, [])
+        self.assertIsNone(start_span("outside a trace"))
+
+    def test_slow_requests_exported(self):
+        self.tracer.sample_rate, self.tracer.slow_ms = 0.0, 0.0
+        root = self.tracer.start("GET /")
+        self.run_trace(root, lambda: span("child").__enter__())
+        self.assertEqual(len(self.exporter.traces), 1)
+
+    def test_traceparent(self):
+        root = self.tracer.start("GET /", "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00")
+        self.assertEqual(root.trace.trace_id, "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(root.parent_id, "b7ad6b7169203331")
+        self.assertFalse(root.trace.sampled)
+        self.assertNotEqual(self.tracer.start("GET /", "garbage").trace.trace_id, root.trace.trace_id)
+
+    def test_instrument_redis(self):
+        class Client:
+            def execute_command(self, *args, **options):
+                return args
+
+        client = instrument_redis(Client())
+        root = self.tracer.start("GET /")
+        self.run_trace(root, lambda: self.assertEqual(client.execute_command("GET", "key"), ("GET", "key")))
+        self.assertEqual([item.name for item in self.exporter.traces[0]], ["redis GET", "GET /"])
+
+    def test_instrument_redis_pipeline(self):
+        class Pipeline(list):
+            def execute(self):
+                return list(self)
+
+        class Client:
+            def execute_command(self, *args, **options):
+                return args
+
+            def pipeline(self, transaction=True):
+                return Pipeline()
+
+        client = instrument_redis(Client())
+
+        def run():
+            pipe = client.pipeline(transaction=False)
+            pipe += ["GET", "SET"]
+            self.assertEqual(pipe.execute(), ["GET", "SET"])
+
+        self.run_trace(self.tracer.start("GET /"), run)
+        pipeline_span = self.exporter.traces[0][0]
+        self.assertEqual(pipeline_span.name, "redis PIPELINE")
+        self.assertEqual(pipeline_span.attributes["db.redis.commands"], 2)
+
+
+class TestExport(unittest.TestCase):
+
+    def test_otlp_json(self):
+        tracer = Tracer(sample_rate=1.0, exporters=[ListExporter()])
+        root = tracer.start("GET /", **{"http.status_code": 200, "ok": True, "ratio": 0.5, "path": "/"})
+        root.end()
+        data = otlp_json([root], "contacts-api")
+        resource_spans = data["resourceSpans"][0]
+        self.assertEqual(resource_spans["resource"]["attributes"],
+                         [{"key": "service.name", "value": {"stringValue": "contacts-api"}}])
+        encoded = resource_spans["scopeSpans"][0]["spans"][0]
+        self.assertEqual(encoded["traceId"], root.trace.trace_id)
+        self.assertNotIn("parentSpanId", encoded)
+        self.assertEqual(encoded["attributes"], [
+            {"key": "http.status_code", "value": {"intValue": "200"}}, {"key": "ok", "value": {"boolValue": True}},
+            {"key": "ratio", "value": {"doubleValue": 0.5}}, {"key": "path", "value": {"stringValue": "/"}}])
+
+    def test_file_exporter(self):
+        tracer = Tracer(sample_rate=1.0, exporters=[ListExporter()])
+        root = tracer.start("GET /")
+        root.end()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            exporter = FileExporter(path, "contacts-api")
+            exporter.export([root])
+            exporter.export([root])
+            exporter.flush()
+            with open(path) as file:
+                lines = file.readlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"], "GET /")
+
+    def test_file_exporter_writes_in_background(self):
+        exporter = FileExporter(os.devnull, "contacts-api", max_queue=1)
+        writing, release = threading.Event(), threading.Event()
+        exporter.write = MagicMock(side_effect=lambda traces: writing.set() or release.wait(5))
+        root = Tracer(sample_rate=1.0, exporters=[ListExporter()]).start("GET /")
+        root.end()
+        exporter.export([root])
+        self.assertTrue(writing.wait(5))
+        exporter.export([root])
+        exporter.export([root])
+        # The first trace is being written, the second waits in the queue, the third is dropped
+        self.assertEqual(exporter.dropped, 1)
+        release.set()
+        exporter.flush()
+        self.assertEqual(exporter.write.call_count, 2)
+
+
+class TestTracingMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        app = FastAPI()
+
+        async def send_mail():
+            with span("mail.send"):
+                pass
+
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int, background_tasks: BackgroundTasks):
+            with span("repository.get_item"):
+                background_tasks.add_task(send_mail)
+                return {"id": item_id}
+
+        app.add_middleware(TracingMiddleware, tracer=Tracer(sample_rate=1.0, exporters=[self.exporter]))
+        self.client = TestClient(app)
+
+    def test_trace_headers_and_spans(self):
+        response = self.client.get("/items/1", headers={
+            "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"})
+        self.assertEqual(response.headers["X-Trace-Id"], "0af7651916cd43dd8448eb211c80319c")
+        self.assertTrue(response.headers["traceresponse"].startswith("00-0af7651916cd43dd8448eb211c80319c-"))
+        spans = {item.name: item for item in self.exporter.traces[0]}
+        self.assertEqual(set(spans), {"GET /items/{item_id}", "repository.get_item", "mail.send"})
+        root = spans["GET /items/{item_id}"]
+        self.assertEqual(root.attributes["http.status_code"], 200)
+        self.assertEqual(spans["mail.send"].parent_id, root.span_id)
+
+    def test_unsampled_request_gets_trace_id(self):
+        with patch.object(self.exporter, "export") as export, patch("random.random", return_value=1.0):
+            response = self.client.get("/items/2", headers={"traceparent": "invalid"})
+        self.assertEqual(len(response.headers["X-Trace-Id"]), 32)
+        self.assertTrue(response.headers["traceresponse"].endswith("-00"))
+        export.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()